@@ -0,0 +1,167 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from app.config import Settings
+from app.metrics import ADMISSION_REJECTIONS
+
+LIMITED_ROUTES = ("checkout",)
+
+
+class RateLimitedError(Exception):
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class OverloadedError(Exception):
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, burst: int, max_keys: int = 100000) -> None:
+        self.rate_per_second = rate_per_second
+        self.burst = max(1, burst)
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def acquire(self, key: str) -> float:
+        # Returns 0 when a token was taken, otherwise the seconds until one is available.
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated_at) * self.rate_per_second)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / self.rate_per_second
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        # A forgotten key starts over with a full bucket, so keep max_keys above active users.
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class ConcurrencyLimiter:
+    def __init__(self, max_in_flight: int, max_queued: int, queue_timeout_seconds: float) -> None:
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queued = max(0, max_queued)
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queued:
+            raise OverloadedError(self.queue_timeout_seconds)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            async with asyncio.timeout(self.queue_timeout_seconds):
+                await waiter
+        except BaseException as exc:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up, so pass it on.
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(exc, TimeoutError):
+                raise OverloadedError(self.queue_timeout_seconds) from exc
+            raise
+
+    def release(self) -> None:
+        # A released slot goes straight to the oldest waiter, so in_flight stays the same.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+class RouteLimiter:
+    def __init__(
+        self,
+        route: str,
+        *,
+        bucket: TokenBucket | None = None,
+        concurrency: ConcurrencyLimiter | None = None,
+    ) -> None:
+        self.route = route
+        self.bucket = bucket
+        self.concurrency = concurrency
+
+    def check(self, user_id: str) -> None:
+        if self.bucket is None:
+            return
+        wait = self.bucket.acquire(user_id)
+        if wait > 0:
+            ADMISSION_REJECTIONS.inc(self.route, "rate_limited")
+            raise RateLimitedError(wait)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self.concurrency is None:
+            yield
+            return
+        try:
+            await self.concurrency.acquire()
+        except OverloadedError:
+            ADMISSION_REJECTIONS.inc(self.route, "overloaded")
+            raise
+        try:
+            yield
+        finally:
+            self.concurrency.release()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "in_flight": self.concurrency.in_flight if self.concurrency is not None else 0,
+            "queued": self.concurrency.queued if self.concurrency is not None else 0,
+            "tracked_users": len(self.bucket) if self.bucket is not None else 0,
+        }
+
+
+def build_route_limiters(settings: Settings) -> dict[str, RouteLimiter]:
+    limiters: dict[str, RouteLimiter] = {}
+    for route in LIMITED_ROUTES:
+        per_minute: float = getattr(settings, f"{route}_rate_limit_per_minute")
+        max_in_flight: int = getattr(settings, f"{route}_max_in_flight")
+        if per_minute <= 0 and max_in_flight <= 0:
+            continue
+        bucket = None
+        if per_minute > 0:
+            bucket = TokenBucket(
+                per_minute / 60,
+                getattr(settings, f"{route}_rate_limit_burst"),
+                settings.rate_limit_max_users,
+            )
+        concurrency = None
+        if max_in_flight > 0:
+            concurrency = ConcurrencyLimiter(
+                max_in_flight,
+                getattr(settings, f"{route}_max_queued"),
+                getattr(settings, f"{route}_queue_timeout_seconds"),
+            )
+        limiters[route] = RouteLimiter(route, bucket=bucket, concurrency=concurrency)
+    return limiters
@@ -0,0 +1,116 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import jwt
+from fastapi import HTTPException, status
+
+from app import fast_json
+from app.cache import Cache, MemoryCache
+from app.utils.crypto import sha256_hex
+
+
+class TokenRejectedError(Exception):
+    pass
+
+
+def _seconds_until_expiry(token: str) -> float | None:
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False})
+    except jwt.PyJWTError:
+        return None
+
+    exp = claims.get("exp")
+    if not isinstance(exp, int | float):
+        return None
+    return exp - time.time()
+
+
+class TokenCache:
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        negative_ttl_seconds: float,
+        cache: Cache | None = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.cache = cache if cache is not None else MemoryCache(max_entries)
+        self._inflight: dict[str, asyncio.Task[dict[str, Any]]] = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            **self.cache.stats(),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+    async def get_or_load(
+        self,
+        token: str,
+        loader: Callable[[], Awaitable[dict[str, Any]]],
+    ) -> dict[str, Any]:
+        key = f"auth:{sha256_hex(token.encode('utf-8'))}"
+        cached = await self.cache.get(key)
+        if cached is not None:
+            user = fast_json.loads(cached)
+            if user is None:
+                self.negative_hits += 1
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Unauthorized",
+                )
+            self.hits += 1
+            return user
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.create_task(self._load(key, token, loader))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+
+        user = await asyncio.shield(task)
+        return {**user}
+
+    def _finish(self, key: str, task: asyncio.Task[dict[str, Any]]) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()
+
+    async def _load(
+        self,
+        key: str,
+        token: str,
+        loader: Callable[[], Awaitable[dict[str, Any]]],
+    ) -> dict[str, Any]:
+        try:
+            user = await loader()
+        except HTTPException as exc:
+            # Only a definitive verdict on the token is remembered, never an auth outage.
+            if isinstance(exc.__cause__, TokenRejectedError | jwt.PyJWTError):
+                await self._store(key, None, self.negative_ttl_seconds)
+            raise
+
+        ttl = self.ttl_seconds
+        remaining = _seconds_until_expiry(token)
+        if remaining is not None:
+            ttl = min(ttl, remaining)
+        await self._store(key, user, ttl)
+        return user
+
+    async def _store(self, key: str, user: dict[str, Any] | None, ttl: float) -> None:
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        await self.cache.set(key, fast_json.dumps(user), ttl)
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from typing import Any
+
+import httpx
+import jwt
+
+from app.config import Settings
+
+ASYMMETRIC_ALGORITHMS = ("RS256", "ES256")
+
+
+class KeyUnavailableError(Exception):
+    pass
+
+
+class JwksCache:
+    def __init__(
+        self,
+        url: str,
+        client: httpx.AsyncClient,
+        refresh_seconds: float,
+        min_refetch_seconds: float = 30.0,
+    ) -> None:
+        self.url = url
+        self.client = client
+        self.refresh_seconds = refresh_seconds
+        self.min_refetch_seconds = min_refetch_seconds
+        self._keys: dict[str, jwt.PyJWK] = {}
+        self._fetched_at = 0.0
+        self._attempted_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get_key(self, kid: str | None) -> jwt.PyJWK | None:
+        now = time.monotonic()
+        stale = now - self._fetched_at >= self.refresh_seconds
+        unknown = kid not in self._keys
+        if (stale or unknown) and now - self._attempted_at >= self.min_refetch_seconds:
+            await self._refresh()
+
+        if kid is None and len(self._keys) == 1:
+            return next(iter(self._keys.values()))
+        return self._keys.get(kid or "")
+
+    async def prime(self) -> None:
+        await self._refresh()
+        if not self._keys:
+            raise KeyUnavailableError("JWKS could not be loaded")
+
+    async def _refresh(self) -> None:
+        async with self._lock:
+            if time.monotonic() - self._attempted_at < self.min_refetch_seconds:
+                return
+            self._attempted_at = time.monotonic()
+
+            try:
+                response = await self.client.get(self.url)
+                response.raise_for_status()
+                payload = response.json()
+            except (httpx.HTTPError, ValueError):
+                return
+
+            keys = payload.get("keys") if isinstance(payload, dict) else None
+            if not isinstance(keys, list):
+                return
+
+            self._keys = {}
+            for key in keys:
+                if not isinstance(key, dict):
+                    continue
+                try:
+                    self._keys[str(key.get("kid", ""))] = jwt.PyJWK(key)
+                except jwt.PyJWTError:
+                    continue
+            self._fetched_at = time.monotonic()
+
+
+class LocalTokenVerifier:
+    def __init__(self, settings: Settings, client: httpx.AsyncClient) -> None:
+        base_url = settings.supabase_url.rstrip("/")
+        self.jwt_secret = settings.supabase_jwt_secret
+        self.audience = settings.supabase_jwt_audience
+        self.issuer = settings.supabase_jwt_issuer or (f"{base_url}/auth/v1" if base_url else "")
+        self.leeway = settings.supabase_jwt_leeway_seconds
+
+        jwks_url = settings.supabase_jwks_url
+        if not jwks_url and base_url:
+            jwks_url = f"{base_url}/auth/v1/.well-known/jwks.json"
+        self.jwks = (
+            JwksCache(jwks_url, client, settings.supabase_jwks_refresh_seconds)
+            if jwks_url
+            else None
+        )
+
+    async def verify(self, token: str) -> dict[str, Any]:
+        header = jwt.get_unverified_header(token)
+        alg = header.get("alg")
+
+        key: Any
+        if alg == "HS256":
+            if not self.jwt_secret:
+                raise KeyUnavailableError("JWT secret is not configured")
+            key = self.jwt_secret
+        elif alg in ASYMMETRIC_ALGORITHMS:
+            jwk = await self.jwks.get_key(header.get("kid")) if self.jwks else None
+            if jwk is None or jwk.algorithm_name != alg:
+                raise KeyUnavailableError("Signing key is not available")
+            key = jwk.key
+        else:
+            raise KeyUnavailableError(f"Unsupported algorithm {alg}")
+
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=[alg],
+            audience=self.audience or None,
+            issuer=self.issuer or None,
+            leeway=self.leeway,
+            options={"require": ["exp", "sub"], "verify_aud": bool(self.audience)},
+        )
+        return {
+            "id": str(claims["sub"]),
+            "email": str(claims.get("email") or ""),
+        }
@@ -0,0 +1,191 @@
+import time
+from collections import OrderedDict
+from typing import Protocol
+
+from app.config import Settings
+
+try:
+    import redis.asyncio as redis
+    from redis.asyncio.retry import Retry
+    from redis.backoff import NoBackoff
+    from redis.exceptions import RedisError
+except ImportError:
+    redis = None
+    RedisError = OSError
+
+
+class Cache(Protocol):
+    async def get(self, key: str) -> bytes | None:
+        ...
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        ...
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float | None = None) -> None:
+        ...
+
+    async def set_many(self, items: dict[str, bytes], ttl_seconds: float | None = None) -> None:
+        ...
+
+    async def add(self, key: str, value: bytes, ttl_seconds: float | None = None) -> bool:
+        ...
+
+    async def delete(self, key: str) -> None:
+        ...
+
+    def stats(self) -> dict[str, int]:
+        ...
+
+    async def close(self) -> None:
+        ...
+
+
+class MemoryCache:
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float | None, bytes]] = OrderedDict()
+        self.evictions = 0
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._entries), "evictions": self.evictions}
+
+    def _get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set(self, key: str, value: bytes, ttl_seconds: float | None) -> None:
+        if self.max_entries <= 0 or (ttl_seconds is not None and ttl_seconds <= 0):
+            return
+        expires_at = time.monotonic() + ttl_seconds if ttl_seconds is not None else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key: str) -> bytes | None:
+        return self._get(key)
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        return [self._get(key) for key in keys]
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float | None = None) -> None:
+        self._set(key, value, ttl_seconds)
+
+    async def set_many(self, items: dict[str, bytes], ttl_seconds: float | None = None) -> None:
+        for key, value in items.items():
+            self._set(key, value, ttl_seconds)
+
+    async def add(self, key: str, value: bytes, ttl_seconds: float | None = None) -> bool:
+        if self._get(key) is not None:
+            return False
+        self._set(key, value, ttl_seconds)
+        return True
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+
+class RedisCache:
+    # A redis-py client with its own connection pool: concurrent calls use separate
+    # connections, and a call that times out only drops the connection it was using.
+    # Errors and timeouts degrade to cache misses.
+    def __init__(
+        self,
+        url: str,
+        *,
+        key_prefix: str = "",
+        timeout_seconds: float = 0.25,
+    ) -> None:
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND=redis needs the redis extra")
+        self.key_prefix = key_prefix
+        self.timeout_seconds = timeout_seconds
+        self.errors = 0
+        self._client = redis.Redis.from_url(
+            url,
+            socket_timeout=timeout_seconds,
+            socket_connect_timeout=timeout_seconds,
+            # RESP2 keeps Redis-protocol servers without HELLO working.
+            protocol=2,
+            # A slow cache is a miss, not something to wait out.
+            retry=Retry(NoBackoff(), 0),
+        )
+
+    def stats(self) -> dict[str, int]:
+        return {"errors": self.errors}
+
+    def _key(self, key: str) -> str:
+        return self.key_prefix + key
+
+    @staticmethod
+    def _px(ttl_seconds: float | None) -> int | None:
+        return None if ttl_seconds is None else max(1, int(ttl_seconds * 1000))
+
+    async def get(self, key: str) -> bytes | None:
+        return (await self.get_many([key]))[0]
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        if not keys:
+            return []
+        try:
+            return await self._client.mget([self._key(key) for key in keys])
+        except (RedisError, OSError):
+            self.errors += 1
+            return [None] * len(keys)
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float | None = None) -> None:
+        await self.set_many({key: value}, ttl_seconds)
+
+    async def set_many(self, items: dict[str, bytes], ttl_seconds: float | None = None) -> None:
+        if not items or (ttl_seconds is not None and ttl_seconds <= 0):
+            return
+        px = self._px(ttl_seconds)
+        try:
+            async with self._client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.set(self._key(key), value, px=px)
+                await pipe.execute()
+        except (RedisError, OSError):
+            self.errors += 1
+
+    async def add(self, key: str, value: bytes, ttl_seconds: float | None = None) -> bool:
+        if ttl_seconds is not None and ttl_seconds <= 0:
+            return True
+        try:
+            return bool(
+                await self._client.set(self._key(key), value, px=self._px(ttl_seconds), nx=True)
+            )
+        except (RedisError, OSError):
+            self.errors += 1
+            # Without an answer the caller proceeds as if it held the key, like a cold cache.
+            return True
+
+    async def delete(self, key: str) -> None:
+        try:
+            await self._client.delete(self._key(key))
+        except (RedisError, OSError):
+            self.errors += 1
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def build_shared_cache(settings: Settings) -> RedisCache | None:
+    if settings.cache_backend != "redis":
+        return None
+    return RedisCache(
+        settings.cache_redis_url,
+        key_prefix=settings.cache_key_prefix,
+        timeout_seconds=settings.cache_timeout_seconds,
+    )
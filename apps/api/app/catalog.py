@@ -0,0 +1,112 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+
+from app import fast_json
+from app.cache import Cache
+from app.repo import AsyncRepo
+from app.utils.crypto import sha256_hex
+
+PUBLIC_PRODUCT_FIELDS = ("id", "name", "price_cents", "currency")
+SHARED_CATALOG_KEY = "catalog:products"
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    products: dict[str, dict[str, Any]]
+    body: bytes
+    etag: str
+    loaded_at: float
+
+
+class ProductCatalog:
+    def __init__(self, ttl_seconds: float, cache: Cache | None = None) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.cache = cache
+        self._snapshot: CatalogSnapshot | None = None
+        self._stale = False
+        self._lock = asyncio.Lock()
+
+    async def invalidate(self) -> None:
+        self._stale = True
+        if self.cache is not None:
+            await self.cache.delete(SHARED_CATALOG_KEY)
+
+    def _is_fresh(self, snapshot: CatalogSnapshot | None) -> bool:
+        if snapshot is None or self._stale:
+            return False
+        return time.monotonic() - snapshot.loaded_at < self.ttl_seconds
+
+    async def refresh(self, repo: AsyncRepo) -> CatalogSnapshot:
+        self._stale = False
+        rows = await repo.list_active_products()
+        if self.cache is not None:
+            await self.cache.set(
+                SHARED_CATALOG_KEY,
+                fast_json.dumps({"loaded_at": time.time(), "rows": rows}),
+                self.ttl_seconds,
+            )
+        return self._build(rows)
+
+    async def _load_shared(self) -> CatalogSnapshot | None:
+        if self.cache is None or self._stale:
+            return None
+        cached = await self.cache.get(SHARED_CATALOG_KEY)
+        if cached is None:
+            return None
+        record = fast_json.loads(cached)
+        if not isinstance(record, dict):
+            return None
+        # Age the copy from when the loading worker read the table, not from when this one
+        # fetched it, so it expires with the shared entry instead of a full TTL later.
+        age = max(0.0, time.time() - float(record["loaded_at"]))
+        if age >= self.ttl_seconds:
+            return None
+        return self._build(record["rows"], loaded_at=time.monotonic() - age)
+
+    def _build(
+        self,
+        rows: list[dict[str, Any]],
+        loaded_at: float | None = None,
+    ) -> CatalogSnapshot:
+        products = {str(row["id"]): row for row in rows if row.get("id")}
+        listing = [
+            {field: row.get(field) for field in PUBLIC_PRODUCT_FIELDS}
+            for row in products.values()
+        ]
+        body = fast_json.dumps(listing)
+        snapshot = CatalogSnapshot(
+            products=products,
+            body=body,
+            etag=f'"{sha256_hex(body)[:32]}"',
+            loaded_at=time.monotonic() if loaded_at is None else loaded_at,
+        )
+        self._snapshot = snapshot
+        return snapshot
+
+    async def snapshot(self, repo: AsyncRepo) -> CatalogSnapshot:
+        current = self._snapshot
+        if self._is_fresh(current):
+            return current
+
+        async with self._lock:
+            current = self._snapshot
+            if self._is_fresh(current):
+                return current
+            shared = await self._load_shared()
+            if shared is not None:
+                return shared
+            try:
+                return await self.refresh(repo)
+            except (RuntimeError, httpx.HTTPError):
+                if current is None:
+                    raise
+                return current
+
+    async def get_product(self, repo: AsyncRepo, product_id: str) -> dict[str, Any] | None:
+        snapshot = await self.snapshot(repo)
+        product = snapshot.products.get(product_id)
+        return {**product} if product else None
@@ -0,0 +1,80 @@
+import time
+from collections import deque
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_ratio: float,
+        min_calls: int,
+        window_seconds: float,
+        open_seconds: float,
+        probe_timeout_seconds: float = 30.0,
+    ) -> None:
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.probe_timeout_seconds = probe_timeout_seconds
+        self.state = "closed"
+        self._results: deque[tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                return False
+            self.state = "half_open"
+            self._probe_in_flight = False
+        # A probe that never reported back (lost task, bug) gives up its slot at the deadline.
+        now = time.monotonic()
+        if self._probe_in_flight and now - self._probe_started_at < self.probe_timeout_seconds:
+            return False
+        self._probe_in_flight = True
+        self._probe_started_at = now
+        return True
+
+    def release_probe(self) -> None:
+        # The call ended without an answer from upstream (cancelled): not a failure, but the
+        # half-open slot goes back so the next caller can probe.
+        if self.state == "half_open":
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        if self.state == "half_open":
+            self._close()
+            return
+        self._record(True)
+
+    def record_failure(self) -> None:
+        if self.state == "half_open":
+            self._open()
+            return
+        self._record(False)
+
+        failures = sum(1 for _, ok in self._results if not ok)
+        if len(self._results) >= self.min_calls and (
+            failures / len(self._results) >= self.failure_ratio
+        ):
+            self._open()
+
+    def _record(self, ok: bool) -> None:
+        now = time.monotonic()
+        self._results.append((now, ok))
+        while self._results and now - self._results[0][0] > self.window_seconds:
+            self._results.popleft()
+
+    def _open(self) -> None:
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self._results.clear()
+
+    def _close(self) -> None:
+        self.state = "closed"
+        self._probe_in_flight = False
+        self._results.clear()
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -13,6 +14,88 @@ class Settings(BaseSettings):
     creem_webhook_secret: str = "test_webhook_secret"
     creem_api_base: str = "https://test-api.creem.io"
     frontend_base_url: str = "http://localhost:5173"
+    repo_backend: Literal["supabase", "sqlite"] = "supabase"
+    sqlite_repo_path: str = "antigravity.sqlite3"
+    sqlite_repo_synchronous: Literal["normal", "full"] = "full"
+    creem_timeout_seconds: float = 15.0
+    creem_http2: bool = False
+    creem_max_retries: int = 2
+    creem_backoff_base_seconds: float = 0.2
+    creem_backoff_max_seconds: float = 2.0
+    creem_breaker_failure_ratio: float = 0.5
+    creem_breaker_min_calls: int = 10
+    creem_breaker_window_seconds: float = 30.0
+    creem_breaker_open_seconds: float = 15.0
+    supabase_auth_mode: Literal["remote", "local"] = "remote"
+    supabase_auth_remote_fallback: bool = True
+    supabase_auth_checkout_remote: bool = True
+    supabase_jwt_secret: str = ""
+    supabase_jwt_audience: str = "authenticated"
+    supabase_jwt_issuer: str = ""
+    supabase_jwt_leeway_seconds: float = 30.0
+    supabase_jwks_url: str = ""
+    supabase_jwks_refresh_seconds: float = 600.0
+    cache_backend: Literal["memory", "redis"] = "memory"
+    cache_redis_url: str = "redis://127.0.0.1:6379/0"
+    cache_key_prefix: str = "antigravity:"
+    cache_timeout_seconds: float = 0.25
+    auth_cache_max_entries: int = 10000
+    auth_cache_ttl_seconds: float = 60.0
+    auth_cache_negative_ttl_seconds: float = 5.0
+    webhook_ingest_mode: Literal["inline", "queued"] = "inline"
+    webhook_queue_path: str = "webhook_queue.sqlite3"
+    webhook_workers: int = 4
+    webhook_max_attempts: int = 10
+    webhook_seen_cache_size: int = 10000
+    webhook_seen_cache_ttl_seconds: float = 86400.0
+    webhook_batch_window_ms: float = 0.0
+    webhook_batch_max_events: int = 100
+    webhook_retry_base_seconds: float = 1.0
+    webhook_events_retention_hours: float = 720.0
+    webhook_events_prune_interval_seconds: float = 0.0
+    webhook_events_prune_batch_size: int = 1000
+    webhook_events_prune_pause_seconds: float = 0.05
+    entitlement_stream_timeout_seconds: float = 60.0
+    entitlement_stream_heartbeat_seconds: float = 15.0
+    entitlement_stream_recheck_seconds: float = 2.0
+    entitlement_index_resync_seconds: float = 0.0
+    entitlement_index_page_size: int = 10000
+    entitlement_check_max_pairs: int = 10000
+    idempotency_ttl_seconds: float = 86400.0
+    idempotency_max_entries: int = 10000
+    admin_api_token: str = ""
+    service_api_token: str = ""
+    admin_export_page_size: int = 1000
+    revenue_cache_ttl_seconds: float = 86400.0
+    revenue_cache_today_ttl_seconds: float = 60.0
+    revenue_cache_open_days: int = 3
+    metrics_token: str = ""
+    products_cache_ttl_seconds: float = 300.0
+    products_cache_max_age_seconds: int = 60
+    http_timeout_seconds: float = 10.0
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry_seconds: float = 30.0
+    warmup_connections: int = 2
+    ready_check_ttl_seconds: float = 10.0
+    ready_check_timeout_seconds: float = 2.0
+    order_write_behind_interval_ms: float = 0.0
+    order_write_behind_batch_size: int = 500
+    order_write_behind_max_pending: int = 10000
+    order_write_behind_retry_base_seconds: float = 0.5
+    rate_limit_max_users: int = 100000
+    profile_slow_ms: float = 0.0
+    profile_sample_rate: float = 0.0
+    profile_interval_ms: float = 5.0
+    profile_dir: str = "profiles"
+    profile_max_files: int = 200
+    profile_max_armed: int = 8
+    profile_format: Literal["speedscope", "collapsed"] = "speedscope"
+    checkout_rate_limit_per_minute: float = 0.0
+    checkout_rate_limit_burst: int = 5
+    checkout_max_in_flight: int = 0
+    checkout_max_queued: int = 0
+    checkout_queue_timeout_seconds: float = 1.0
 
 
 @lru_cache
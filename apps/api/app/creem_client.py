@@ -1,13 +1,93 @@
+import asyncio
+import random
 from typing import Any
 
 import httpx
 from fastapi import HTTPException, status
 
+from app.circuit_breaker import CircuitBreaker
+from app.config import Settings
+from app.metrics import outbound_timer
+
+
+def _is_transient(response: httpx.Response) -> bool:
+    return response.status_code == 429 or response.status_code >= 500
+
 
 class CreemClient:
-    def __init__(self, api_key: str, base_url: str) -> None:
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        client: httpx.AsyncClient,
+        breaker: CircuitBreaker,
+        *,
+        max_retries: int = 2,
+        backoff_base_seconds: float = 0.2,
+        backoff_max_seconds: float = 2.0,
+    ) -> None:
         self.api_key = api_key
         self.base_url = base_url.rstrip("/")
+        self.client = client
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+
+    def _backoff(self, attempt: int) -> float:
+        cap = min(self.backoff_max_seconds, self.backoff_base_seconds * 2**attempt)
+        return random.uniform(0, cap)
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        operation: str,
+        *,
+        payload: dict[str, Any] | None = None,
+        params: dict[str, str] | None = None,
+    ) -> httpx.Response:
+        headers = {"x-api-key": self.api_key}
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                raise HTTPException(
+                    status_code=status.HTTP_502_BAD_GATEWAY,
+                    detail="Creem unavailable",
+                )
+
+            try:
+                with outbound_timer("creem", operation) as result:
+                    response = await self.client.request(
+                        method,
+                        url,
+                        headers=headers,
+                        json=payload,
+                        params=params,
+                    )
+                    result.append(str(response.status_code))
+            except httpx.HTTPError as exc:
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise HTTPException(
+                        status_code=status.HTTP_502_BAD_GATEWAY,
+                        detail="Creem request failed",
+                    ) from exc
+            except BaseException:
+                # Cancelled (client went away) or unexpected: Creem didn't fail, so nothing is
+                # recorded, but a half-open probe must not keep the breaker stuck.
+                self.breaker.release_probe()
+                raise
+            else:
+                if not _is_transient(response):
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    return response
+
+            await asyncio.sleep(self._backoff(attempt))
+
+        raise AssertionError("unreachable")
 
     async def create_checkout(
         self,
@@ -28,17 +108,13 @@ class CreemClient:
             "metadata": metadata,
         }
 
-        headers = {"x-api-key": self.api_key}
-        url = f"{self.base_url}/v1/checkouts"
-
-        try:
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                response = await client.post(url, headers=headers, json=payload)
-        except httpx.HTTPError as exc:
-            raise HTTPException(
-                status_code=status.HTTP_502_BAD_GATEWAY,
-                detail="Failed to create checkout",
-            ) from exc
+        # Retries resend the same request_id so Creem treats them as one checkout.
+        response = await self._send(
+            "POST",
+            f"{self.base_url}/v1/checkouts",
+            "create_checkout",
+            payload=payload,
+        )
 
         if response.status_code >= 400:
             raise HTTPException(
@@ -55,3 +131,56 @@ class CreemClient:
             )
 
         return data
+
+    async def get_checkout(self, checkout_id: str) -> dict[str, Any] | None:
+        if not self.api_key:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Creem unavailable")
+
+        response = await self._send(
+            "GET",
+            f"{self.base_url}/v1/checkouts",
+            "get_checkout",
+            params={"checkout_id": checkout_id},
+        )
+        if response.status_code == status.HTTP_404_NOT_FOUND:
+            return None
+        if response.status_code >= 400:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Failed to fetch checkout",
+            )
+        try:
+            return response.json()
+        except ValueError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Invalid checkout response",
+            ) from exc
+
+
+def build_creem_client(settings: Settings) -> CreemClient:
+    client = httpx.AsyncClient(
+        timeout=settings.creem_timeout_seconds,
+        http2=settings.creem_http2,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry_seconds,
+        ),
+    )
+    breaker = CircuitBreaker(
+        failure_ratio=settings.creem_breaker_failure_ratio,
+        min_calls=settings.creem_breaker_min_calls,
+        window_seconds=settings.creem_breaker_window_seconds,
+        open_seconds=settings.creem_breaker_open_seconds,
+        probe_timeout_seconds=settings.creem_timeout_seconds,
+    )
+    return CreemClient(
+        api_key=settings.creem_api_key,
+        base_url=settings.creem_api_base,
+        client=client,
+        breaker=breaker,
+        max_retries=settings.creem_max_retries,
+        backoff_base_seconds=settings.creem_backoff_base_seconds,
+        backoff_max_seconds=settings.creem_backoff_max_seconds,
+    )
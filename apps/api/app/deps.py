@@ -1,13 +1,105 @@
-from fastapi import Depends
+import httpx
+from fastapi import Request
 
-from app.config import Settings, get_settings
+from app.admission import RouteLimiter
+from app.catalog import ProductCatalog
+from app.config import Settings
 from app.creem_client import CreemClient
-from app.repo import Repo, SupabaseRepo
+from app.entitlement_index import EntitlementIndex
+from app.idempotency import IdempotencyStore
+from app.order_writes import OrderWriteBehind
+from app.profiling import SamplingProfiler
+from app.pubsub import EntitlementBroker
+from app.readiness import Readiness
+from app.repo import AsyncRepo, AsyncSupabaseRepo
+from app.reports import RevenueReport
+from app.seen_events import SeenEvents
+from app.sqlite_repo import build_sqlite_repo
+from app.webhook_batcher import WebhookBatcher
+from app.webhook_queue import WebhookProcessor
 
 
-def get_repo(settings: Settings = Depends(get_settings)) -> Repo:
-    return SupabaseRepo(settings)
+def build_repo(settings: Settings, client: httpx.AsyncClient) -> AsyncRepo | None:
+    if settings.repo_backend == "sqlite":
+        return build_sqlite_repo(settings)
+    if not settings.supabase_url or not settings.supabase_service_role_key:
+        return None
+    return AsyncSupabaseRepo(settings, client)
 
 
-def get_creem_client(settings: Settings = Depends(get_settings)) -> CreemClient:
-    return CreemClient(api_key=settings.creem_api_key, base_url=settings.creem_api_base)
+def get_http_client(request: Request) -> httpx.AsyncClient | None:
+    return getattr(request.app.state, "http_client", None)
+
+
+def get_repo(request: Request) -> AsyncRepo:
+    repo = getattr(request.app.state, "repo", None)
+    if repo is None:
+        raise RuntimeError("Supabase settings are missing")
+    return repo
+
+
+def get_catalog(request: Request) -> ProductCatalog:
+    catalog = getattr(request.app.state, "catalog", None)
+    if catalog is None:
+        raise RuntimeError("Product catalog is not initialized")
+    return catalog
+
+
+def get_idempotency_store(request: Request) -> IdempotencyStore:
+    store = getattr(request.app.state, "idempotency_store", None)
+    if store is None:
+        raise RuntimeError("Idempotency store is not initialized")
+    return store
+
+
+def get_entitlement_broker(request: Request) -> EntitlementBroker:
+    broker = getattr(request.app.state, "entitlement_broker", None)
+    if broker is None:
+        raise RuntimeError("Entitlement broker is not initialized")
+    return broker
+
+
+def get_entitlement_index(request: Request) -> EntitlementIndex | None:
+    return getattr(request.app.state, "entitlement_index", None)
+
+
+def get_seen_events(request: Request) -> SeenEvents | None:
+    return getattr(request.app.state, "seen_events", None)
+
+
+def get_webhook_processor(request: Request) -> WebhookProcessor | None:
+    return getattr(request.app.state, "webhook_processor", None)
+
+
+def get_webhook_batcher(request: Request) -> WebhookBatcher | None:
+    return getattr(request.app.state, "webhook_batcher", None)
+
+
+def get_creem_client(request: Request) -> CreemClient:
+    creem = getattr(request.app.state, "creem_client", None)
+    if creem is None:
+        raise RuntimeError("Creem client is not initialized")
+    return creem
+
+
+def get_order_writes(request: Request) -> OrderWriteBehind | None:
+    return getattr(request.app.state, "order_writes", None)
+
+
+def get_revenue_report(request: Request) -> RevenueReport:
+    report = getattr(request.app.state, "revenue_report", None)
+    if report is None:
+        raise RuntimeError("Revenue report is not initialized")
+    return report
+
+
+def get_profiler(request: Request) -> SamplingProfiler | None:
+    return getattr(request.app.state, "profiler", None)
+
+
+def get_readiness(request: Request) -> Readiness | None:
+    return getattr(request.app.state, "readiness", None)
+
+
+def get_route_limiters(request: Request) -> dict[str, RouteLimiter]:
+    return getattr(request.app.state, "route_limiters", None) or {}
@@ -1,15 +1,26 @@
 from typing import Any
 
 import httpx
-from fastapi import Depends, HTTPException, status
+import jwt
+from fastapi import Depends, Header, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
+from app.auth_cache import TokenCache, TokenRejectedError
+from app.auth_local import KeyUnavailableError, LocalTokenVerifier
+from app.cache import Cache
 from app.config import Settings, get_settings
+from app.deps import get_http_client
+from app.metrics import outbound_timer, stage_timer
+from app.utils.crypto import secure_compare
 
 security = HTTPBearer(auto_error=False)
 
 
-async def supabase_fetch_user(token: str, settings: Settings) -> dict[str, Any]:
+async def supabase_fetch_user(
+    token: str,
+    settings: Settings,
+    client: httpx.AsyncClient | None = None,
+) -> dict[str, Any]:
     url = f"{settings.supabase_url.rstrip('/')}/auth/v1/user"
     headers = {
         "Authorization": f"Bearer {token}",
@@ -17,14 +28,32 @@ async def supabase_fetch_user(token: str, settings: Settings) -> dict[str, Any]:
     }
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, headers=headers)
+        with outbound_timer("supabase_auth", "get_user") as result:
+            if client is None:
+                async with httpx.AsyncClient(timeout=10.0) as one_off:
+                    response = await one_off.get(url, headers=headers)
+            else:
+                response = await client.get(url, headers=headers)
+            result.append(str(response.status_code))
     except httpx.HTTPError as exc:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Unauthorized",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Auth service unavailable",
         ) from exc
 
+    if response.status_code in (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Unauthorized",
+        ) from TokenRejectedError(f"Supabase Auth answered {response.status_code}")
+    if (
+        response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        or response.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Auth service unavailable",
+        )
     if response.status_code != status.HTTP_200_OK:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
 
@@ -39,11 +68,114 @@ async def supabase_fetch_user(token: str, settings: Settings) -> dict[str, Any]:
     }
 
 
+def build_token_verifier(
+    settings: Settings,
+    client: httpx.AsyncClient,
+) -> LocalTokenVerifier | None:
+    if settings.supabase_auth_mode != "local":
+        return None
+    return LocalTokenVerifier(settings, client)
+
+
+def get_token_verifier(request: Request) -> LocalTokenVerifier | None:
+    return getattr(request.app.state, "token_verifier", None)
+
+
+def build_token_cache(settings: Settings, cache: Cache | None = None) -> TokenCache:
+    return TokenCache(
+        max_entries=settings.auth_cache_max_entries,
+        ttl_seconds=settings.auth_cache_ttl_seconds,
+        negative_ttl_seconds=settings.auth_cache_negative_ttl_seconds,
+        cache=cache,
+    )
+
+
+def get_token_cache(request: Request) -> TokenCache | None:
+    return getattr(request.app.state, "token_cache", None)
+
+
+async def verify_access_token(
+    token: str,
+    settings: Settings,
+    verifier: LocalTokenVerifier | None,
+    client: httpx.AsyncClient | None = None,
+) -> dict[str, Any]:
+    if verifier is not None:
+        try:
+            return await verifier.verify(token)
+        except KeyUnavailableError as exc:
+            if not settings.supabase_auth_remote_fallback:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Unauthorized",
+                ) from exc
+        except jwt.PyJWTError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Unauthorized",
+            ) from exc
+
+    return await supabase_fetch_user(token, settings, client)
+
+
+def bearer_token(credentials: HTTPAuthorizationCredentials | None) -> str:
+    if credentials is None or credentials.scheme.lower() != "bearer":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    return credentials.credentials
+
+
+async def authenticate_token(
+    token: str,
+    settings: Settings,
+    verifier: LocalTokenVerifier | None,
+    cache: TokenCache | None,
+    client: httpx.AsyncClient | None = None,
+) -> dict[str, Any]:
+    with stage_timer("auth"):
+        if cache is None:
+            return await verify_access_token(token, settings, verifier, client)
+        return await cache.get_or_load(
+            token,
+            lambda: verify_access_token(token, settings, verifier, client),
+        )
+
+
+async def authenticate_token_remote(
+    token: str,
+    settings: Settings,
+    client: httpx.AsyncClient | None = None,
+) -> dict[str, Any]:
+    # Revocation-sensitive routes ask Supabase Auth every time: a locally valid or cached
+    # token may belong to a session that was signed out since.
+    with stage_timer("auth"):
+        return await supabase_fetch_user(token, settings, client)
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials | None = Depends(security),
     settings: Settings = Depends(get_settings),
+    verifier: LocalTokenVerifier | None = Depends(get_token_verifier),
+    cache: TokenCache | None = Depends(get_token_cache),
+    client: httpx.AsyncClient | None = Depends(get_http_client),
 ) -> dict[str, Any]:
-    if credentials is None or credentials.scheme.lower() != "bearer":
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    return await authenticate_token(bearer_token(credentials), settings, verifier, cache, client)
+
 
-    return await supabase_fetch_user(credentials.credentials, settings)
+def require_admin(
+    x_admin_token: str | None = Header(default=None),
+    settings: Settings = Depends(get_settings),
+) -> None:
+    if not settings.admin_api_token or not x_admin_token:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    if not secure_compare(settings.admin_api_token, x_admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+
+def require_service(
+    x_service_token: str | None = Header(default=None),
+    settings: Settings = Depends(get_settings),
+) -> None:
+    if not settings.service_api_token or not x_service_token:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    if not secure_compare(settings.service_api_token, x_service_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
@@ -0,0 +1,135 @@
+import asyncio
+import contextlib
+import time
+from typing import Any
+
+from app.config import Settings
+from app.metrics import ENTITLEMENT_INDEX_LOAD_FAILURES
+from app.pubsub import EntitlementBroker
+from app.repo import AsyncRepo
+
+LOAD_RETRY_SECONDS = 5.0
+
+
+class EntitlementIndexNotReadyError(Exception):
+    pass
+
+
+def _grant(masks: dict[str, int], user_id: str, bit: int) -> int:
+    mask = masks.get(user_id, 0)
+    if mask & bit:
+        return 0
+    masks[user_id] = mask | bit
+    return 1
+
+
+class EntitlementIndex:
+    # Every product id gets one bit, and every user one int with the bits of the products
+    # they own: a grant costs a dict slot per user instead of a set, and a check is two
+    # dict lookups and an AND.
+    def __init__(
+        self,
+        repo: AsyncRepo,
+        *,
+        resync_seconds: float,
+        page_size: int = 10000,
+    ) -> None:
+        self.repo = repo
+        self.resync_seconds = resync_seconds
+        self.page_size = max(1, page_size)
+        self.loaded_at: float | None = None
+        self._bits: dict[str, int] = {}
+        self._masks: dict[str, int] = {}
+        self._grants = 0
+        self._granted_during_load: list[tuple[str, str]] | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded_at is not None
+
+    def _bit(self, product_id: str) -> int:
+        bit = self._bits.get(product_id)
+        if bit is None:
+            bit = self._bits[product_id] = 1 << len(self._bits)
+        return bit
+
+    def add(self, user_id: str, product_id: str) -> None:
+        if self._granted_during_load is not None:
+            self._granted_during_load.append((user_id, product_id))
+        self._grants += _grant(self._masks, user_id, self._bit(product_id))
+
+    def check(self, pairs: list[tuple[str, str]]) -> list[bool]:
+        if self.loaded_at is None:
+            raise EntitlementIndexNotReadyError
+        masks, bits = self._masks, self._bits
+        return [masks.get(user, 0) & bits.get(product, 0) != 0 for user, product in pairs]
+
+    async def load(self) -> None:
+        # Builds a fresh index beside the live one and swaps it in, so checks keep being
+        # answered during a resync and revoked grants drop out.
+        masks: dict[str, int] = {}
+        grants = 0
+        self._granted_during_load = []
+        try:
+            after: tuple[str, str] | None = None
+            while True:
+                rows = await self.repo.list_entitlements_page(after, self.page_size)
+                for row in rows:
+                    bit = self._bit(str(row["product_id"]))
+                    grants += _grant(masks, str(row["user_id"]), bit)
+                if len(rows) < self.page_size:
+                    break
+                after = (str(rows[-1]["user_id"]), str(rows[-1]["product_id"]))
+            # Pages read before a webhook's grant committed won't have it.
+            for user_id, product_id in self._granted_during_load:
+                grants += _grant(masks, user_id, self._bit(product_id))
+        finally:
+            self._granted_during_load = None
+        self._masks, self._grants = masks, grants
+        self.loaded_at = time.monotonic()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "users": len(self._masks),
+            "grants": self._grants,
+            "products": len(self._bits),
+            "age_seconds": time.monotonic() - self.loaded_at if self.loaded_at else None,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.load()
+            except Exception:
+                ENTITLEMENT_INDEX_LOAD_FAILURES.inc()
+            delay = self.resync_seconds if self.ready else LOAD_RETRY_SECONDS
+            await asyncio.sleep(min(self.resync_seconds, delay))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+
+def start_entitlement_index(
+    settings: Settings,
+    repo: AsyncRepo | None,
+    broker: EntitlementBroker,
+) -> EntitlementIndex | None:
+    if repo is None or settings.entitlement_index_resync_seconds <= 0:
+        return None
+    index = EntitlementIndex(
+        repo,
+        resync_seconds=settings.entitlement_index_resync_seconds,
+        page_size=settings.entitlement_index_page_size,
+    )
+    broker.add_listener(index.add)
+    index.start()
+    return index
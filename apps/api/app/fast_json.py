@@ -0,0 +1,38 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data: bytes | str) -> Any:
+    # Both backends read UTF-8 bytes directly and raise ValueError on bad input.
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any) -> bytes:
+    # The backends agree on the app's payloads, but not on everything: orjson writes NaN as
+    # null, spells exponents as 1e16 rather than 1e+16 and rejects non-str keys and
+    # integers past 64 bits. Datetimes go through default=str in both.
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(
+        value,
+        default=str,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,127 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from app import fast_json
+from app.cache import Cache, MemoryCache
+from app.config import Settings
+
+
+class IdempotencyConflictError(Exception):
+    pass
+
+
+class IdempotencyInProgressError(Exception):
+    pass
+
+
+class IdempotencyStore:
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int,
+        cache: Cache | None = None,
+        *,
+        lock_seconds: float = 30.0,
+        poll_seconds: float = 0.05,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.cache = cache if cache is not None else MemoryCache(max_entries)
+        self.lock_seconds = lock_seconds
+        self.poll_seconds = poll_seconds
+        self._inflight: dict[
+            str, tuple[str, asyncio.Task[tuple[dict[str, Any], bool]]]
+        ] = {}
+
+    async def _lookup(self, key: str, fingerprint: str) -> dict[str, Any] | None:
+        raw = await self.cache.get(f"idem:{key}")
+        if raw is None:
+            return None
+        record = fast_json.loads(raw)
+        if record["fingerprint"] != fingerprint:
+            raise IdempotencyConflictError(key)
+        return record["result"]
+
+    async def run(
+        self,
+        key: str,
+        fingerprint: str,
+        operation: Callable[[], Awaitable[dict[str, Any]]],
+    ) -> tuple[dict[str, Any], bool]:
+        result = await self._lookup(key, fingerprint)
+        if result is not None:
+            return result, True
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            inflight_fingerprint, task = inflight
+            if inflight_fingerprint != fingerprint:
+                raise IdempotencyConflictError(key)
+            result, _ = await asyncio.shield(task)
+            return {**result}, True
+
+        task = asyncio.ensure_future(self._claim_and_run(key, fingerprint, operation))
+        self._inflight[key] = (fingerprint, task)
+        # Cleared when the attempt itself ends, not when this caller does: a cancelled
+        # caller leaves the shielded attempt running, and retries must keep joining it.
+        task.add_done_callback(lambda done: self._finish(key, done))
+        result, replayed = await asyncio.shield(task)
+        return {**result}, replayed
+
+    def _finish(self, key: str, task: asyncio.Task[tuple[dict[str, Any], bool]]) -> None:
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight[1] is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def _claim_and_run(
+        self,
+        key: str,
+        fingerprint: str,
+        operation: Callable[[], Awaitable[dict[str, Any]]],
+    ) -> tuple[dict[str, Any], bool]:
+        # The lock only matters when the cache is shared: another worker may be running
+        # the same key, so wait for its record instead of starting a second attempt.
+        lock_key = f"idem-lock:{key}"
+        deadline = time.monotonic() + self.lock_seconds
+        while not await self.cache.add(lock_key, fingerprint.encode("utf-8"), self.lock_seconds):
+            result = await self._lookup(key, fingerprint)
+            if result is not None:
+                return result, True
+            owner = await self.cache.get(lock_key)
+            if owner is not None and owner.decode("utf-8") != fingerprint:
+                raise IdempotencyConflictError(key)
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgressError(key)
+            await asyncio.sleep(self.poll_seconds)
+
+        try:
+            result = await self._lookup(key, fingerprint)
+            if result is not None:
+                return result, True
+            result = await operation()
+            record = fast_json.dumps({"fingerprint": fingerprint, "result": result})
+            await self.cache.set(f"idem:{key}", record, self.ttl_seconds)
+            return result, False
+        finally:
+            await self.cache.delete(lock_key)
+
+
+def build_idempotency_store(settings: Settings, cache: Cache | None) -> IdempotencyStore:
+    # The cross-worker lock must outlive the slowest attempt: every Creem try timing
+    # out, the backoff between them, and one more timeout's worth for the repo writes.
+    attempts = settings.creem_max_retries + 1
+    lock_seconds = (
+        settings.creem_timeout_seconds * attempts
+        + settings.creem_backoff_max_seconds * settings.creem_max_retries
+        + settings.http_timeout_seconds
+    )
+    return IdempotencyStore(
+        ttl_seconds=settings.idempotency_ttl_seconds,
+        max_entries=settings.idempotency_max_entries,
+        cache=cache,
+        lock_seconds=lock_seconds,
+    )
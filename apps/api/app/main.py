@@ -1,12 +1,142 @@
+import asyncio
+import contextlib
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.admission import build_route_limiters
+from app.cache import MemoryCache, build_shared_cache
+from app.catalog import ProductCatalog
 from app.config import get_settings
-from app.routes import checkout, health, me, webhooks
+from app.creem_client import build_creem_client
+from app.deps import build_repo
+from app.deps_auth import build_token_cache, build_token_verifier
+from app.entitlement_index import start_entitlement_index
+from app.fast_json import FastJSONResponse
+from app.http_client import build_http_client
+from app.idempotency import build_idempotency_store
+from app.metrics import MetricsMiddleware
+from app.order_writes import start_order_write_behind
+from app.profiling import ProfilingMiddleware, start_profiler
+from app.prune_events import start_webhook_event_pruning, stop_webhook_event_pruning
+from app.pubsub import EntitlementBroker
+from app.readiness import build_readiness
+from app.reports import RevenueReport
+from app.routes import admin, checkout, entitlements, health, me, metrics, products, webhooks
+from app.seen_events import SeenEvents
+from app.sqlite_repo import SqliteRepo
+from app.webhook_batcher import build_webhook_batcher
+from app.webhook_queue import start_webhook_processor
 
 settings = get_settings()
 
-app = FastAPI(title="Antigravity API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    async with build_http_client(settings) as http_client:
+        app.state.http_client = http_client
+        app.state.repo = build_repo(settings, http_client)
+        if isinstance(app.state.repo, SqliteRepo):
+            await app.state.repo.open()
+        app.state.creem_client = build_creem_client(settings)
+        app.state.shared_cache = build_shared_cache(settings)
+        app.state.token_verifier = build_token_verifier(settings, http_client)
+        app.state.token_cache = build_token_cache(settings, app.state.shared_cache)
+        app.state.idempotency_store = build_idempotency_store(settings, app.state.shared_cache)
+        app.state.catalog = ProductCatalog(
+            ttl_seconds=settings.products_cache_ttl_seconds,
+            cache=app.state.shared_cache,
+        )
+        app.state.revenue_report = RevenueReport(
+            app.state.shared_cache or MemoryCache(4096),
+            closed_ttl_seconds=settings.revenue_cache_ttl_seconds,
+            open_ttl_seconds=settings.revenue_cache_today_ttl_seconds,
+            open_days=settings.revenue_cache_open_days,
+        )
+        app.state.route_limiters = build_route_limiters(settings)
+        app.state.profiler = start_profiler(settings)
+        app.state.entitlement_broker = EntitlementBroker()
+        app.state.entitlement_index = start_entitlement_index(
+            settings,
+            app.state.repo,
+            app.state.entitlement_broker,
+        )
+        app.state.seen_events = SeenEvents(
+            max_entries=settings.webhook_seen_cache_size,
+            ttl_seconds=settings.webhook_seen_cache_ttl_seconds,
+            cache=app.state.shared_cache,
+        )
+        app.state.order_writes = start_order_write_behind(settings, app.state.repo)
+        app.state.webhook_processor = await start_webhook_processor(
+            settings,
+            app.state.repo,
+            app.state.entitlement_broker,
+            app.state.seen_events,
+            app.state.order_writes,
+        )
+        app.state.webhook_batcher = build_webhook_batcher(
+            settings,
+            app.state.repo,
+            app.state.entitlement_broker,
+            app.state.seen_events,
+            app.state.order_writes,
+        )
+        app.state.webhook_event_pruning = start_webhook_event_pruning(settings, app.state.repo)
+        app.state.readiness = build_readiness(
+            settings,
+            http_client=http_client,
+            repo=app.state.repo,
+            catalog=app.state.catalog,
+            creem=app.state.creem_client,
+            verifier=app.state.token_verifier,
+            webhooks=app.state.webhook_processor,
+        )
+
+        # Warm up in the background so /api/health answers while /api/ready still says 503.
+        warmup = asyncio.create_task(app.state.readiness.warm_up())
+
+        yield
+
+        warmup.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await warmup
+        if app.state.profiler is not None:
+            app.state.profiler.stop()
+            app.state.profiler = None
+        if app.state.entitlement_index is not None:
+            await app.state.entitlement_index.stop()
+            app.state.entitlement_index = None
+        await stop_webhook_event_pruning(app.state.webhook_event_pruning)
+        app.state.webhook_event_pruning = None
+        if app.state.webhook_batcher is not None:
+            await app.state.webhook_batcher.stop()
+            app.state.webhook_batcher = None
+        if app.state.webhook_processor is not None:
+            await app.state.webhook_processor.stop()
+            await app.state.webhook_processor.queue.close()
+            app.state.webhook_processor = None
+        if app.state.order_writes is not None:
+            await app.state.order_writes.stop()
+            app.state.order_writes = None
+        if isinstance(app.state.repo, SqliteRepo):
+            await app.state.repo.close()
+        if app.state.shared_cache is not None:
+            await app.state.shared_cache.close()
+            app.state.shared_cache = None
+        await app.state.creem_client.client.aclose()
+        app.state.creem_client = None
+        app.state.repo = None
+        app.state.token_verifier = None
+        app.state.readiness = None
+
+
+app = FastAPI(
+    title="Antigravity API",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,9 +144,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(health.router, prefix="/api", tags=["health"])
+app.include_router(metrics.router, prefix="/api", tags=["metrics"])
 app.include_router(me.router, prefix="/api", tags=["auth"])
+app.include_router(products.router, prefix="/api", tags=["products"])
 app.include_router(checkout.router, prefix="/api", tags=["checkout"])
+app.include_router(entitlements.router, prefix="/api", tags=["entitlements"])
 app.include_router(webhooks.router, prefix="/api", tags=["webhooks"])
+app.include_router(admin.router, prefix="/api", tags=["admin"])
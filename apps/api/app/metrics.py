@@ -0,0 +1,279 @@
+import time
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Metrics are only mutated from the event loop thread, so no locking is needed.
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def samples(self) -> Iterator[str]:
+        for label_values, value in sorted(self._values.items()):
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values: str, amount: float = 1.0) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values: str, value: float) -> None:
+        self._values[label_values] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            # Per-bucket counts, then sum and count.
+            series = self._series[label_values] = [0.0] * (len(self.buckets) + 3)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return int(series[-1]) if series else 0
+
+    def samples(self) -> Iterator[str]:
+        bounds = (*self.buckets, float("inf"))
+        for label_values, series in sorted(self._series.items()):
+            cumulative = 0.0
+            for bound, bucket_count in zip(bounds, series, strict=False):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, label_values, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {_format_value(cumulative)}"
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {_format_value(series[-2])}"
+            yield f"{self.name}_count{labels} {_format_value(series[-1])}"
+
+
+Metric = Counter | Gauge | Histogram
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, extra: Iterable[Metric] = ()) -> str:
+        lines: list[str] = []
+        for metric in (*self._metrics, *extra):
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS: Histogram = REGISTRY.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route.",
+        ("method", "route", "status"),
+    )
+)
+HTTP_IN_FLIGHT: Gauge = REGISTRY.register(
+    Gauge("http_requests_in_flight", "HTTP requests currently being served.")
+)
+OUTBOUND_REQUEST_SECONDS: Histogram = REGISTRY.register(
+    Histogram(
+        "outbound_request_duration_seconds",
+        "Outbound call latency by target and operation.",
+        ("target", "operation", "status"),
+    )
+)
+OUTBOUND_IN_FLIGHT: Gauge = REGISTRY.register(
+    Gauge("outbound_requests_in_flight", "Outbound calls currently waiting.", ("target",))
+)
+WEBHOOK_DELIVERIES: Counter = REGISTRY.register(
+    Counter("webhook_deliveries_total", "Webhook deliveries by result.", ("result",))
+)
+WEBHOOK_EVENTS: Counter = REGISTRY.register(
+    Counter("webhook_events_total", "Processed webhook events by outcome.", ("outcome",))
+)
+WEBHOOK_QUEUE_LOOP_ERRORS: Counter = REGISTRY.register(
+    Counter(
+        "webhook_queue_loop_errors_total",
+        "Journal errors caught by the queued webhook loops.",
+        ("loop",),
+    )
+)
+WEBHOOK_EVENTS_PRUNED: Counter = REGISTRY.register(
+    Counter("webhook_events_pruned_total", "Expired webhook_events rows deleted.")
+)
+WEBHOOK_EVENT_PRUNE_FAILURES: Counter = REGISTRY.register(
+    Counter("webhook_event_prune_failures_total", "Failed scheduled webhook_events prunes.")
+)
+ORDER_WRITES: Counter = REGISTRY.register(
+    Counter("order_writes_total", "Write-behind order state writes by result.", ("result",))
+)
+ORDER_WRITE_FAILURES: Counter = REGISTRY.register(
+    Counter("order_write_failures_total", "Failed write-behind order flushes.")
+)
+ENTITLEMENT_INDEX_LOAD_FAILURES: Counter = REGISTRY.register(
+    Counter("entitlement_index_load_failures_total", "Failed entitlement index loads.")
+)
+PROFILES_CAPTURED: Counter = REGISTRY.register(
+    Counter("profiles_captured_total", "Saved request profiles by trigger.", ("reason",))
+)
+PROFILE_SAVE_FAILURES: Counter = REGISTRY.register(
+    Counter("profile_save_failures_total", "Request profiles that could not be written.")
+)
+ADMISSION_REJECTIONS: Counter = REGISTRY.register(
+    Counter(
+        "admission_rejections_total",
+        "Requests rejected before doing any work, by route and reason.",
+        ("route", "reason"),
+    )
+)
+
+_stages: ContextVar[dict[str, float] | None] = ContextVar("metrics_stages", default=None)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    stages = _stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+@contextmanager
+def outbound_timer(target: str, operation: str) -> Iterator[list[str]]:
+    # Callers append the response status to the yielded list; failures stay "error".
+    result = ["error"]
+    OUTBOUND_IN_FLIGHT.inc(target)
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        elapsed = time.perf_counter() - started
+        OUTBOUND_IN_FLIGHT.dec(target)
+        OUTBOUND_REQUEST_SECONDS.observe(elapsed, target, operation, result[-1])
+        record_stage(target, elapsed)
+
+
+def server_timing(stages: dict[str, float], total: float) -> str:
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stages: dict[str, float] = {}
+        token = _stages.set(stages)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                timing = server_timing(stages, time.perf_counter() - started)
+                headers.append((b"server-timing", timing.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            _stages.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                path,
+                str(status_code),
+            )
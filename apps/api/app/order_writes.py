@@ -0,0 +1,131 @@
+import asyncio
+import contextlib
+from itertools import islice
+from typing import Any
+
+from app.config import Settings
+from app.metrics import ORDER_WRITE_FAILURES, ORDER_WRITES
+from app.repo import AsyncRepo
+
+
+class OrderWriteBehind:
+    # Holds order state writes that don't affect the response and applies them in
+    # batches. Writes for the same request_id are merged so the last one wins.
+    def __init__(
+        self,
+        repo: AsyncRepo,
+        *,
+        interval_seconds: float,
+        batch_size: int = 500,
+        max_pending: int = 10000,
+        retry_base_seconds: float = 0.5,
+        retry_max_seconds: float = 30.0,
+    ) -> None:
+        self.repo = repo
+        self.interval_seconds = interval_seconds
+        self.batch_size = max(1, batch_size)
+        self.max_pending = max(1, max_pending)
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._pending: dict[str, dict[str, Any]] = {}
+        self._inflight: dict[str, dict[str, Any]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending) + len(self._inflight)
+
+    def has_pending(self, request_ids: list[str]) -> bool:
+        return any(key in self._pending or key in self._inflight for key in request_ids)
+
+    async def submit(self, request_id: str, **fields: Any) -> None:
+        queued = request_id in self._pending or request_id in self._inflight
+        if not queued and len(self._pending) >= self.max_pending:
+            # Full: write through, so memory stays bounded and the caller feels the backlog.
+            ORDER_WRITES.inc("write_through")
+            await self.repo.apply_order_updates([{"request_id": request_id, **fields}])
+            return
+
+        ORDER_WRITES.inc("coalesced" if request_id in self._pending else "queued")
+        self._pending[request_id] = {**self._pending.get(request_id, {}), **fields}
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _flush_batch(self) -> bool:
+        async with self._flush_lock:
+            if not self._pending:
+                return False
+            keys = list(islice(self._pending, self.batch_size))
+            self._inflight = {key: self._pending.pop(key) for key in keys}
+            try:
+                await self.repo.apply_order_updates(
+                    [{"request_id": key, **fields} for key, fields in self._inflight.items()]
+                )
+            except BaseException:
+                # Put the batch back underneath anything written since, so the last write wins.
+                for key, fields in self._inflight.items():
+                    self._pending[key] = {**fields, **self._pending.get(key, {})}
+                raise
+            finally:
+                flushed, self._inflight = len(self._inflight), {}
+            ORDER_WRITES.inc("flushed", amount=flushed)
+            return True
+
+    async def flush(self, request_ids: list[str] | None = None) -> None:
+        # Readers pass the request_ids they are about to touch; the flush only happens
+        # when one of them still has a write waiting here.
+        if request_ids is not None and not self.has_pending(request_ids):
+            return
+        while await self._flush_batch():
+            pass
+
+    async def _run(self) -> None:
+        failures = 0
+        while True:
+            with contextlib.suppress(TimeoutError):
+                async with asyncio.timeout(self.interval_seconds):
+                    await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                ORDER_WRITE_FAILURES.inc()
+                failures += 1
+                delay = self.retry_base_seconds * 2 ** (failures - 1)
+                await asyncio.sleep(min(self.retry_max_seconds, delay))
+            else:
+                failures = 0
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            ORDER_WRITE_FAILURES.inc()
+            ORDER_WRITES.inc("dropped", amount=self.pending_count)
+
+
+def start_order_write_behind(
+    settings: Settings,
+    repo: AsyncRepo | None,
+) -> OrderWriteBehind | None:
+    if repo is None or settings.order_write_behind_interval_ms <= 0:
+        return None
+    writes = OrderWriteBehind(
+        repo,
+        interval_seconds=settings.order_write_behind_interval_ms / 1000,
+        batch_size=settings.order_write_behind_batch_size,
+        max_pending=settings.order_write_behind_max_pending,
+        retry_base_seconds=settings.order_write_behind_retry_base_seconds,
+    )
+    writes.start()
+    return writes
@@ -0,0 +1,350 @@
+import asyncio
+import contextlib
+import itertools
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from secrets import token_hex
+from types import FrameType
+from typing import Any, Literal
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app import fast_json
+from app.config import Settings
+from app.metrics import PROFILE_SAVE_FAILURES, PROFILES_CAPTURED
+
+ProfileFormat = Literal["speedscope", "collapsed"]
+FrameKey = tuple[str, str, int]
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+PROFILE_SUFFIXES = (".speedscope.json", ".collapsed.txt")
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+# Held open for up to a minute by design (SSE and long-poll); never worth profiling.
+UNPROFILED_PATHS = frozenset({"/api/entitlements/stream"})
+
+
+@dataclass
+class Capture:
+    id: str
+    method: str
+    route: str
+    status: int
+    reason: str
+    duration_ms: float
+    samples: int
+    captured_at: float
+    file: str
+
+
+@dataclass(eq=False)
+class ProfiledRequest:
+    task: asyncio.Task[Any] | None
+    started: float
+    reason: str | None = None
+    timer: asyncio.TimerHandle | None = None
+    stacks: Counter[tuple[FrameKey, ...]] = field(default_factory=Counter)
+
+
+def _frame_key(frame: FrameType) -> FrameKey:
+    code = frame.f_code
+    return code.co_name, code.co_filename, code.co_firstlineno
+
+
+def _await_chain(task: asyncio.Task[Any]) -> list[FrameType]:
+    # Where a suspended task is parked: its coroutine and everything it awaits.
+    frames: list[FrameType] = []
+    awaitable: Any = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return frames
+
+
+def _running_stack(task: asyncio.Task[Any], top: FrameType) -> list[FrameType]:
+    frames: list[FrameType] = []
+    frame: FrameType | None = top
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    root = getattr(task.get_coro(), "cr_frame", None)
+    for index, candidate in enumerate(frames):
+        if candidate is root:
+            return frames[index:]
+    return frames
+
+
+class SamplingProfiler:
+    # Stacks are only collected for armed requests: a random sample_rate fraction from
+    # the start, and any request still running threshold_seconds after it began. At most
+    # max_armed requests are sampled at once, so a burst of slow requests can't turn every
+    # tick into a walk over all of them. The sampler thread sleeps while nothing is armed.
+    def __init__(
+        self,
+        directory: str,
+        *,
+        threshold_seconds: float = 0.0,
+        sample_rate: float = 0.0,
+        interval_seconds: float = 0.005,
+        max_files: int = 200,
+        max_armed: int = 8,
+        output_format: ProfileFormat = "speedscope",
+    ) -> None:
+        self.directory = Path(directory)
+        self.threshold_seconds = threshold_seconds
+        self.sample_rate = sample_rate
+        self.interval_seconds = interval_seconds
+        self.max_files = max(1, max_files)
+        self.max_armed = max(1, max_armed)
+        self.output_format = output_format
+        self.captures: deque[Capture] = deque()
+        self._sequence = itertools.count(1)
+        self._armed: dict[asyncio.Task[Any], ProfiledRequest] = {}
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id = 0
+
+    def start(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def begin(self) -> ProfiledRequest:
+        request = ProfiledRequest(asyncio.current_task(), time.perf_counter())
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            self._arm(request, "sampled")
+        elif self.threshold_seconds > 0:
+            request.timer = asyncio.get_running_loop().call_later(
+                self.threshold_seconds, self._arm, request, "slow"
+            )
+        return request
+
+    def _arm(self, request: ProfiledRequest, reason: str) -> None:
+        if request.task is None or len(self._armed) >= self.max_armed:
+            return
+        request.reason = reason
+        self._armed[request.task] = request
+        self._wakeup.set()
+
+    def discard(self, request: ProfiledRequest) -> None:
+        if request.timer is not None:
+            request.timer.cancel()
+        if request.task is not None:
+            self._armed.pop(request.task, None)
+        request.task = None
+        request.reason = None
+
+    def finish(self, request: ProfiledRequest) -> float:
+        if request.timer is not None:
+            request.timer.cancel()
+        if request.task is not None:
+            self._armed.pop(request.task, None)
+        return time.perf_counter() - request.started
+
+    def _sample_loop(self) -> None:
+        while not self._stopping.is_set():
+            if not self._armed:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            time.sleep(self.interval_seconds)
+            self._sample()
+
+    def _sample(self) -> None:
+        top = sys._current_frames().get(self._loop_thread_id)
+        running = asyncio.current_task(self._loop) if self._loop is not None else None
+        for request in list(self._armed.values()):
+            task = request.task
+            if task is None or task.done():
+                continue
+            if task is running and top is not None:
+                frames = _running_stack(task, top)
+            else:
+                frames = _await_chain(task)
+            if frames:
+                request.stacks[tuple(_frame_key(frame) for frame in frames)] += 1
+
+    def render(
+        self,
+        stacks: Counter[tuple[FrameKey, ...]],
+        name: str,
+        duration: float,
+    ) -> bytes:
+        interval_ms = self.interval_seconds * 1000
+        if self.output_format == "collapsed":
+            lines = [
+                ";".join(f"{frame[0]} ({frame[1]}:{frame[2]})" for frame in stack) + f" {count}"
+                for stack, count in stacks.most_common()
+            ]
+            return ("\n".join(lines) + "\n").encode("utf-8")
+
+        frames: dict[FrameKey, int] = {}
+        samples: list[list[int]] = []
+        weights: list[float] = []
+        for stack, count in stacks.items():
+            samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+            weights.append(count * interval_ms)
+        return fast_json.dumps(
+            {
+                "$schema": SPEEDSCOPE_SCHEMA,
+                "name": name,
+                "exporter": "antigravity-api",
+                "shared": {
+                    "frames": [
+                        {"name": frame[0], "file": frame[1], "line": frame[2]} for frame in frames
+                    ]
+                },
+                "profiles": [
+                    {
+                        "type": "sampled",
+                        "name": name,
+                        "unit": "milliseconds",
+                        "startValue": 0,
+                        "endValue": round(duration * 1000, 3),
+                        "samples": samples,
+                        "weights": weights,
+                    }
+                ],
+            }
+        )
+
+    def _write(self, path: Path, body: bytes) -> set[str]:
+        path.write_bytes(body)
+        # Other workers write to the same directory, so the bound comes from the listing.
+        files: list[tuple[int, str]] = []
+        for entry in self.directory.iterdir():
+            if entry.name.endswith(PROFILE_SUFFIXES):
+                with contextlib.suppress(FileNotFoundError):
+                    files.append((entry.stat().st_mtime_ns, entry.name))
+        files.sort()
+        for _, name in files[: max(0, len(files) - self.max_files)]:
+            (self.directory / name).unlink(missing_ok=True)
+        return {name for _, name in files[-self.max_files :]}
+
+    async def save(
+        self,
+        request: ProfiledRequest,
+        duration: float,
+        *,
+        method: str,
+        route: str,
+        status: int,
+    ) -> Capture | None:
+        # The sampler thread may still be adding to request.stacks; work on a copy.
+        stacks = Counter(dict(request.stacks))
+        if request.reason is None or not stacks:
+            return None
+        captured_at = time.time()
+        slug = _UNSAFE.sub("_", route).strip("_") or "root"
+        # Workers share the directory: the random part keeps their ids and files apart.
+        capture_id = f"{int(captured_at * 1000)}-{next(self._sequence)}-{token_hex(3)}-{slug}"
+        suffix = PROFILE_SUFFIXES[0 if self.output_format == "speedscope" else 1]
+        capture = Capture(
+            id=capture_id,
+            method=method,
+            route=route,
+            status=status,
+            reason=request.reason,
+            duration_ms=round(duration * 1000, 1),
+            samples=sum(stacks.values()),
+            captured_at=captured_at,
+            file=f"{capture_id}{suffix}",
+        )
+        body = self.render(stacks, f"{method} {route}", duration)
+        kept = await asyncio.to_thread(self._write, self.directory / capture.file, body)
+        # The index is only touched on the event loop; the thread just does file I/O.
+        self.captures.append(capture)
+        self.captures = deque(entry for entry in self.captures if entry.file in kept)
+        PROFILES_CAPTURED.inc(request.reason)
+        return capture
+
+    def slowest(self, route: str | None = None, limit: int = 20) -> list[dict[str, Any]]:
+        captures = [capture for capture in self.captures if route is None or capture.route == route]
+        captures.sort(key=lambda capture: capture.duration_ms, reverse=True)
+        return [asdict(capture) for capture in captures[:limit]]
+
+    def path_for(self, capture_id: str) -> Path | None:
+        for capture in self.captures:
+            if capture.id == capture_id:
+                return self.directory / capture.file
+        return None
+
+
+class ProfilingMiddleware:
+    # Passes requests straight through unless app.state.profiler is set.
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        profiler = None
+        if scope["type"] == "http" and "app" in scope:
+            profiler = getattr(scope["app"].state, "profiler", None)
+        if profiler is None or scope["path"] in UNPROFILED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        request = profiler.begin()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = dict(message.get("headers", []))
+                if headers.get(b"content-type", b"").startswith(b"text/event-stream"):
+                    profiler.discard(request)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = profiler.finish(request)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            # A profile that can't be written must not replace the request's own outcome.
+            try:
+                await profiler.save(
+                    request,
+                    duration,
+                    method=scope["method"],
+                    route=route,
+                    status=status_code,
+                )
+            except Exception:
+                PROFILE_SAVE_FAILURES.inc()
+
+
+def start_profiler(settings: Settings) -> SamplingProfiler | None:
+    if settings.profile_slow_ms <= 0 and settings.profile_sample_rate <= 0:
+        return None
+    profiler = SamplingProfiler(
+        settings.profile_dir,
+        threshold_seconds=settings.profile_slow_ms / 1000,
+        sample_rate=settings.profile_sample_rate,
+        interval_seconds=settings.profile_interval_ms / 1000,
+        max_files=settings.profile_max_files,
+        max_armed=settings.profile_max_armed,
+        output_format=settings.profile_format,
+    )
+    profiler.start()
+    return profiler
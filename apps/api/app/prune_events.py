@@ -0,0 +1,165 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from app.config import Settings, get_settings
+from app.deps import build_repo
+from app.http_client import build_http_client
+from app.metrics import WEBHOOK_EVENT_PRUNE_FAILURES, WEBHOOK_EVENTS_PRUNED
+from app.repo import AsyncRepo
+from app.sqlite_repo import SqliteRepo
+
+# Keys younger than this can still be redelivered by Creem retries and must stay deduped.
+MIN_RETENTION_HOURS = 72.0
+
+
+@dataclass
+class PruneStats:
+    deleted: int = 0
+    batches: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    def report(self) -> dict[str, Any]:
+        elapsed = time.monotonic() - self.started_at
+        report = asdict(self)
+        del report["started_at"]
+        report["elapsed_seconds"] = round(elapsed, 3)
+        report["rows_per_second"] = round(self.deleted / elapsed, 1) if elapsed else 0.0
+        return report
+
+
+class WebhookEventPruner:
+    def __init__(
+        self,
+        repo: AsyncRepo,
+        *,
+        retention_hours: float,
+        batch_size: int = 1000,
+        pause_seconds: float = 0.0,
+    ) -> None:
+        if retention_hours < MIN_RETENTION_HOURS:
+            raise ValueError(
+                f"webhook event retention must be at least {MIN_RETENTION_HOURS:g} hours"
+            )
+        self.repo = repo
+        self.retention_hours = retention_hours
+        self.batch_size = max(1, batch_size)
+        self.pause_seconds = pause_seconds
+
+    async def run(self) -> PruneStats:
+        stats = PruneStats()
+        received_before = (datetime.now(UTC) - timedelta(hours=self.retention_hours)).isoformat()
+        while True:
+            deleted = await self.repo.prune_webhook_events(received_before, self.batch_size)
+            stats.batches += 1
+            stats.deleted += deleted
+            WEBHOOK_EVENTS_PRUNED.inc(amount=deleted)
+            if deleted < self.batch_size:
+                return stats
+            await asyncio.sleep(self.pause_seconds)
+
+
+async def _prune_periodically(pruner: WebhookEventPruner, interval_seconds: float) -> None:
+    while True:
+        try:
+            await pruner.run()
+        except Exception:
+            WEBHOOK_EVENT_PRUNE_FAILURES.inc()
+        await asyncio.sleep(interval_seconds)
+
+
+def start_webhook_event_pruning(
+    settings: Settings,
+    repo: AsyncRepo | None,
+) -> asyncio.Task[None] | None:
+    if repo is None or settings.webhook_events_prune_interval_seconds <= 0:
+        return None
+
+    pruner = WebhookEventPruner(
+        repo,
+        retention_hours=settings.webhook_events_retention_hours,
+        batch_size=settings.webhook_events_prune_batch_size,
+        pause_seconds=settings.webhook_events_prune_pause_seconds,
+    )
+    return asyncio.create_task(
+        _prune_periodically(pruner, settings.webhook_events_prune_interval_seconds)
+    )
+
+
+async def stop_webhook_event_pruning(task: asyncio.Task[None] | None) -> None:
+    if task is None:
+        return
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(
+        prog="python -m app.prune_events",
+        description="Delete webhook_events rows older than the retention window.",
+    )
+    parser.add_argument(
+        "--retention-hours",
+        type=float,
+        default=settings.webhook_events_retention_hours,
+        help=f"keep events newer than this, at least {MIN_RETENTION_HOURS:g}",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=settings.webhook_events_prune_batch_size,
+    )
+    parser.add_argument(
+        "--pause-seconds",
+        type=float,
+        default=settings.webhook_events_prune_pause_seconds,
+        help="sleep between batches to leave room for live traffic",
+    )
+    args = parser.parse_args(argv)
+    if args.retention_hours < MIN_RETENTION_HOURS:
+        parser.error(f"--retention-hours must be at least {MIN_RETENTION_HOURS:g}")
+    return args
+
+
+async def _main(args: argparse.Namespace) -> dict[str, Any]:
+    settings = get_settings()
+    async with build_http_client(settings) as http_client:
+        repo = build_repo(settings, http_client)
+        if repo is None:
+            raise RuntimeError("Supabase settings are missing")
+        if isinstance(repo, SqliteRepo):
+            await repo.open()
+        try:
+            pruner = WebhookEventPruner(
+                repo,
+                retention_hours=args.retention_hours,
+                batch_size=args.batch_size,
+                pause_seconds=args.pause_seconds,
+            )
+            stats = await pruner.run()
+        finally:
+            if isinstance(repo, SqliteRepo):
+                await repo.close()
+
+    report = stats.report()
+    report["retention_hours"] = args.retention_hours
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    report = asyncio.run(_main(_parse_args(argv)))
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,164 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import httpx
+
+from app.auth_local import LocalTokenVerifier
+from app.catalog import ProductCatalog
+from app.config import Settings
+from app.creem_client import CreemClient
+from app.repo import AsyncRepo
+from app.webhook_queue import WebhookProcessor
+
+Probe = Callable[[], Awaitable[None]]
+
+
+class Readiness:
+    def __init__(
+        self,
+        probes: dict[str, Probe],
+        *,
+        informational: dict[str, Probe] | None = None,
+        warmups: list[Probe] | None = None,
+        connections: int = 1,
+        ttl_seconds: float = 10.0,
+        timeout_seconds: float = 2.0,
+    ) -> None:
+        self.probes = probes
+        self.informational = informational or {}
+        self.warmups = warmups or []
+        self.connections = max(1, connections)
+        self.ttl_seconds = ttl_seconds
+        self.timeout_seconds = timeout_seconds
+        self.warm = False
+        self._results: dict[str, dict[str, Any]] = {}
+        self._info_results: dict[str, dict[str, Any]] = {}
+        self._checked_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    async def _probe(self, probe: Probe) -> dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.timeout_seconds):
+                await probe()
+        except Exception as exc:
+            error: str | None = type(exc).__name__
+        else:
+            error = None
+        return {
+            "ok": error is None,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "error": error,
+        }
+
+    async def _check_all(
+        self, probes: dict[str, Probe], copies: int
+    ) -> dict[str, dict[str, Any]]:
+        names = list(probes)
+        results = await asyncio.gather(
+            *(self._probe(probes[name]) for name in names for _ in range(copies))
+        )
+        # With several copies per probe, a dependency counts as reachable if any copy got through.
+        return {
+            name: max(results[index * copies : (index + 1) * copies], key=lambda r: r["ok"])
+            for index, name in enumerate(names)
+        }
+
+    async def _check(self, copies: int = 1) -> None:
+        self._results, self._info_results = await asyncio.gather(
+            self._check_all(self.probes, copies),
+            self._check_all(self.informational, copies),
+        )
+        self._checked_at = time.monotonic()
+
+    async def warm_up(self) -> None:
+        # Concurrent probes leave one open keep-alive connection each in the shared pools.
+        await asyncio.gather(
+            self._check(self.connections),
+            *(self._probe(warmup) for warmup in self.warmups),
+        )
+        self.warm = True
+
+    async def status(self) -> dict[str, Any]:
+        if self.warm:
+            async with self._lock:
+                checked_at = self._checked_at
+                if checked_at is None or time.monotonic() - checked_at >= self.ttl_seconds:
+                    await self._check()
+
+        # Only in-house dependencies gate readiness. An upstream outage would otherwise take
+        # every instance out of the load balancer at once, even for routes that don't use it.
+        dependencies = dict(self._results)
+        return {
+            "ready": self.warm and all(result["ok"] for result in dependencies.values()),
+            "warm": self.warm,
+            "dependencies": dependencies,
+            "informational": dict(self._info_results),
+        }
+
+
+def _http_probe(client: httpx.AsyncClient, url: str, headers: dict[str, str]) -> Probe:
+    async def probe() -> None:
+        response = await client.get(url, headers=headers)
+        if response.status_code >= 500:
+            raise httpx.HTTPStatusError(
+                f"{response.status_code} from {url}",
+                request=response.request,
+                response=response,
+            )
+
+    return probe
+
+
+def build_readiness(
+    settings: Settings,
+    *,
+    http_client: httpx.AsyncClient,
+    repo: AsyncRepo | None,
+    catalog: ProductCatalog,
+    creem: CreemClient,
+    verifier: LocalTokenVerifier | None,
+    webhooks: WebhookProcessor | None = None,
+) -> Readiness:
+    probes: dict[str, Probe] = {}
+    informational: dict[str, Probe] = {}
+    warmups: list[Probe] = []
+
+    if repo is not None:
+
+        async def repo_probe() -> None:
+            await repo.list_entitlements_page(None, 1)
+
+        async def catalog_warmup() -> None:
+            await catalog.refresh(repo)
+
+        probes["repo"] = repo_probe
+        warmups.append(catalog_warmup)
+
+    if webhooks is not None:
+        probes["queue"] = webhooks.check
+
+    if settings.supabase_url:
+        informational["supabase_auth"] = _http_probe(
+            http_client,
+            f"{settings.supabase_url.rstrip('/')}/auth/v1/health",
+            {"apikey": settings.supabase_anon_key},
+        )
+
+    if settings.creem_api_key:
+        informational["creem"] = _http_probe(creem.client, creem.base_url, {})
+
+    jwks = verifier.jwks if verifier is not None else None
+    if jwks is not None:
+        warmups.append(jwks.prime)
+
+    return Readiness(
+        probes,
+        informational=informational,
+        warmups=warmups,
+        connections=settings.warmup_connections,
+        ttl_seconds=settings.ready_check_ttl_seconds,
+        timeout_seconds=settings.ready_check_timeout_seconds,
+    )
@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+from fastapi import HTTPException
+
+from app.config import get_settings
+from app.creem_client import CreemClient, build_creem_client
+from app.deps import build_repo
+from app.http_client import build_http_client
+from app.repo import AsyncRepo
+from app.sqlite_repo import SqliteRepo
+from app.webhook_events import paid_checkout_fields
+
+Cursor = tuple[str, str]
+
+_CHECK_FAILED: dict[str, Any] = {}
+
+
+@dataclass
+class ReconcileStats:
+    scanned: int = 0
+    pages: int = 0
+    without_checkout: int = 0
+    still_open: int = 0
+    paid: int = 0
+    applied: int = 0
+    errors: int = 0
+    checkpoint_held: bool = False
+    started_at: float = field(default_factory=time.monotonic)
+
+    def report(self) -> dict[str, Any]:
+        elapsed = time.monotonic() - self.started_at
+        report = asdict(self)
+        del report["started_at"]
+        report["elapsed_seconds"] = round(elapsed, 3)
+        report["orders_per_second"] = round(self.scanned / elapsed, 1) if elapsed else 0.0
+        return report
+
+
+class Reconciler:
+    def __init__(
+        self,
+        repo: AsyncRepo,
+        creem: CreemClient,
+        *,
+        statuses: list[str],
+        page_size: int = 500,
+        concurrency: int = 16,
+        dry_run: bool = False,
+        created_before: str | None = None,
+    ) -> None:
+        self.repo = repo
+        self.creem = creem
+        self.statuses = statuses
+        self.page_size = page_size
+        self.dry_run = dry_run
+        self.created_before = created_before
+        self.stats = ReconcileStats()
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _fetch_page(self, after: Cursor | None) -> list[dict[str, Any]]:
+        return await self.repo.list_orders_page(
+            self.statuses,
+            after,
+            self.page_size,
+            created_before=self.created_before,
+        )
+
+    def _cursor(self, order: dict[str, Any]) -> Cursor:
+        return str(order["created_at"]), str(order["id"])
+
+    async def _check(self, order: dict[str, Any]) -> dict[str, Any] | None:
+        checkout_id = order.get("creem_checkout_id")
+        if not checkout_id:
+            self.stats.without_checkout += 1
+            return None
+
+        async with self._semaphore:
+            try:
+                checkout = await self.creem.get_checkout(str(checkout_id))
+            except HTTPException:
+                self.stats.errors += 1
+                return _CHECK_FAILED
+
+        paid = paid_checkout_fields(checkout) if isinstance(checkout, dict) else None
+        if paid is None:
+            self.stats.still_open += 1
+            return None
+        return {**order, **paid}
+
+    async def _apply(self, paid_orders: list[dict[str, Any]]) -> None:
+        self.stats.paid += len(paid_orders)
+        if self.dry_run or not paid_orders:
+            return
+
+        await self.repo.bulk_mark_orders_paid(paid_orders)
+        await self.repo.bulk_grant_entitlements(
+            [(str(order["user_id"]), str(order["product_id"])) for order in paid_orders]
+        )
+        self.stats.applied += len(paid_orders)
+
+    async def run(
+        self,
+        after: Cursor | None = None,
+        on_checkpoint: Callable[[Cursor], None] | None = None,
+    ) -> ReconcileStats:
+        page = await self._fetch_page(after)
+        while page:
+            cursor = self._cursor(page[-1])
+            next_page = asyncio.create_task(self._fetch_page(cursor))
+            try:
+                results = await asyncio.gather(*(self._check(order) for order in page))
+                await self._apply(
+                    [order for order in results if order is not None and order is not _CHECK_FAILED]
+                )
+            except BaseException:
+                next_page.cancel()
+                raise
+
+            self.stats.scanned += len(page)
+            self.stats.pages += 1
+            # The checkpoint never moves past an order whose check failed, so a resumed run
+            # retries it; the rest of this run still goes on to the end.
+            if on_checkpoint is not None and not self.stats.checkpoint_held:
+                failed = next(
+                    (index for index, result in enumerate(results) if result is _CHECK_FAILED),
+                    None,
+                )
+                if failed is None:
+                    on_checkpoint(cursor)
+                else:
+                    self.stats.checkpoint_held = True
+                    if failed > 0:
+                        on_checkpoint(self._cursor(page[failed - 1]))
+            page = await next_page
+
+        return self.stats
+
+
+def _load_checkpoint(path: Path) -> Cursor | None:
+    if not path.exists():
+        return None
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return str(data["created_at"]), str(data["id"])
+
+
+def _save_checkpoint(path: Path, cursor: Cursor) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps({"created_at": cursor[0], "id": cursor[1]}), encoding="utf-8")
+    tmp.replace(path)
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.reconcile",
+        description="Reconcile pending/failed orders against Creem checkout status.",
+    )
+    parser.add_argument("--statuses", default="pending,failed")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--min-age-minutes",
+        type=float,
+        default=60.0,
+        help="skip orders newer than this, they may still be in checkout",
+    )
+    parser.add_argument("--checkpoint", default="reconcile.checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--dry-run", action="store_true")
+    return parser.parse_args(argv)
+
+
+async def _main(args: argparse.Namespace) -> dict[str, Any]:
+    settings = get_settings()
+    checkpoint = Path(args.checkpoint)
+    after = None if args.restart else _load_checkpoint(checkpoint)
+    created_before = (datetime.now(UTC) - timedelta(minutes=args.min_age_minutes)).isoformat()
+
+    creem = build_creem_client(settings)
+    async with build_http_client(settings) as http_client, creem.client:
+        repo = build_repo(settings, http_client)
+        if repo is None:
+            raise RuntimeError("Supabase settings are missing")
+        if isinstance(repo, SqliteRepo):
+            await repo.open()
+        try:
+            reconciler = Reconciler(
+                repo,
+                creem,
+                statuses=[status for status in args.statuses.split(",") if status],
+                page_size=args.page_size,
+                concurrency=args.concurrency,
+                dry_run=args.dry_run,
+                created_before=created_before,
+            )
+            on_checkpoint = None if args.dry_run else lambda c: _save_checkpoint(checkpoint, c)
+            stats = await reconciler.run(after=after, on_checkpoint=on_checkpoint)
+        finally:
+            if isinstance(repo, SqliteRepo):
+                await repo.close()
+
+    report = stats.report()
+    report["dry_run"] = args.dry_run
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    report = asyncio.run(_main(_parse_args(argv)))
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -7,13 +7,17 @@ from uuid import uuid4
 import httpx
 
 from app.config import Settings
+from app.metrics import outbound_timer
 
 
-class Repo(Protocol):
-    def get_product(self, product_id: str) -> dict[str, Any] | None:
+class AsyncRepo(Protocol):
+    async def get_product(self, product_id: str) -> dict[str, Any] | None:
         ...
 
-    def create_order_pending(
+    async def list_active_products(self) -> list[dict[str, Any]]:
+        ...
+
+    async def create_order_pending(
         self,
         user_id: str,
         product_id: str,
@@ -21,16 +25,23 @@ class Repo(Protocol):
     ) -> dict[str, Any]:
         ...
 
-    def update_order_failed(self, request_id: str) -> None:
+    async def update_order_failed(self, request_id: str) -> None:
+        ...
+
+    async def update_order_checkout_ids(
+        self,
+        request_id: str,
+        creem_checkout_id: str | None,
+    ) -> None:
         ...
 
-    def update_order_checkout_ids(self, request_id: str, creem_checkout_id: str | None) -> None:
+    async def apply_order_updates(self, updates: list[dict[str, Any]]) -> None:
         ...
 
-    def get_order_by_request_id(self, request_id: str) -> dict[str, Any] | None:
+    async def get_order_by_request_id(self, request_id: str) -> dict[str, Any] | None:
         ...
 
-    def mark_order_paid(
+    async def mark_order_paid(
         self,
         request_id: str,
         creem_checkout_id: str | None,
@@ -40,13 +51,65 @@ class Repo(Protocol):
     ) -> None:
         ...
 
-    def grant_entitlement(self, user_id: str, product_id: str) -> None:
+    async def grant_entitlement(self, user_id: str, product_id: str) -> None:
+        ...
+
+    async def list_entitlements(self, user_id: str) -> list[dict[str, Any]]:
+        ...
+
+    async def list_entitlements_page(
+        self,
+        after: tuple[str, str] | None,
+        limit: int,
+    ) -> list[dict[str, Any]]:
+        ...
+
+    async def webhook_event_insert(self, event_key: str) -> bool:
+        ...
+
+    async def webhook_event_insert_many(self, event_keys: list[str]) -> set[str]:
+        ...
+
+    async def prune_webhook_events(self, received_before: str, limit: int) -> int:
+        ...
+
+    async def process_checkout_completed(
+        self,
+        event_key: str,
+        request_id: str,
+        creem_checkout_id: str | None,
+        creem_order_id: str | None,
+        amount_cents: int | None,
+        currency: str | None,
+    ) -> dict[str, Any]:
+        ...
+
+    async def process_checkout_completed_batch(
+        self,
+        events: list[dict[str, Any]],
+    ) -> list[dict[str, Any]]:
+        ...
+
+    async def list_orders_page(
+        self,
+        statuses: list[str] | None,
+        after: tuple[str, str] | None,
+        limit: int,
+        created_before: str | None = None,
+    ) -> list[dict[str, Any]]:
+        ...
+
+    async def revenue_by_day(
+        self,
+        created_from: str,
+        created_before: str,
+    ) -> list[dict[str, Any]]:
         ...
 
-    def webhook_event_seen(self, event_key: str) -> bool:
+    async def bulk_mark_orders_paid(self, orders: list[dict[str, Any]]) -> None:
         ...
 
-    def webhook_event_mark_seen(self, event_key: str) -> None:
+    async def bulk_grant_entitlements(self, grants: list[tuple[str, str]]) -> None:
         ...
 
 
@@ -54,11 +117,21 @@ def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-class SupabaseRepo:
-    def __init__(self, settings: Settings) -> None:
+def _checkout_result(row: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "new_event": bool(row.get("new_event")),
+        "order_found": bool(row.get("order_found")),
+        "user_id": str(row["user_id"]) if row.get("user_id") else None,
+        "product_id": str(row["product_id"]) if row.get("product_id") else None,
+    }
+
+
+class AsyncSupabaseRepo:
+    def __init__(self, settings: Settings, client: httpx.AsyncClient) -> None:
         if not settings.supabase_url or not settings.supabase_service_role_key:
             raise RuntimeError("Supabase settings are missing")
 
+        self.client = client
         self.base_url = settings.supabase_url.rstrip("/")
         self.service_role_key = settings.supabase_service_role_key
 
@@ -72,24 +145,26 @@ class SupabaseRepo:
             headers["Prefer"] = prefer
         return headers
 
-    def _request(
+    async def _request(
         self,
         method: str,
         table: str,
         *,
         params: dict[str, str] | None = None,
-        payload: dict[str, Any] | None = None,
+        payload: dict[str, Any] | list[dict[str, Any]] | None = None,
         prefer: str | None = None,
     ) -> httpx.Response:
         url = f"{self.base_url}/rest/v1/{table}"
-        with httpx.Client(timeout=10.0) as client:
-            return client.request(
+        with outbound_timer("supabase", f"{method} {table}") as result:
+            response = await self.client.request(
                 method=method,
                 url=url,
                 headers=self._headers(prefer=prefer),
                 params=params,
                 json=payload,
             )
+            result.append(str(response.status_code))
+        return response
 
     @staticmethod
     def _ensure_success(response: httpx.Response, action: str) -> None:
@@ -100,8 +175,8 @@ class SupabaseRepo:
                 f"(status={response.status_code}, detail={detail})"
             )
 
-    def _select_one(self, table: str, params: dict[str, str]) -> dict[str, Any] | None:
-        response = self._request("GET", table, params=params)
+    async def _select_one(self, table: str, params: dict[str, str]) -> dict[str, Any] | None:
+        response = await self._request("GET", table, params=params)
         self._ensure_success(response, f"select {table}")
 
         rows = response.json()
@@ -109,8 +184,13 @@ class SupabaseRepo:
             return None
         return rows[0]
 
-    def get_product(self, product_id: str) -> dict[str, Any] | None:
-        return self._select_one(
+    async def _rpc(self, function: str, payload: dict[str, Any]) -> Any:
+        response = await self._request("POST", f"rpc/{function}", payload=payload)
+        self._ensure_success(response, f"rpc {function}")
+        return response.json()
+
+    async def get_product(self, product_id: str) -> dict[str, Any] | None:
+        return await self._select_one(
             "products",
             params={
                 "select": "*",
@@ -120,7 +200,22 @@ class SupabaseRepo:
             },
         )
 
-    def create_order_pending(
+    async def list_active_products(self) -> list[dict[str, Any]]:
+        response = await self._request(
+            "GET",
+            "products",
+            params={
+                "select": "*",
+                "active": "eq.true",
+                "order": "created_at.asc,id.asc",
+            },
+        )
+        self._ensure_success(response, "select products")
+
+        rows = response.json()
+        return rows if isinstance(rows, list) else []
+
+    async def create_order_pending(
         self,
         user_id: str,
         product_id: str,
@@ -132,7 +227,7 @@ class SupabaseRepo:
             "status": "pending",
             "request_id": request_id,
         }
-        response = self._request(
+        response = await self._request(
             "POST",
             "orders",
             payload=payload,
@@ -147,8 +242,8 @@ class SupabaseRepo:
             return rows
         return payload
 
-    def update_order_failed(self, request_id: str) -> None:
-        response = self._request(
+    async def update_order_failed(self, request_id: str) -> None:
+        response = await self._request(
             "PATCH",
             "orders",
             params={"request_id": f"eq.{request_id}"},
@@ -156,8 +251,12 @@ class SupabaseRepo:
         )
         self._ensure_success(response, "update orders failed")
 
-    def update_order_checkout_ids(self, request_id: str, creem_checkout_id: str | None) -> None:
-        response = self._request(
+    async def update_order_checkout_ids(
+        self,
+        request_id: str,
+        creem_checkout_id: str | None,
+    ) -> None:
+        response = await self._request(
             "PATCH",
             "orders",
             params={"request_id": f"eq.{request_id}"},
@@ -168,8 +267,19 @@ class SupabaseRepo:
         )
         self._ensure_success(response, "update orders checkout id")
 
-    def get_order_by_request_id(self, request_id: str) -> dict[str, Any] | None:
-        return self._select_one(
+    async def apply_order_updates(self, updates: list[dict[str, Any]]) -> None:
+        if not updates:
+            return
+        # A void function answers 204 with no body, so skip _rpc's JSON decoding.
+        response = await self._request(
+            "POST",
+            "rpc/apply_order_updates",
+            payload={"p_updates": updates},
+        )
+        self._ensure_success(response, "rpc apply_order_updates")
+
+    async def get_order_by_request_id(self, request_id: str) -> dict[str, Any] | None:
+        return await self._select_one(
             "orders",
             params={
                 "select": "*",
@@ -178,7 +288,7 @@ class SupabaseRepo:
             },
         )
 
-    def mark_order_paid(
+    async def mark_order_paid(
         self,
         request_id: str,
         creem_checkout_id: str | None,
@@ -194,7 +304,7 @@ class SupabaseRepo:
             "currency": currency,
             "updated_at": _now_iso(),
         }
-        response = self._request(
+        response = await self._request(
             "PATCH",
             "orders",
             params={"request_id": f"eq.{request_id}"},
@@ -202,8 +312,8 @@ class SupabaseRepo:
         )
         self._ensure_success(response, "mark order paid")
 
-    def grant_entitlement(self, user_id: str, product_id: str) -> None:
-        response = self._request(
+    async def grant_entitlement(self, user_id: str, product_id: str) -> None:
+        response = await self._request(
             "POST",
             "entitlements",
             params={"on_conflict": "user_id,product_id"},
@@ -214,28 +324,203 @@ class SupabaseRepo:
             return
         self._ensure_success(response, "upsert entitlements")
 
-    def webhook_event_seen(self, event_key: str) -> bool:
-        row = self._select_one(
-            "webhook_events",
+    async def list_entitlements(self, user_id: str) -> list[dict[str, Any]]:
+        response = await self._request(
+            "GET",
+            "entitlements",
             params={
-                "select": "id",
-                "event_key": f"eq.{event_key}",
-                "limit": "1",
+                "select": "product_id,granted_at",
+                "user_id": f"eq.{user_id}",
             },
         )
-        return row is not None
+        self._ensure_success(response, "select entitlements")
+
+        rows = response.json()
+        return rows if isinstance(rows, list) else []
+
+    async def list_entitlements_page(
+        self,
+        after: tuple[str, str] | None,
+        limit: int,
+    ) -> list[dict[str, Any]]:
+        params = {
+            "select": "user_id,product_id",
+            "order": "user_id.asc,product_id.asc",
+            "limit": str(limit),
+        }
+        if after:
+            user_id, product_id = after
+            params["or"] = (
+                f"(user_id.gt.{user_id},and(user_id.eq.{user_id},product_id.gt.{product_id}))"
+            )
+
+        response = await self._request("GET", "entitlements", params=params)
+        self._ensure_success(response, "select entitlements page")
 
-    def webhook_event_mark_seen(self, event_key: str) -> None:
-        response = self._request(
+        rows = response.json()
+        return rows if isinstance(rows, list) else []
+
+    async def webhook_event_insert(self, event_key: str) -> bool:
+        response = await self._request(
             "POST",
             "webhook_events",
-            params={"on_conflict": "event_key"},
+            params={"on_conflict": "event_key", "select": "id"},
             payload={"event_key": event_key},
+            prefer="resolution=ignore-duplicates,return=representation",
+        )
+        self._ensure_success(response, "insert webhook event")
+
+        # An ignored duplicate comes back as an empty representation.
+        rows = response.json()
+        return isinstance(rows, list) and bool(rows)
+
+    async def webhook_event_insert_many(self, event_keys: list[str]) -> set[str]:
+        if not event_keys:
+            return set()
+
+        response = await self._request(
+            "POST",
+            "webhook_events",
+            params={"on_conflict": "event_key", "select": "event_key"},
+            payload=[{"event_key": event_key} for event_key in dict.fromkeys(event_keys)],
+            prefer="resolution=ignore-duplicates,return=representation",
+        )
+        self._ensure_success(response, "bulk insert webhook events")
+
+        rows = response.json()
+        return {str(row["event_key"]) for row in rows} if isinstance(rows, list) else set()
+
+    async def prune_webhook_events(self, received_before: str, limit: int) -> int:
+        deleted = await self._rpc(
+            "prune_webhook_events",
+            {"p_received_before": received_before, "p_limit": limit},
+        )
+        if not isinstance(deleted, int):
+            raise RuntimeError("Supabase rpc prune_webhook_events returned no result")
+        return deleted
+
+    async def process_checkout_completed(
+        self,
+        event_key: str,
+        request_id: str,
+        creem_checkout_id: str | None,
+        creem_order_id: str | None,
+        amount_cents: int | None,
+        currency: str | None,
+    ) -> dict[str, Any]:
+        rows = await self._rpc(
+            "process_checkout_completed",
+            {
+                "p_event_key": event_key,
+                "p_request_id": request_id,
+                "p_creem_checkout_id": creem_checkout_id,
+                "p_creem_order_id": creem_order_id,
+                "p_amount_cents": amount_cents,
+                "p_currency": currency,
+            },
+        )
+        row = rows[0] if isinstance(rows, list) and rows else rows
+        if not isinstance(row, dict):
+            raise RuntimeError("Supabase rpc process_checkout_completed returned no result")
+        return _checkout_result(row)
+
+    async def process_checkout_completed_batch(
+        self,
+        events: list[dict[str, Any]],
+    ) -> list[dict[str, Any]]:
+        if not events:
+            return []
+
+        rows = await self._rpc("process_checkout_completed_batch", {"p_events": events})
+        if not isinstance(rows, list) or len(rows) != len(events):
+            raise RuntimeError("Supabase rpc process_checkout_completed_batch returned no result")
+        return [_checkout_result(row) for row in sorted(rows, key=lambda row: row["ordinal"])]
+
+    async def list_orders_page(
+        self,
+        statuses: list[str] | None,
+        after: tuple[str, str] | None,
+        limit: int,
+        created_before: str | None = None,
+    ) -> list[dict[str, Any]]:
+        params = {
+            "select": "*",
+            "order": "created_at.asc,id.asc",
+            "limit": str(limit),
+        }
+        if statuses:
+            params["status"] = f"in.({','.join(statuses)})"
+        if created_before:
+            params["and"] = f'(created_at.lt."{created_before}")'
+        if after:
+            created_at, order_id = after
+            params["or"] = (
+                f'(created_at.gt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.gt.{order_id}))'
+            )
+
+        response = await self._request("GET", "orders", params=params)
+        self._ensure_success(response, "select orders page")
+
+        rows = response.json()
+        return rows if isinstance(rows, list) else []
+
+    async def revenue_by_day(
+        self,
+        created_from: str,
+        created_before: str,
+    ) -> list[dict[str, Any]]:
+        rows = await self._rpc(
+            "revenue_by_day",
+            {"p_created_from": created_from, "p_created_before": created_before},
+        )
+        return rows if isinstance(rows, list) else []
+
+    async def bulk_mark_orders_paid(self, orders: list[dict[str, Any]]) -> None:
+        if not orders:
+            return
+
+        updated_at = _now_iso()
+        payload = [
+            {
+                "request_id": order["request_id"],
+                "user_id": order["user_id"],
+                "product_id": order["product_id"],
+                "status": "paid",
+                "creem_checkout_id": order.get("creem_checkout_id"),
+                "creem_order_id": order.get("creem_order_id"),
+                "amount_cents": order.get("amount_cents"),
+                "currency": order.get("currency"),
+                "updated_at": updated_at,
+            }
+            for order in orders
+        ]
+        response = await self._request(
+            "POST",
+            "orders",
+            params={"on_conflict": "request_id"},
+            payload=payload,
+            prefer="resolution=merge-duplicates,return=minimal",
+        )
+        self._ensure_success(response, "bulk upsert orders paid")
+
+    async def bulk_grant_entitlements(self, grants: list[tuple[str, str]]) -> None:
+        if not grants:
+            return
+
+        response = await self._request(
+            "POST",
+            "entitlements",
+            params={"on_conflict": "user_id,product_id"},
+            payload=[
+                {"user_id": user_id, "product_id": product_id}
+                for user_id, product_id in dict.fromkeys(grants)
+            ],
             prefer="resolution=ignore-duplicates,return=minimal",
         )
         if response.status_code == 409:
             return
-        self._ensure_success(response, "insert webhook event")
+        self._ensure_success(response, "bulk upsert entitlements")
 
 
 class FakeRepo:
@@ -246,15 +531,18 @@ class FakeRepo:
         self.orders_by_request: dict[str, dict[str, Any]] = {}
         self.orders_by_id: dict[str, dict[str, Any]] = {}
         self.entitlements: set[tuple[str, str]] = set()
-        self.webhook_events: set[str] = set()
+        self.webhook_events: dict[str, str] = {}
 
-    def get_product(self, product_id: str) -> dict[str, Any] | None:
+    async def get_product(self, product_id: str) -> dict[str, Any] | None:
         product = self.products.get(product_id)
         if not product or not product.get("active", True):
             return None
         return {**product}
 
-    def create_order_pending(
+    async def list_active_products(self) -> list[dict[str, Any]]:
+        return [{**p} for p in self.products.values() if p.get("active", True)]
+
+    async def create_order_pending(
         self,
         user_id: str,
         product_id: str,
@@ -270,26 +558,41 @@ class FakeRepo:
             "creem_order_id": None,
             "amount_cents": None,
             "currency": None,
+            "created_at": _now_iso(),
         }
         self.orders_by_request[request_id] = order
         self.orders_by_id[order["id"]] = order
         return {**order}
 
-    def update_order_failed(self, request_id: str) -> None:
+    async def update_order_failed(self, request_id: str) -> None:
         order = self.orders_by_request.get(request_id)
         if order:
             order["status"] = "failed"
 
-    def update_order_checkout_ids(self, request_id: str, creem_checkout_id: str | None) -> None:
+    async def update_order_checkout_ids(
+        self,
+        request_id: str,
+        creem_checkout_id: str | None,
+    ) -> None:
         order = self.orders_by_request.get(request_id)
         if order:
             order["creem_checkout_id"] = creem_checkout_id
 
-    def get_order_by_request_id(self, request_id: str) -> dict[str, Any] | None:
+    async def apply_order_updates(self, updates: list[dict[str, Any]]) -> None:
+        for update in updates:
+            order = self.orders_by_request.get(update["request_id"])
+            if not order:
+                continue
+            if update.get("status") and order["status"] != "paid":
+                order["status"] = update["status"]
+            if update.get("creem_checkout_id"):
+                order["creem_checkout_id"] = update["creem_checkout_id"]
+
+    async def get_order_by_request_id(self, request_id: str) -> dict[str, Any] | None:
         order = self.orders_by_request.get(request_id)
         return {**order} if order else None
 
-    def mark_order_paid(
+    async def mark_order_paid(
         self,
         request_id: str,
         creem_checkout_id: str | None,
@@ -307,11 +610,145 @@ class FakeRepo:
         order["amount_cents"] = amount_cents
         order["currency"] = currency
 
-    def grant_entitlement(self, user_id: str, product_id: str) -> None:
+    async def grant_entitlement(self, user_id: str, product_id: str) -> None:
         self.entitlements.add((user_id, product_id))
 
-    def webhook_event_seen(self, event_key: str) -> bool:
-        return event_key in self.webhook_events
+    async def list_entitlements(self, user_id: str) -> list[dict[str, Any]]:
+        return [
+            {"product_id": product_id}
+            for owner, product_id in sorted(self.entitlements)
+            if owner == user_id
+        ]
+
+    async def list_entitlements_page(
+        self,
+        after: tuple[str, str] | None,
+        limit: int,
+    ) -> list[dict[str, Any]]:
+        grants = sorted(grant for grant in self.entitlements if not after or grant > after)
+        return [
+            {"user_id": user_id, "product_id": product_id} for user_id, product_id in grants[:limit]
+        ]
+
+    async def webhook_event_insert(self, event_key: str) -> bool:
+        if event_key in self.webhook_events:
+            return False
+        self.webhook_events[event_key] = _now_iso()
+        return True
+
+    async def webhook_event_insert_many(self, event_keys: list[str]) -> set[str]:
+        return {key for key in dict.fromkeys(event_keys) if await self.webhook_event_insert(key)}
+
+    async def prune_webhook_events(self, received_before: str, limit: int) -> int:
+        expired = sorted(
+            (received_at, event_key)
+            for event_key, received_at in self.webhook_events.items()
+            if received_at < received_before
+        )[:limit]
+        for _, event_key in expired:
+            del self.webhook_events[event_key]
+        return len(expired)
+
+    async def process_checkout_completed(
+        self,
+        event_key: str,
+        request_id: str,
+        creem_checkout_id: str | None,
+        creem_order_id: str | None,
+        amount_cents: int | None,
+        currency: str | None,
+    ) -> dict[str, Any]:
+        result: dict[str, Any] = {
+            "new_event": event_key not in self.webhook_events,
+            "order_found": False,
+            "user_id": None,
+            "product_id": None,
+        }
+        if not result["new_event"]:
+            return result
+
+        self.webhook_events[event_key] = _now_iso()
+        order = self.orders_by_request.get(request_id)
+        if not order:
+            return result
+
+        await self.mark_order_paid(
+            request_id=request_id,
+            creem_checkout_id=creem_checkout_id,
+            creem_order_id=creem_order_id,
+            amount_cents=amount_cents,
+            currency=currency,
+        )
+        await self.grant_entitlement(user_id=order["user_id"], product_id=order["product_id"])
+        result.update(
+            order_found=True,
+            user_id=order["user_id"],
+            product_id=order["product_id"],
+        )
+        return result
+
+    async def process_checkout_completed_batch(
+        self,
+        events: list[dict[str, Any]],
+    ) -> list[dict[str, Any]]:
+        return [await self.process_checkout_completed(**event) for event in events]
+
+    async def list_orders_page(
+        self,
+        statuses: list[str] | None,
+        after: tuple[str, str] | None,
+        limit: int,
+        created_before: str | None = None,
+    ) -> list[dict[str, Any]]:
+        rows = sorted(
+            (
+                order
+                for order in self.orders_by_request.values()
+                if (not statuses or order["status"] in statuses)
+                and (not created_before or order["created_at"] < created_before)
+                and (not after or (order["created_at"], order["id"]) > after)
+            ),
+            key=lambda order: (order["created_at"], order["id"]),
+        )
+        return [{**order} for order in rows[:limit]]
+
+    async def revenue_by_day(
+        self,
+        created_from: str,
+        created_before: str,
+    ) -> list[dict[str, Any]]:
+        totals: dict[tuple[str, str, str | None], list[int]] = {}
+        for order in self.orders_by_request.values():
+            if order["status"] != "paid":
+                continue
+            if not created_from <= order["created_at"] < created_before:
+                continue
+            key = (order["created_at"][:10], order["product_id"], order.get("currency"))
+            total = totals.setdefault(key, [0, 0])
+            total[0] += 1
+            total[1] += order.get("amount_cents") or 0
+        return [
+            {
+                "day": day,
+                "product_id": product_id,
+                "currency": currency,
+                "orders": orders,
+                "amount_cents": amount_cents,
+            }
+            for (day, product_id, currency), (orders, amount_cents) in sorted(
+                totals.items(), key=lambda item: (item[0][0], item[0][1], item[0][2] or "")
+            )
+        ]
+
+    async def bulk_mark_orders_paid(self, orders: list[dict[str, Any]]) -> None:
+        for order in orders:
+            await self.mark_order_paid(
+                request_id=order["request_id"],
+                creem_checkout_id=order.get("creem_checkout_id"),
+                creem_order_id=order.get("creem_order_id"),
+                amount_cents=order.get("amount_cents"),
+                currency=order.get("currency"),
+            )
 
-    def webhook_event_mark_seen(self, event_key: str) -> None:
-        self.webhook_events.add(event_key)
+    async def bulk_grant_entitlements(self, grants: list[tuple[str, str]]) -> None:
+        self.entitlements.update(grants)
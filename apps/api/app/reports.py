@@ -0,0 +1,183 @@
+import asyncio
+import csv
+import io
+from collections.abc import AsyncIterator
+from datetime import UTC, date, datetime, time, timedelta
+from typing import Any, Literal
+
+from app import fast_json
+from app.cache import Cache
+from app.repo import AsyncRepo
+
+ExportFormat = Literal["ndjson", "csv"]
+
+EXPORT_FIELDS = (
+    "id",
+    "request_id",
+    "user_id",
+    "product_id",
+    "status",
+    "amount_cents",
+    "currency",
+    "creem_checkout_id",
+    "creem_order_id",
+    "created_at",
+    "updated_at",
+)
+# Sorts before every uuid, so (created_from, NIL_ID) starts the scan at created_from.
+NIL_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def day_start(day: date) -> str:
+    return datetime.combine(day, time.min, tzinfo=UTC).isoformat()
+
+
+async def iter_order_pages(
+    repo: AsyncRepo,
+    *,
+    statuses: list[str] | None,
+    created_from: str | None,
+    created_before: str | None,
+    page_size: int,
+) -> AsyncIterator[list[dict[str, Any]]]:
+    # Keyset pagination over (created_at, id); the next page is fetched while the
+    # current one is written out, and at most two pages are held at once.
+    after = (created_from, NIL_ID) if created_from else None
+    page = await repo.list_orders_page(statuses, after, page_size, created_before=created_before)
+    while page:
+        next_page = None
+        if len(page) >= page_size:
+            cursor = (str(page[-1]["created_at"]), str(page[-1]["id"]))
+            next_page = asyncio.create_task(
+                repo.list_orders_page(statuses, cursor, page_size, created_before=created_before)
+            )
+        try:
+            yield page
+        except BaseException:
+            if next_page is not None:
+                next_page.cancel()
+            raise
+        page = await next_page if next_page is not None else []
+
+
+def _encode_ndjson(page: list[dict[str, Any]]) -> bytes:
+    return b"".join(
+        fast_json.dumps({field: row.get(field) for field in EXPORT_FIELDS}) + b"\n"
+        for row in page
+    )
+
+
+def _encode_csv(rows: list[list[Any]]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+async def export_orders(
+    repo: AsyncRepo,
+    export_format: ExportFormat,
+    *,
+    statuses: list[str] | None = None,
+    created_from: str | None = None,
+    created_before: str | None = None,
+    page_size: int = 1000,
+) -> AsyncIterator[bytes]:
+    if export_format == "csv":
+        yield _encode_csv([list(EXPORT_FIELDS)])
+    pages = iter_order_pages(
+        repo,
+        statuses=statuses,
+        created_from=created_from,
+        created_before=created_before,
+        page_size=page_size,
+    )
+    async for page in pages:
+        if export_format == "csv":
+            yield _encode_csv(
+                [
+                    ["" if row.get(field) is None else row[field] for field in EXPORT_FIELDS]
+                    for row in page
+                ]
+            )
+        else:
+            yield _encode_ndjson(page)
+
+
+def _revenue_row(row: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "day": str(row["day"])[:10],
+        "product_id": str(row["product_id"]),
+        "currency": row.get("currency"),
+        "orders": int(row.get("orders") or 0),
+        "amount_cents": int(row.get("amount_cents") or 0),
+    }
+
+
+class RevenueReport:
+    # Each UTC day is cached on its own. Days are grouped by order creation, so an order
+    # created before midnight and paid after it changes a past day: today and the open_days
+    # before it are recomputed after open_ttl_seconds, older days after closed_ttl_seconds.
+    def __init__(
+        self,
+        cache: Cache,
+        *,
+        closed_ttl_seconds: float,
+        open_ttl_seconds: float,
+        open_days: int = 3,
+    ) -> None:
+        self.cache = cache
+        self.closed_ttl_seconds = closed_ttl_seconds
+        self.open_ttl_seconds = open_ttl_seconds
+        self.open_days = max(0, open_days)
+        self.hits = 0
+        self.misses = 0
+
+    async def daily(self, repo: AsyncRepo, first: date, last: date) -> list[dict[str, Any]]:
+        days = [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+        cached = await self.cache.get_many([f"revenue:{day.isoformat()}" for day in days])
+        by_day: dict[date, list[dict[str, Any]]] = {
+            day: fast_json.loads(value)
+            for day, value in zip(days, cached, strict=True)
+            if value is not None
+        }
+        missing = [day for day in days if day not in by_day]
+        self.hits += len(by_day)
+        self.misses += len(missing)
+
+        if missing:
+            rows = await repo.revenue_by_day(
+                day_start(missing[0]),
+                day_start(missing[-1] + timedelta(days=1)),
+            )
+            fresh: dict[date, list[dict[str, Any]]] = {day: [] for day in missing}
+            for row in map(_revenue_row, rows):
+                day = date.fromisoformat(row["day"])
+                if day in fresh:
+                    fresh[day].append(row)
+
+            first_open = datetime.now(UTC).date() - timedelta(days=self.open_days)
+            for is_closed in (True, False):
+                group = {
+                    f"revenue:{day.isoformat()}": fast_json.dumps(day_rows)
+                    for day, day_rows in fresh.items()
+                    if (day < first_open) == is_closed
+                }
+                if group:
+                    ttl = self.closed_ttl_seconds if is_closed else self.open_ttl_seconds
+                    await self.cache.set_many(group, ttl)
+            by_day.update(fresh)
+
+        return [row for day in days for row in by_day[day]]
+
+
+def revenue_totals(rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    totals: dict[tuple[str, str | None], dict[str, Any]] = {}
+    for row in rows:
+        key = (row["product_id"], row["currency"])
+        total = totals.setdefault(
+            key,
+            {"product_id": key[0], "currency": key[1], "orders": 0, "amount_cents": 0},
+        )
+        total["orders"] += row["orders"]
+        total["amount_cents"] += row["amount_cents"]
+    return list(totals.values())
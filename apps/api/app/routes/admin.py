@@ -0,0 +1,103 @@
+from datetime import UTC, date, datetime, timedelta
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse, StreamingResponse
+
+from app.config import Settings, get_settings
+from app.deps import get_profiler, get_repo, get_revenue_report
+from app.deps_auth import require_admin
+from app.profiling import SamplingProfiler
+from app.repo import AsyncRepo
+from app.reports import ExportFormat, RevenueReport, day_start, export_orders, revenue_totals
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+MAX_REVENUE_DAYS = 366
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+@router.get("/admin/orders/export")
+async def export_orders_route(
+    export_format: ExportFormat = Query(default="ndjson", alias="format"),
+    order_status: list[str] | None = Query(default=None, alias="status"),
+    created_from: date | None = None,
+    created_before: date | None = None,
+    repo: AsyncRepo = Depends(get_repo),
+    settings: Settings = Depends(get_settings),
+) -> StreamingResponse:
+    body = export_orders(
+        repo,
+        export_format,
+        statuses=order_status,
+        created_from=day_start(created_from) if created_from else None,
+        created_before=day_start(created_before) if created_before else None,
+        page_size=settings.admin_export_page_size,
+    )
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="orders.{export_format}"',
+            "Cache-Control": "no-store",
+        },
+    )
+
+
+@router.get("/admin/revenue")
+async def revenue(
+    first: date | None = Query(default=None, alias="from"),
+    last: date | None = Query(default=None, alias="to"),
+    repo: AsyncRepo = Depends(get_repo),
+    report: RevenueReport = Depends(get_revenue_report),
+) -> dict[str, Any]:
+    last = last or datetime.now(UTC).date()
+    first = first or last - timedelta(days=29)
+    if first > last or (last - first).days >= MAX_REVENUE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"from must be on or before to, at most {MAX_REVENUE_DAYS} days apart",
+        )
+
+    rows = await report.daily(repo, first, last)
+    return {
+        "from": first.isoformat(),
+        "to": last.isoformat(),
+        "days": rows,
+        "totals": revenue_totals(rows),
+    }
+
+
+def _require_profiler(profiler: SamplingProfiler | None) -> SamplingProfiler:
+    if profiler is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiling is disabled")
+    return profiler
+
+
+@router.get("/admin/profiles")
+async def list_profiles(
+    route: str | None = None,
+    limit: int = Query(default=20, ge=1, le=200),
+    profiler: SamplingProfiler | None = Depends(get_profiler),
+) -> dict[str, Any]:
+    captures = _require_profiler(profiler).slowest(route, limit)
+    by_route: dict[str, list[dict[str, Any]]] = {}
+    for capture in captures:
+        by_route.setdefault(capture["route"], []).append(capture)
+    return {"captures": captures, "routes": by_route}
+
+
+@router.get("/admin/profiles/{capture_id}")
+async def download_profile(
+    capture_id: str,
+    profiler: SamplingProfiler | None = Depends(get_profiler),
+) -> FileResponse:
+    path = _require_profiler(profiler).path_for(capture_id)
+    if path is None or not path.exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    media_type = "application/json" if path.suffix == ".json" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=path.name)
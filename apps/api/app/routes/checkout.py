@@ -1,17 +1,54 @@
+import asyncio
+import contextlib
 from typing import Any
 from uuid import uuid4
 
-from fastapi import APIRouter, Depends, HTTPException, status
+import httpx
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Response, status
+from fastapi.security import HTTPAuthorizationCredentials
 from pydantic import BaseModel
 
+from app.admission import (
+    OverloadedError,
+    RateLimitedError,
+    RouteLimiter,
+    retry_after_header,
+)
+from app.auth_cache import TokenCache
+from app.auth_local import LocalTokenVerifier
+from app.catalog import ProductCatalog
 from app.config import Settings, get_settings
 from app.creem_client import CreemClient
-from app.deps import get_creem_client, get_repo
-from app.deps_auth import get_current_user
-from app.repo import Repo
+from app.deps import (
+    get_catalog,
+    get_creem_client,
+    get_http_client,
+    get_idempotency_store,
+    get_order_writes,
+    get_repo,
+    get_route_limiters,
+)
+from app.deps_auth import (
+    authenticate_token,
+    authenticate_token_remote,
+    bearer_token,
+    get_token_cache,
+    get_token_verifier,
+    security,
+)
+from app.idempotency import (
+    IdempotencyConflictError,
+    IdempotencyInProgressError,
+    IdempotencyStore,
+)
+from app.order_writes import OrderWriteBehind
+from app.repo import AsyncRepo
+from app.utils.crypto import sha256_hex
 
 router = APIRouter()
 
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
 
 class CheckoutRequest(BaseModel):
     product_id: str
@@ -21,27 +58,36 @@ class CheckoutResponse(BaseModel):
     checkout_url: str
 
 
-@router.post("/checkout", response_model=CheckoutResponse)
-async def create_checkout(
+def _raise_if_error(result: Any) -> None:
+    if isinstance(result, BaseException):
+        raise result
+
+
+async def _start_checkout(
     body: CheckoutRequest,
-    repo: Repo = Depends(get_repo),
-    creem: CreemClient = Depends(get_creem_client),
-    user: dict[str, Any] = Depends(get_current_user),
-    settings: Settings = Depends(get_settings),
+    user: dict[str, Any],
+    product: dict[str, Any],
+    background_tasks: BackgroundTasks,
+    repo: AsyncRepo,
+    creem: CreemClient,
+    writes: OrderWriteBehind | None,
+    settings: Settings,
 ) -> dict[str, str]:
-    product = repo.get_product(body.product_id)
-    if not product:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
-
     request_id = uuid4().hex
-    repo.create_order_pending(
-        user_id=str(user["id"]),
-        product_id=body.product_id,
-        request_id=request_id,
-    )
 
-    try:
-        checkout = await creem.create_checkout(
+    async def mark_failed() -> None:
+        if writes is not None:
+            await writes.submit(request_id, status="failed")
+        else:
+            await repo.update_order_failed(request_id=request_id)
+
+    order, checkout = await asyncio.gather(
+        repo.create_order_pending(
+            user_id=str(user["id"]),
+            product_id=body.product_id,
+            request_id=request_id,
+        ),
+        creem.create_checkout(
             creem_product_id=str(product["creem_product_id"]),
             request_id=request_id,
             success_url=f"{settings.frontend_base_url.rstrip('/')}/success",
@@ -51,21 +97,131 @@ async def create_checkout(
                 "product_id": body.product_id,
                 "request_id": request_id,
             },
-        )
-        repo.update_order_checkout_ids(request_id=request_id, creem_checkout_id=checkout.get("id"))
-    except Exception as exc:
-        repo.update_order_failed(request_id=request_id)
+        ),
+        return_exceptions=True,
+    )
+    if isinstance(order, BaseException):
+        # Without an order row a payment could never be matched, so the Creem session (if
+        # one was created) is dropped unseen: its URL is never returned, and it expires.
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Failed to create checkout",
+        ) from order
+
+    if isinstance(checkout, BaseException):
+        await mark_failed()
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail="Failed to create checkout",
-        ) from exc
+        ) from checkout
 
     checkout_url = checkout.get("checkout_url")
     if not checkout_url:
-        repo.update_order_failed(request_id=request_id)
+        await mark_failed()
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail="Failed to create checkout",
         )
 
+    if writes is not None:
+        await writes.submit(request_id, creem_checkout_id=checkout.get("id"))
+    else:
+        background_tasks.add_task(
+            repo.update_order_checkout_ids,
+            request_id=request_id,
+            creem_checkout_id=checkout.get("id"),
+        )
     return {"checkout_url": str(checkout_url)}
+
+
+@router.post("/checkout", response_model=CheckoutResponse)
+async def create_checkout(
+    body: CheckoutRequest,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    idempotency_key: str | None = Header(default=None),
+    repo: AsyncRepo = Depends(get_repo),
+    catalog: ProductCatalog = Depends(get_catalog),
+    creem: CreemClient = Depends(get_creem_client),
+    idempotency: IdempotencyStore = Depends(get_idempotency_store),
+    credentials: HTTPAuthorizationCredentials | None = Depends(security),
+    verifier: LocalTokenVerifier | None = Depends(get_token_verifier),
+    token_cache: TokenCache | None = Depends(get_token_cache),
+    http_client: httpx.AsyncClient | None = Depends(get_http_client),
+    limiters: dict[str, RouteLimiter] = Depends(get_route_limiters),
+    writes: OrderWriteBehind | None = Depends(get_order_writes),
+    settings: Settings = Depends(get_settings),
+) -> dict[str, str]:
+    token = bearer_token(credentials)
+    authenticate = (
+        authenticate_token_remote(token, settings, http_client)
+        if settings.supabase_auth_checkout_remote
+        else authenticate_token(token, settings, verifier, token_cache, http_client)
+    )
+    user, product = await asyncio.gather(
+        authenticate,
+        catalog.get_product(repo, body.product_id),
+        return_exceptions=True,
+    )
+    _raise_if_error(user)
+    _raise_if_error(product)
+    if not product:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+
+    limiter = limiters.get("checkout")
+
+    # Only new attempts are charged: idempotent replays (and callers joining an attempt
+    # already in flight) never reach this, so a retry after the bucket ran dry still
+    # gets the original checkout back.
+    async def start() -> dict[str, str]:
+        if limiter is not None:
+            try:
+                limiter.check(str(user["id"]))
+            except RateLimitedError as exc:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many checkout attempts",
+                    headers={"Retry-After": retry_after_header(exc.retry_after)},
+                ) from exc
+        slot = limiter.slot() if limiter is not None else contextlib.nullcontext()
+        try:
+            async with slot:
+                return await _start_checkout(
+                    body, user, product, background_tasks, repo, creem, writes, settings
+                )
+        except OverloadedError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Checkout is overloaded, try again shortly",
+                headers={"Retry-After": retry_after_header(exc.retry_after)},
+            ) from exc
+
+    if idempotency_key is None:
+        return await start()
+
+    if not idempotency_key or len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid Idempotency-Key",
+        )
+
+    try:
+        result, replayed = await idempotency.run(
+            f"{user['id']}:{idempotency_key}",
+            sha256_hex(body.model_dump_json().encode("utf-8")),
+            start,
+        )
+    except IdempotencyConflictError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was reused with a different request",
+        ) from exc
+    except IdempotencyInProgressError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still in progress",
+        ) from exc
+
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
@@ -0,0 +1,159 @@
+import asyncio
+import json
+from collections.abc import AsyncIterator
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app.admission import retry_after_header
+from app.config import Settings, get_settings
+from app.deps import get_entitlement_broker, get_entitlement_index, get_repo
+from app.deps_auth import get_current_user, require_service
+from app.entitlement_index import (
+    LOAD_RETRY_SECONDS,
+    EntitlementIndex,
+    EntitlementIndexNotReadyError,
+)
+from app.pubsub import EntitlementBroker
+from app.repo import AsyncRepo
+
+router = APIRouter()
+
+
+class EntitlementCheckRequest(BaseModel):
+    checks: list[tuple[str, str]]
+
+
+def _matching(rows: list[dict[str, Any]], product_id: str | None) -> list[dict[str, Any]]:
+    return [row for row in rows if not product_id or str(row.get("product_id")) == product_id]
+
+
+def _sse(event: str, data: Any) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+# Yields the matching entitlements once present, or None on each heartbeat tick. Callers
+# subscribe before calling so a grant between the table read and the wait is not missed.
+# Broker notifications only cover grants applied by this process, so the table is also
+# reread after `recheck` seconds, doubling up to `heartbeat`, and once at the deadline:
+# a webhook handled by another worker still unlocks within a few seconds.
+async def watch_entitlements(
+    repo: AsyncRepo,
+    queue: asyncio.Queue[dict[str, Any]],
+    user_id: str,
+    product_id: str | None,
+    timeout: float,
+    heartbeat: float,
+    recheck: float = 0.0,
+) -> AsyncIterator[list[dict[str, Any]] | None]:
+    loop = asyncio.get_running_loop()
+    now = loop.time()
+    deadline = now + timeout
+    interval = recheck
+    next_check = min(now + interval, deadline) if interval > 0 else deadline
+    next_ping = now + heartbeat
+    rows = _matching(await repo.list_entitlements(user_id), product_id)
+    if rows:
+        yield rows
+        return
+
+    while True:
+        now = loop.time()
+        if now >= next_check:
+            rows = _matching(await repo.list_entitlements(user_id), product_id)
+            if rows:
+                yield rows
+                return
+            if now >= deadline:
+                return
+            interval = min(interval * 2, heartbeat)
+            next_check = min(now + interval, deadline)
+            continue
+        if now >= next_ping:
+            yield None
+            next_ping = now + heartbeat
+            continue
+
+        try:
+            event = await asyncio.wait_for(queue.get(), min(next_check, next_ping) - now)
+        except TimeoutError:
+            continue
+
+        if _matching([event], product_id):
+            yield [event]
+            return
+
+
+@router.get("/entitlements/stream")
+async def entitlement_stream(
+    request: Request,
+    product_id: str | None = None,
+    timeout: float | None = Query(default=None, gt=0),
+    user: dict[str, Any] = Depends(get_current_user),
+    repo: AsyncRepo = Depends(get_repo),
+    broker: EntitlementBroker = Depends(get_entitlement_broker),
+    settings: Settings = Depends(get_settings),
+) -> Any:
+    user_id = str(user["id"])
+    max_timeout = settings.entitlement_stream_timeout_seconds
+    wait_seconds = min(timeout, max_timeout) if timeout else max_timeout
+    heartbeat = settings.entitlement_stream_heartbeat_seconds
+    recheck = settings.entitlement_stream_recheck_seconds
+
+    if "text/event-stream" not in request.headers.get("accept", ""):
+        with broker.subscribe(user_id) as queue:
+            async for rows in watch_entitlements(
+                repo, queue, user_id, product_id, wait_seconds, heartbeat, recheck
+            ):
+                if rows is not None:
+                    return {"unlocked": True, "entitlements": rows}
+        return {"unlocked": False, "entitlements": []}
+
+    async def events() -> AsyncIterator[bytes]:
+        with broker.subscribe(user_id) as queue:
+            yield b"retry: 3000\n\n"
+            async for rows in watch_entitlements(
+                repo, queue, user_id, product_id, wait_seconds, heartbeat, recheck
+            ):
+                if rows is None:
+                    yield b": ping\n\n"
+                    continue
+                yield _sse("entitlement", {"entitlements": rows})
+                return
+            yield _sse("timeout", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/entitlements/check", dependencies=[Depends(require_service)])
+async def check_entitlements(
+    body: EntitlementCheckRequest,
+    index: EntitlementIndex | None = Depends(get_entitlement_index),
+    settings: Settings = Depends(get_settings),
+) -> dict[str, Any]:
+    if index is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Entitlement index is disabled",
+        )
+    if len(body.checks) > settings.entitlement_check_max_pairs:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.entitlement_check_max_pairs} checks per request",
+        )
+
+    try:
+        results = index.check(body.checks)
+    except EntitlementIndexNotReadyError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Entitlement index is loading",
+            headers={"Retry-After": retry_after_header(LOAD_RETRY_SECONDS)},
+        ) from exc
+    return {"results": results}
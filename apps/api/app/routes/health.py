@@ -1,4 +1,10 @@
-from fastapi import APIRouter
+from typing import Any
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
+
+from app.deps import get_readiness
+from app.readiness import Readiness
 
 router = APIRouter()
 
@@ -6,3 +12,13 @@ router = APIRouter()
 @router.get("/health")
 def health() -> dict[str, bool]:
     return {"ok": True}
+
+
+@router.get("/ready")
+async def ready(readiness: Readiness | None = Depends(get_readiness)) -> JSONResponse:
+    report: dict[str, Any] = (
+        await readiness.status()
+        if readiness is not None
+        else {"ready": False, "warm": False, "dependencies": {}, "informational": {}}
+    )
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
@@ -0,0 +1,117 @@
+from typing import Any
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+
+from app.config import Settings, get_settings
+from app.metrics import REGISTRY, Counter, Gauge, Metric
+from app.utils.crypto import secure_compare
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _require_metrics_token(
+    authorization: str | None = Header(default=None),
+    settings: Settings = Depends(get_settings),
+) -> None:
+    if not settings.metrics_token:
+        return
+    if not authorization or not secure_compare(f"Bearer {settings.metrics_token}", authorization):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+
+def _state_metrics(state: Any) -> list[Metric]:
+    metrics: list[Metric] = []
+
+    token_cache = getattr(state, "token_cache", None)
+    if token_cache is not None:
+        stats = token_cache.stats()
+        size = Gauge("auth_token_cache_entries", "Cached access token verifications.")
+        size.set(value=stats.pop("size", 0))
+        lookups = Counter(
+            "auth_token_cache_lookups_total",
+            "Token cache lookups by result.",
+            ("result",),
+        )
+        for result, count in stats.items():
+            lookups.inc(result, amount=count)
+        metrics.extend([size, lookups])
+
+    seen_events = getattr(state, "seen_events", None)
+    if seen_events is not None:
+        stats = seen_events.stats()
+        size = Gauge("webhook_seen_cache_entries", "Recently processed webhook event keys.")
+        size.set(value=stats.pop("size", 0))
+        lookups = Counter(
+            "webhook_seen_cache_lookups_total",
+            "Seen-event cache lookups by result.",
+            ("result",),
+        )
+        for result, count in stats.items():
+            lookups.inc(result, amount=count)
+        metrics.extend([size, lookups])
+
+    shared_cache = getattr(state, "shared_cache", None)
+    if shared_cache is not None:
+        errors = Counter("shared_cache_errors_total", "Shared cache calls treated as misses.")
+        errors.inc(amount=shared_cache.stats()["errors"])
+        metrics.append(errors)
+
+    creem_client = getattr(state, "creem_client", None)
+    breaker = getattr(creem_client, "breaker", None)
+    if breaker is not None:
+        breaker_open = Gauge(
+            "creem_circuit_breaker_state",
+            "Creem circuit breaker state (1 for the current state).",
+            ("state",),
+        )
+        for name in ("closed", "open", "half_open"):
+            breaker_open.set(name, value=1 if breaker.state == name else 0)
+        metrics.append(breaker_open)
+
+    order_writes = getattr(state, "order_writes", None)
+    if order_writes is not None:
+        pending = Gauge("order_writes_pending", "Order state writes waiting to be flushed.")
+        pending.set(value=order_writes.pending_count)
+        metrics.append(pending)
+
+    limiters = getattr(state, "route_limiters", None) or {}
+    if limiters:
+        in_flight = Gauge("admission_in_flight", "Admitted requests in progress.", ("route",))
+        queued = Gauge("admission_queued", "Requests waiting for a slot.", ("route",))
+        tracked = Gauge("rate_limit_tracked_users", "Users with a rate limit bucket.", ("route",))
+        for route, limiter in limiters.items():
+            stats = limiter.stats()
+            in_flight.set(route, value=stats["in_flight"])
+            queued.set(route, value=stats["queued"])
+            tracked.set(route, value=stats["tracked_users"])
+        metrics.extend([in_flight, queued, tracked])
+
+    broker = getattr(state, "entitlement_broker", None)
+    if broker is not None:
+        subscribers = Gauge(
+            "entitlement_stream_subscribers",
+            "Open entitlement stream connections.",
+        )
+        subscribers.set(value=broker.subscriber_count)
+        metrics.append(subscribers)
+
+    index = getattr(state, "entitlement_index", None)
+    if index is not None:
+        stats = index.stats()
+        users = Gauge("entitlement_index_users", "Users with at least one indexed grant.")
+        users.set(value=stats["users"])
+        grants = Gauge("entitlement_index_grants", "Grants in the in-memory entitlement index.")
+        grants.set(value=stats["grants"])
+        age = Gauge("entitlement_index_age_seconds", "Seconds since the last full index load.")
+        age.set(value=stats["age_seconds"] if stats["age_seconds"] is not None else -1)
+        metrics.extend([users, grants, age])
+
+    return metrics
+
+
+@router.get("/metrics", dependencies=[Depends(_require_metrics_token)])
+async def metrics(request: Request) -> Response:
+    body = REGISTRY.render(_state_metrics(request.app.state))
+    return Response(content=body, media_type=PROMETHEUS_CONTENT_TYPE)
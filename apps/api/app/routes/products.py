@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, Request, Response, status
+
+from app.catalog import ProductCatalog
+from app.config import Settings, get_settings
+from app.deps import get_catalog, get_repo
+from app.deps_auth import require_admin
+from app.repo import AsyncRepo
+
+router = APIRouter()
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+@router.get("/products")
+async def list_products(
+    request: Request,
+    repo: AsyncRepo = Depends(get_repo),
+    catalog: ProductCatalog = Depends(get_catalog),
+    settings: Settings = Depends(get_settings),
+) -> Response:
+    snapshot = await catalog.snapshot(repo)
+    headers = {
+        "ETag": snapshot.etag,
+        "Cache-Control": f"public, max-age={settings.products_cache_max_age_seconds}",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+
+@router.post("/products/invalidate", dependencies=[Depends(require_admin)])
+async def invalidate_products(
+    catalog: ProductCatalog = Depends(get_catalog),
+) -> dict[str, bool]:
+    await catalog.invalidate()
+    return {"ok": True}
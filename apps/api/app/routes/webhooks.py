@@ -1,80 +1,148 @@
-import json
 from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 
+from app import fast_json
 from app.config import Settings, get_settings
-from app.deps import get_repo
-from app.repo import Repo
-from app.utils.crypto import hmac_sha256_hex, secure_compare, sha256_hex
+from app.deps import (
+    get_entitlement_broker,
+    get_order_writes,
+    get_repo,
+    get_seen_events,
+    get_webhook_batcher,
+    get_webhook_processor,
+)
+from app.metrics import WEBHOOK_DELIVERIES
+from app.order_writes import OrderWriteBehind
+from app.pubsub import EntitlementBroker
+from app.repo import AsyncRepo
+from app.seen_events import SeenEvents
+from app.utils.crypto import hmac_sha256_hex, secure_compare
+from app.webhook_batcher import WebhookBatcher
+from app.webhook_events import CreemEvent, parse_event, process_event, process_events
+from app.webhook_queue import WebhookProcessor
 
 router = APIRouter()
 
 
-def _to_optional_int(value: Any) -> int | None:
-    if value is None:
-        return None
+class _Rejected(Exception):
+    def __init__(self, result: str, detail: str) -> None:
+        super().__init__(detail)
+        self.result = result
+        self.detail = detail
+
+
+def _verified_event(secret: str, raw: bytes, provided_signature: str | None) -> CreemEvent:
+    if not provided_signature:
+        raise _Rejected("bad_signature", "Missing signature")
+
+    expected_signature = hmac_sha256_hex(secret, raw)
+    if not secure_compare(expected_signature, provided_signature):
+        raise _Rejected("bad_signature", "Invalid signature")
+
     try:
-        return int(value)
-    except (TypeError, ValueError):
-        return None
+        return parse_event(raw)
+    except ValueError as exc:
+        raise _Rejected("invalid_payload", "Invalid payload") from exc
 
 
 @router.post("/webhooks/creem")
 async def creem_webhook(
     request: Request,
-    repo: Repo = Depends(get_repo),
+    repo: AsyncRepo = Depends(get_repo),
+    processor: WebhookProcessor | None = Depends(get_webhook_processor),
+    batcher: WebhookBatcher | None = Depends(get_webhook_batcher),
+    broker: EntitlementBroker = Depends(get_entitlement_broker),
+    seen: SeenEvents | None = Depends(get_seen_events),
+    writes: OrderWriteBehind | None = Depends(get_order_writes),
     settings: Settings = Depends(get_settings),
 ) -> dict[str, bool]:
     raw = await request.body()
-    provided_signature = request.headers.get("creem-signature")
-    if not provided_signature:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing signature")
-
-    expected_signature = hmac_sha256_hex(settings.creem_webhook_secret, raw)
-    if not secure_compare(expected_signature, provided_signature):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid signature")
-
     try:
-        payload = json.loads(raw.decode("utf-8"))
-    except (UnicodeDecodeError, json.JSONDecodeError) as exc:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid payload",
-        ) from exc
-
-    event_key = payload.get("id") or payload.get("eventId") or sha256_hex(raw)
-    event_key = str(event_key)
-
-    if repo.webhook_event_seen(event_key):
+        event = _verified_event(
+            settings.creem_webhook_secret,
+            raw,
+            request.headers.get("creem-signature"),
+        )
+    except _Rejected as exc:
+        WEBHOOK_DELIVERIES.inc(exc.result)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=exc.detail) from exc
+
+    if processor is not None:
+        if seen is not None and await seen.seen(event.event_key):
+            WEBHOOK_DELIVERIES.inc("duplicate")
+            return {"ok": True}
+        await processor.enqueue(event.event_key, event.ordering_key, raw)
+        WEBHOOK_DELIVERIES.inc("queued")
         return {"ok": True}
 
-    repo.webhook_event_mark_seen(event_key)
-
-    if payload.get("eventType") == "checkout.completed":
-        obj = payload.get("object") or {}
-        request_id = obj.get("request_id")
-        order_obj = obj.get("order") or {}
-
-        paid_status = order_obj.get("status")
-        creem_order_id = order_obj.get("id")
-        creem_checkout_id = obj.get("id") or obj.get("checkout_id")
-        amount_cents = _to_optional_int(order_obj.get("amount") or order_obj.get("amount_cents"))
-        currency = order_obj.get("currency")
-
-        if request_id and paid_status == "paid":
-            local_order = repo.get_order_by_request_id(str(request_id))
-            if local_order:
-                repo.mark_order_paid(
-                    request_id=str(request_id),
-                    creem_checkout_id=str(creem_checkout_id) if creem_checkout_id else None,
-                    creem_order_id=str(creem_order_id) if creem_order_id else None,
-                    amount_cents=amount_cents,
-                    currency=str(currency) if currency else None,
-                )
-                repo.grant_entitlement(
-                    user_id=str(local_order["user_id"]),
-                    product_id=str(local_order["product_id"]),
-                )
-
+    if batcher is not None:
+        await batcher.submit(event)
+    else:
+        await process_event(repo, event, broker, seen, writes)
+    WEBHOOK_DELIVERIES.inc("processed")
     return {"ok": True}
+
+
+@router.post("/webhooks/creem/batch")
+async def creem_webhook_batch(
+    request: Request,
+    repo: AsyncRepo = Depends(get_repo),
+    processor: WebhookProcessor | None = Depends(get_webhook_processor),
+    broker: EntitlementBroker = Depends(get_entitlement_broker),
+    seen: SeenEvents | None = Depends(get_seen_events),
+    writes: OrderWriteBehind | None = Depends(get_order_writes),
+    settings: Settings = Depends(get_settings),
+) -> dict[str, list[dict[str, Any]]]:
+    results: list[dict[str, Any]] = []
+    accepted: list[tuple[int, CreemEvent, bytes]] = []
+
+    for line in (await request.body()).splitlines():
+        if not line.strip():
+            continue
+        try:
+            try:
+                envelope = fast_json.loads(line)
+                raw = str(envelope["payload"]).encode("utf-8")
+                signature = envelope.get("signature")
+            except (ValueError, KeyError, TypeError, AttributeError) as exc:
+                raise _Rejected("invalid_payload", "Invalid payload") from exc
+            event = _verified_event(settings.creem_webhook_secret, raw, signature)
+        except _Rejected as exc:
+            WEBHOOK_DELIVERIES.inc(exc.result)
+            results.append({"event_key": None, "outcome": exc.result})
+            continue
+
+        accepted.append((len(results), event, raw))
+        results.append({"event_key": event.event_key, "outcome": None})
+
+    if processor is not None:
+        already_seen = (
+            await seen.seen_many([event.event_key for _, event, _ in accepted])
+            if seen is not None
+            else [False] * len(accepted)
+        )
+        for (index, event, raw), duplicate in zip(accepted, already_seen, strict=True):
+            if duplicate:
+                outcome = "duplicate"
+            else:
+                await processor.enqueue(event.event_key, event.ordering_key, raw)
+                outcome = "queued"
+            WEBHOOK_DELIVERIES.inc(outcome)
+            results[index]["outcome"] = outcome
+        return {"results": results}
+
+    chunk_size = max(1, settings.webhook_batch_max_events)
+    for start in range(0, len(accepted), chunk_size):
+        chunk = accepted[start : start + chunk_size]
+        outcomes = await process_events(
+            repo,
+            [event for _, event, _ in chunk],
+            broker,
+            seen,
+            writes,
+        )
+        for (index, _, _), outcome in zip(chunk, outcomes, strict=True):
+            WEBHOOK_DELIVERIES.inc("processed")
+            results[index]["outcome"] = outcome
+    return {"results": results}
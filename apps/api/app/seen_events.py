@@ -0,0 +1,40 @@
+from app.cache import Cache, MemoryCache
+
+
+class SeenEvents:
+    # Only keys already recorded in webhook_events are added, so a hit is always a
+    # confirmed duplicate and the database stays the source of truth on a miss.
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float | None = None,
+        cache: Cache | None = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.cache = cache if cache is not None else MemoryCache(max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        return {**self.cache.stats(), "hits": self.hits, "misses": self.misses}
+
+    async def seen_many(self, event_keys: list[str]) -> list[bool]:
+        found = [
+            value is not None
+            for value in await self.cache.get_many([f"seen:{key}" for key in event_keys])
+        ]
+        self.hits += sum(found)
+        self.misses += len(found) - sum(found)
+        return found
+
+    async def seen(self, event_key: str) -> bool:
+        return (await self.seen_many([event_key]))[0]
+
+    async def add_many(self, event_keys: list[str]) -> None:
+        if self.max_entries <= 0 or not event_keys:
+            return
+        await self.cache.set_many({f"seen:{key}": b"1" for key in event_keys}, self.ttl_seconds)
+
+    async def add(self, event_key: str) -> None:
+        await self.add_many([event_key])
@@ -0,0 +1,594 @@
+import asyncio
+import sqlite3
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import UTC, datetime
+from typing import Any, TypeVar
+from uuid import uuid4
+
+from app.config import Settings
+from app.metrics import outbound_timer
+
+T = TypeVar("T")
+
+# Mirrors supabase/schema.sql, including its unique constraints and keyset indexes.
+_SCHEMA = """
+create table if not exists products (
+  id text primary key,
+  name text not null,
+  price_cents integer not null,
+  currency text not null default 'USD',
+  creem_product_id text not null,
+  active integer not null default 1,
+  created_at text not null
+);
+
+create table if not exists orders (
+  id text primary key,
+  user_id text not null,
+  product_id text not null references products(id),
+  status text not null default 'pending',
+  request_id text not null unique,
+  creem_checkout_id text null,
+  creem_order_id text null,
+  amount_cents integer null,
+  currency text null,
+  created_at text not null,
+  updated_at text not null
+);
+create index if not exists orders_created_at_id_idx on orders (created_at, id);
+create index if not exists orders_status_created_at_id_idx on orders (status, created_at, id);
+
+create table if not exists entitlements (
+  id text primary key,
+  user_id text not null,
+  product_id text not null references products(id),
+  granted_at text not null,
+  unique(user_id, product_id)
+);
+
+create table if not exists webhook_events (
+  id text primary key,
+  event_key text not null unique,
+  received_at text not null
+);
+create index if not exists webhook_events_received_at_idx on webhook_events (received_at);
+"""
+
+_UPSERT_PRODUCT_SQL = """
+insert into products (id, name, price_cents, currency, creem_product_id, active, created_at)
+values (:id, :name, :price_cents, :currency, :creem_product_id, :active, :created_at)
+on conflict (id) do update set
+  name = excluded.name,
+  price_cents = excluded.price_cents,
+  currency = excluded.currency,
+  creem_product_id = excluded.creem_product_id,
+  active = excluded.active
+"""
+
+_INSERT_ORDER_SQL = """
+insert into orders (id, user_id, product_id, status, request_id, created_at, updated_at)
+values (?, ?, ?, 'pending', ?, ?, ?)
+returning *
+"""
+
+_MARK_PAID_SQL = """
+update orders
+   set status = 'paid',
+       creem_checkout_id = ?,
+       creem_order_id = ?,
+       amount_cents = ?,
+       currency = ?,
+       updated_at = ?
+ where request_id = ?
+returning user_id, product_id
+"""
+
+_UPSERT_PAID_SQL = """
+insert into orders (
+  id, user_id, product_id, status, request_id,
+  creem_checkout_id, creem_order_id, amount_cents, currency, created_at, updated_at
+)
+values (?, ?, ?, 'paid', ?, ?, ?, ?, ?, ?, ?)
+on conflict (request_id) do update set
+  status = 'paid',
+  creem_checkout_id = excluded.creem_checkout_id,
+  creem_order_id = excluded.creem_order_id,
+  amount_cents = excluded.amount_cents,
+  currency = excluded.currency,
+  updated_at = excluded.updated_at
+"""
+
+_GRANT_SQL = """
+insert into entitlements (id, user_id, product_id, granted_at)
+values (?, ?, ?, ?)
+on conflict (user_id, product_id) do nothing
+"""
+
+_INSERT_EVENT_SQL = """
+insert into webhook_events (id, event_key, received_at)
+values (?, ?, ?)
+on conflict (event_key) do nothing
+"""
+
+_APPLY_ORDER_UPDATE_SQL = """
+update orders
+   set status = case when status = 'paid' then status else coalesce(?, status) end,
+       creem_checkout_id = coalesce(?, creem_checkout_id),
+       updated_at = ?
+ where request_id = ?
+"""
+
+_REVENUE_BY_DAY_SQL = """
+select substr(created_at, 1, 10) as day,
+       product_id,
+       currency,
+       count(*) as orders,
+       coalesce(sum(amount_cents), 0) as amount_cents
+  from orders
+ where status = 'paid' and created_at >= ? and created_at < ?
+ group by day, product_id, currency
+ order by day, product_id, currency
+"""
+
+_PRUNE_EVENTS_SQL = """
+delete from webhook_events
+ where id in (
+   select id from webhook_events
+    where received_at < ?
+    order by received_at
+    limit ?
+ )
+"""
+
+
+def _now_iso() -> str:
+    return datetime.now(UTC).isoformat()
+
+
+def _product(row: sqlite3.Row) -> dict[str, Any]:
+    return {**dict(row), "active": bool(row["active"])}
+
+
+class SqliteRepo:
+    def __init__(self, path: str, *, synchronous: str = "full") -> None:
+        self.path = path
+        self.synchronous = synchronous
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-repo")
+        self._conn: sqlite3.Connection | None = None
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        operation = fn.__name__.lstrip("_")
+        with outbound_timer("sqlite", operation) as result:
+            try:
+                value = await loop.run_in_executor(self._executor, fn, *args)
+            except sqlite3.Error as exc:
+                # Same failure type as the Supabase repo, whichever statement raised it.
+                action = operation.replace("_", " ")
+                raise RuntimeError(f"SQLite request failed for {action} ({exc})") from exc
+            result.append("ok")
+        return value
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            raise RuntimeError("SQLite repo is not open")
+        return self._conn
+
+    @contextmanager
+    def _transaction(self, action: str) -> Iterator[sqlite3.Connection]:
+        conn = self._db()
+        conn.execute("begin immediate")
+        try:
+            yield conn
+        except sqlite3.Error as exc:
+            conn.execute("rollback")
+            raise RuntimeError(f"SQLite request failed for {action} ({exc})") from exc
+        except BaseException:
+            conn.execute("rollback")
+            raise
+        conn.execute("commit")
+
+    def _open(self) -> None:
+        # Statements are parameterized constants, so sqlite3's statement cache keeps
+        # them prepared for the lifetime of the connection.
+        conn = sqlite3.connect(
+            self.path,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=64,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("pragma journal_mode=wal")
+        conn.execute(f"pragma synchronous={self.synchronous}")
+        conn.execute("pragma foreign_keys=on")
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def open(self) -> None:
+        await self._run(self._open)
+
+    async def close(self) -> None:
+        if self._conn is None:
+            return
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+    def _upsert_products(self, products: list[dict[str, Any]]) -> None:
+        now = _now_iso()
+        rows = [
+            {
+                "currency": "USD",
+                "active": True,
+                "created_at": now,
+                **product,
+            }
+            for product in products
+        ]
+        with self._transaction("upsert products") as conn:
+            conn.executemany(_UPSERT_PRODUCT_SQL, rows)
+
+    async def upsert_products(self, products: list[dict[str, Any]]) -> None:
+        await self._run(self._upsert_products, products)
+
+    def _get_product(self, product_id: str) -> dict[str, Any] | None:
+        row = self._db().execute(
+            "select * from products where id = ? and active = 1",
+            (product_id,),
+        ).fetchone()
+        return _product(row) if row else None
+
+    async def get_product(self, product_id: str) -> dict[str, Any] | None:
+        return await self._run(self._get_product, product_id)
+
+    def _list_active_products(self) -> list[dict[str, Any]]:
+        rows = self._db().execute(
+            "select * from products where active = 1 order by created_at, id"
+        ).fetchall()
+        return [_product(row) for row in rows]
+
+    async def list_active_products(self) -> list[dict[str, Any]]:
+        return await self._run(self._list_active_products)
+
+    def _create_order_pending(
+        self,
+        user_id: str,
+        product_id: str,
+        request_id: str,
+    ) -> dict[str, Any]:
+        now = _now_iso()
+        with self._transaction("insert orders") as conn:
+            row = conn.execute(
+                _INSERT_ORDER_SQL,
+                (str(uuid4()), user_id, product_id, request_id, now, now),
+            ).fetchone()
+        return dict(row)
+
+    async def create_order_pending(
+        self,
+        user_id: str,
+        product_id: str,
+        request_id: str,
+    ) -> dict[str, Any]:
+        return await self._run(self._create_order_pending, user_id, product_id, request_id)
+
+    def _update_order_failed(self, request_id: str) -> None:
+        self._db().execute(
+            "update orders set status = 'failed', updated_at = ? where request_id = ?",
+            (_now_iso(), request_id),
+        )
+
+    async def update_order_failed(self, request_id: str) -> None:
+        await self._run(self._update_order_failed, request_id)
+
+    def _update_order_checkout_ids(
+        self,
+        request_id: str,
+        creem_checkout_id: str | None,
+    ) -> None:
+        self._db().execute(
+            "update orders set creem_checkout_id = ?, updated_at = ? where request_id = ?",
+            (creem_checkout_id, _now_iso(), request_id),
+        )
+
+    async def update_order_checkout_ids(
+        self,
+        request_id: str,
+        creem_checkout_id: str | None,
+    ) -> None:
+        await self._run(self._update_order_checkout_ids, request_id, creem_checkout_id)
+
+    def _apply_order_updates(self, updates: list[dict[str, Any]]) -> None:
+        now = _now_iso()
+        with self._transaction("apply order updates") as conn:
+            conn.executemany(
+                _APPLY_ORDER_UPDATE_SQL,
+                [
+                    (
+                        update.get("status"),
+                        update.get("creem_checkout_id"),
+                        now,
+                        update["request_id"],
+                    )
+                    for update in updates
+                ],
+            )
+
+    async def apply_order_updates(self, updates: list[dict[str, Any]]) -> None:
+        if not updates:
+            return
+        await self._run(self._apply_order_updates, updates)
+
+    def _get_order_by_request_id(self, request_id: str) -> dict[str, Any] | None:
+        row = self._db().execute(
+            "select * from orders where request_id = ?",
+            (request_id,),
+        ).fetchone()
+        return dict(row) if row else None
+
+    async def get_order_by_request_id(self, request_id: str) -> dict[str, Any] | None:
+        return await self._run(self._get_order_by_request_id, request_id)
+
+    def _mark_order_paid(
+        self,
+        request_id: str,
+        creem_checkout_id: str | None,
+        creem_order_id: str | None,
+        amount_cents: int | None,
+        currency: str | None,
+    ) -> None:
+        self._db().execute(
+            _MARK_PAID_SQL,
+            (creem_checkout_id, creem_order_id, amount_cents, currency, _now_iso(), request_id),
+        ).fetchall()
+
+    async def mark_order_paid(
+        self,
+        request_id: str,
+        creem_checkout_id: str | None,
+        creem_order_id: str | None,
+        amount_cents: int | None,
+        currency: str | None,
+    ) -> None:
+        await self._run(
+            self._mark_order_paid,
+            request_id,
+            creem_checkout_id,
+            creem_order_id,
+            amount_cents,
+            currency,
+        )
+
+    def _grant_entitlement(self, user_id: str, product_id: str) -> None:
+        self._db().execute(_GRANT_SQL, (str(uuid4()), user_id, product_id, _now_iso()))
+
+    async def grant_entitlement(self, user_id: str, product_id: str) -> None:
+        await self._run(self._grant_entitlement, user_id, product_id)
+
+    def _list_entitlements(self, user_id: str) -> list[dict[str, Any]]:
+        rows = self._db().execute(
+            "select product_id, granted_at from entitlements where user_id = ?",
+            (user_id,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    async def list_entitlements(self, user_id: str) -> list[dict[str, Any]]:
+        return await self._run(self._list_entitlements, user_id)
+
+    def _list_entitlements_page(
+        self,
+        after: tuple[str, str] | None,
+        limit: int,
+    ) -> list[dict[str, Any]]:
+        where = "where (user_id, product_id) > (?, ?)" if after else ""
+        rows = self._db().execute(
+            f"select user_id, product_id from entitlements {where} "
+            "order by user_id, product_id limit ?",
+            (*(after or ()), limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    async def list_entitlements_page(
+        self,
+        after: tuple[str, str] | None,
+        limit: int,
+    ) -> list[dict[str, Any]]:
+        return await self._run(self._list_entitlements_page, after, limit)
+
+    def _webhook_event_insert(self, event_key: str) -> bool:
+        cursor = self._db().execute(_INSERT_EVENT_SQL, (str(uuid4()), event_key, _now_iso()))
+        return cursor.rowcount == 1
+
+    async def webhook_event_insert(self, event_key: str) -> bool:
+        return await self._run(self._webhook_event_insert, event_key)
+
+    def _webhook_event_insert_many(self, event_keys: list[str]) -> set[str]:
+        now = _now_iso()
+        inserted: set[str] = set()
+        with self._transaction("bulk insert webhook events") as conn:
+            for event_key in dict.fromkeys(event_keys):
+                cursor = conn.execute(_INSERT_EVENT_SQL, (str(uuid4()), event_key, now))
+                if cursor.rowcount == 1:
+                    inserted.add(event_key)
+        return inserted
+
+    async def webhook_event_insert_many(self, event_keys: list[str]) -> set[str]:
+        if not event_keys:
+            return set()
+        return await self._run(self._webhook_event_insert_many, event_keys)
+
+    def _prune_webhook_events(self, received_before: str, limit: int) -> int:
+        return self._db().execute(_PRUNE_EVENTS_SQL, (received_before, limit)).rowcount
+
+    async def prune_webhook_events(self, received_before: str, limit: int) -> int:
+        return await self._run(self._prune_webhook_events, received_before, limit)
+
+    @staticmethod
+    def _apply_checkout(
+        conn: sqlite3.Connection,
+        event: dict[str, Any],
+        now: str,
+    ) -> dict[str, Any]:
+        result: dict[str, Any] = {
+            "new_event": False,
+            "order_found": False,
+            "user_id": None,
+            "product_id": None,
+        }
+        inserted = conn.execute(_INSERT_EVENT_SQL, (str(uuid4()), event["event_key"], now))
+        if inserted.rowcount == 0:
+            return result
+        result["new_event"] = True
+
+        order = conn.execute(
+            _MARK_PAID_SQL,
+            (
+                event.get("creem_checkout_id"),
+                event.get("creem_order_id"),
+                event.get("amount_cents"),
+                event.get("currency"),
+                now,
+                event["request_id"],
+            ),
+        ).fetchone()
+        if order is None:
+            return result
+
+        conn.execute(_GRANT_SQL, (str(uuid4()), order["user_id"], order["product_id"], now))
+        result.update(
+            order_found=True,
+            user_id=order["user_id"],
+            product_id=order["product_id"],
+        )
+        return result
+
+    def _process_checkout_completed_batch(
+        self,
+        events: list[dict[str, Any]],
+    ) -> list[dict[str, Any]]:
+        now = _now_iso()
+        with self._transaction("process_checkout_completed") as conn:
+            return [self._apply_checkout(conn, event, now) for event in events]
+
+    async def process_checkout_completed(
+        self,
+        event_key: str,
+        request_id: str,
+        creem_checkout_id: str | None,
+        creem_order_id: str | None,
+        amount_cents: int | None,
+        currency: str | None,
+    ) -> dict[str, Any]:
+        event = {
+            "event_key": event_key,
+            "request_id": request_id,
+            "creem_checkout_id": creem_checkout_id,
+            "creem_order_id": creem_order_id,
+            "amount_cents": amount_cents,
+            "currency": currency,
+        }
+        results = await self._run(self._process_checkout_completed_batch, [event])
+        return results[0]
+
+    async def process_checkout_completed_batch(
+        self,
+        events: list[dict[str, Any]],
+    ) -> list[dict[str, Any]]:
+        if not events:
+            return []
+        return await self._run(self._process_checkout_completed_batch, events)
+
+    def _list_orders_page(
+        self,
+        statuses: list[str] | None,
+        after: tuple[str, str] | None,
+        limit: int,
+        created_before: str | None,
+    ) -> list[dict[str, Any]]:
+        clauses: list[str] = []
+        params: list[Any] = []
+        if statuses:
+            clauses.append(f"status in ({','.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if created_before:
+            clauses.append("created_at < ?")
+            params.append(created_before)
+        if after:
+            clauses.append("(created_at, id) > (?, ?)")
+            params.extend(after)
+
+        where = f"where {' and '.join(clauses)}" if clauses else ""
+        rows = self._db().execute(
+            f"select * from orders {where} order by created_at, id limit ?",
+            (*params, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    async def list_orders_page(
+        self,
+        statuses: list[str] | None,
+        after: tuple[str, str] | None,
+        limit: int,
+        created_before: str | None = None,
+    ) -> list[dict[str, Any]]:
+        return await self._run(self._list_orders_page, statuses, after, limit, created_before)
+
+    def _revenue_by_day(self, created_from: str, created_before: str) -> list[dict[str, Any]]:
+        rows = self._db().execute(_REVENUE_BY_DAY_SQL, (created_from, created_before)).fetchall()
+        return [dict(row) for row in rows]
+
+    async def revenue_by_day(
+        self,
+        created_from: str,
+        created_before: str,
+    ) -> list[dict[str, Any]]:
+        return await self._run(self._revenue_by_day, created_from, created_before)
+
+    def _bulk_mark_orders_paid(self, orders: list[dict[str, Any]]) -> None:
+        now = _now_iso()
+        rows = [
+            (
+                str(uuid4()),
+                order["user_id"],
+                order["product_id"],
+                order["request_id"],
+                order.get("creem_checkout_id"),
+                order.get("creem_order_id"),
+                order.get("amount_cents"),
+                order.get("currency"),
+                now,
+                now,
+            )
+            for order in orders
+        ]
+        with self._transaction("bulk upsert orders paid") as conn:
+            conn.executemany(_UPSERT_PAID_SQL, rows)
+
+    async def bulk_mark_orders_paid(self, orders: list[dict[str, Any]]) -> None:
+        if not orders:
+            return
+        await self._run(self._bulk_mark_orders_paid, orders)
+
+    def _bulk_grant_entitlements(self, grants: list[tuple[str, str]]) -> None:
+        now = _now_iso()
+        rows = [
+            (str(uuid4()), user_id, product_id, now)
+            for user_id, product_id in dict.fromkeys(grants)
+        ]
+        with self._transaction("bulk upsert entitlements") as conn:
+            conn.executemany(_GRANT_SQL, rows)
+
+    async def bulk_grant_entitlements(self, grants: list[tuple[str, str]]) -> None:
+        if not grants:
+            return
+        await self._run(self._bulk_grant_entitlements, grants)
+
+
+def build_sqlite_repo(settings: Settings) -> SqliteRepo:
+    return SqliteRepo(settings.sqlite_repo_path, synchronous=settings.sqlite_repo_synchronous)
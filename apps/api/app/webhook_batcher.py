@@ -0,0 +1,97 @@
+import asyncio
+
+from app.config import Settings
+from app.order_writes import OrderWriteBehind
+from app.pubsub import EntitlementBroker
+from app.repo import AsyncRepo
+from app.seen_events import SeenEvents
+from app.webhook_events import CreemEvent, process_events
+
+PendingEvent = tuple[CreemEvent, asyncio.Future[str]]
+
+
+class WebhookBatcher:
+    def __init__(
+        self,
+        repo: AsyncRepo,
+        *,
+        window_seconds: float,
+        max_events: int = 100,
+        broker: EntitlementBroker | None = None,
+        seen: SeenEvents | None = None,
+        writes: OrderWriteBehind | None = None,
+    ) -> None:
+        self.repo = repo
+        self.window_seconds = window_seconds
+        self.max_events = max(1, max_events)
+        self.broker = broker
+        self.seen = seen
+        self.writes = writes
+        self._pending: list[PendingEvent] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushes: set[asyncio.Task[None]] = set()
+
+    async def submit(self, event: CreemEvent) -> str:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[str] = loop.create_future()
+        self._pending.append((event, future))
+        if len(self._pending) >= self.max_events:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._flush_now)
+        return await future
+
+    def _flush_now(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: list[PendingEvent]) -> None:
+        try:
+            outcomes = await process_events(
+                self.repo,
+                [event for event, _ in batch],
+                self.broker,
+                self.seen,
+                self.writes,
+            )
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, future), outcome in zip(batch, outcomes, strict=True):
+            if not future.done():
+                future.set_result(outcome)
+
+    async def stop(self) -> None:
+        self._flush_now()
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+def build_webhook_batcher(
+    settings: Settings,
+    repo: AsyncRepo | None,
+    broker: EntitlementBroker | None = None,
+    seen: SeenEvents | None = None,
+    writes: OrderWriteBehind | None = None,
+) -> WebhookBatcher | None:
+    if repo is None or settings.webhook_batch_window_ms <= 0:
+        return None
+    if settings.webhook_ingest_mode == "queued":
+        return None
+    return WebhookBatcher(
+        repo,
+        window_seconds=settings.webhook_batch_window_ms / 1000,
+        max_events=settings.webhook_batch_max_events,
+        broker=broker,
+        seen=seen,
+        writes=writes,
+    )
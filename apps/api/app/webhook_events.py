@@ -0,0 +1,164 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any
+
+from app import fast_json
+from app.metrics import WEBHOOK_EVENTS
+from app.order_writes import OrderWriteBehind
+from app.pubsub import EntitlementBroker
+from app.repo import AsyncRepo
+from app.seen_events import SeenEvents
+from app.utils.crypto import sha256_hex
+
+
+def _to_optional_int(value: Any) -> int | None:
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def event_key_for(payload: dict[str, Any], raw: bytes) -> str:
+    return str(payload.get("id") or payload.get("eventId") or sha256_hex(raw))
+
+
+def paid_checkout_fields(obj: dict[str, Any]) -> dict[str, Any] | None:
+    order_obj = obj.get("order") or {}
+    if order_obj.get("status") != "paid":
+        return None
+
+    creem_order_id = order_obj.get("id")
+    creem_checkout_id = obj.get("id") or obj.get("checkout_id")
+    currency = order_obj.get("currency")
+    return {
+        "creem_checkout_id": str(creem_checkout_id) if creem_checkout_id else None,
+        "creem_order_id": str(creem_order_id) if creem_order_id else None,
+        "amount_cents": _to_optional_int(order_obj.get("amount") or order_obj.get("amount_cents")),
+        "currency": str(currency) if currency else None,
+    }
+
+
+@dataclass(frozen=True, slots=True)
+class CreemEvent:
+    event_key: str
+    ordering_key: str
+    # process_checkout_completed arguments when this is a paid checkout.completed event.
+    checkout: dict[str, Any] | None = None
+
+
+def event_from_payload(payload: dict[str, Any], raw: bytes) -> CreemEvent:
+    event_key = event_key_for(payload, raw)
+    obj = payload.get("object")
+    if not isinstance(obj, dict):
+        return CreemEvent(event_key, event_key)
+
+    request_id = obj.get("request_id")
+    if not request_id:
+        return CreemEvent(event_key, event_key)
+
+    checkout = None
+    if payload.get("eventType") == "checkout.completed":
+        paid = paid_checkout_fields(obj)
+        if paid:
+            checkout = {"event_key": event_key, "request_id": str(request_id), **paid}
+    return CreemEvent(event_key, str(request_id), checkout)
+
+
+def parse_event(raw: bytes) -> CreemEvent:
+    payload = fast_json.loads(raw)
+    if not isinstance(payload, dict):
+        raise ValueError("webhook payload must be a JSON object")
+    return event_from_payload(payload, raw)
+
+
+def _checkout_outcome(result: dict[str, Any], broker: EntitlementBroker | None) -> str:
+    if not result["new_event"]:
+        return "duplicate"
+    if not result["order_found"]:
+        return "order_not_found"
+    if broker is not None:
+        broker.publish(str(result["user_id"]), str(result["product_id"]))
+    return "paid"
+
+
+async def process_event(
+    repo: AsyncRepo,
+    event: CreemEvent,
+    broker: EntitlementBroker | None = None,
+    seen: SeenEvents | None = None,
+    writes: OrderWriteBehind | None = None,
+) -> str:
+    if seen is not None and await seen.seen(event.event_key):
+        outcome = "duplicate"
+    else:
+        outcome = await _apply_event(repo, event, broker, writes)
+        if seen is not None:
+            await seen.add(event.event_key)
+    WEBHOOK_EVENTS.inc(outcome)
+    return outcome
+
+
+async def _apply_event(
+    repo: AsyncRepo,
+    event: CreemEvent,
+    broker: EntitlementBroker | None,
+    writes: OrderWriteBehind | None,
+) -> str:
+    if event.checkout is not None:
+        if writes is not None:
+            await writes.flush([event.checkout["request_id"]])
+        return _checkout_outcome(await repo.process_checkout_completed(**event.checkout), broker)
+
+    if not await repo.webhook_event_insert(event.event_key):
+        return "duplicate"
+    return "ignored"
+
+
+async def process_events(
+    repo: AsyncRepo,
+    events: list[CreemEvent],
+    broker: EntitlementBroker | None = None,
+    seen: SeenEvents | None = None,
+    writes: OrderWriteBehind | None = None,
+) -> list[str]:
+    outcomes = ["duplicate"] * len(events)
+    checkouts: list[tuple[int, dict[str, Any]]] = []
+    others: list[tuple[int, str]] = []
+    batch_keys: set[str] = set()
+    already_seen = (
+        await seen.seen_many([event.event_key for event in events])
+        if seen is not None
+        else [False] * len(events)
+    )
+
+    for index, event in enumerate(events):
+        if event.event_key in batch_keys or already_seen[index]:
+            continue
+        batch_keys.add(event.event_key)
+        if event.checkout is not None:
+            checkouts.append((index, event.checkout))
+        else:
+            others.append((index, event.event_key))
+
+    if writes is not None and checkouts:
+        # Land any queued checkout id or failure first so the paid update is applied last.
+        await writes.flush([checkout["request_id"] for _, checkout in checkouts])
+
+    # Paid checkouts go through one transactional RPC, everything else is a single
+    # bulk dedup insert; the two touch disjoint event keys so they run concurrently.
+    results, inserted = await asyncio.gather(
+        repo.process_checkout_completed_batch([checkout for _, checkout in checkouts]),
+        repo.webhook_event_insert_many([event_key for _, event_key in others]),
+    )
+    for (index, _), result in zip(checkouts, results, strict=True):
+        outcomes[index] = _checkout_outcome(result, broker)
+    for index, event_key in others:
+        outcomes[index] = "ignored" if event_key in inserted else "duplicate"
+
+    if seen is not None:
+        await seen.add_many(list(batch_keys))
+    for outcome in outcomes:
+        WEBHOOK_EVENTS.inc(outcome)
+    return outcomes
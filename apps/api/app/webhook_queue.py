@@ -0,0 +1,325 @@
+import asyncio
+import contextlib
+import logging
+import sqlite3
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+from app.config import Settings
+from app.metrics import WEBHOOK_QUEUE_LOOP_ERRORS
+from app.order_writes import OrderWriteBehind
+from app.pubsub import EntitlementBroker
+from app.repo import AsyncRepo
+from app.seen_events import SeenEvents
+from app.webhook_events import parse_event, process_event
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+create table if not exists webhook_queue (
+  id integer primary key autoincrement,
+  event_key text not null unique,
+  ordering_key text not null,
+  payload blob not null,
+  state text not null default 'pending',
+  attempts integer not null default 0,
+  available_at real not null,
+  last_error text null,
+  created_at real not null
+);
+create index if not exists webhook_queue_ordering_idx
+  on webhook_queue (ordering_key, state, id);
+"""
+
+_CLAIM_SQL = """
+select id, event_key, ordering_key, payload, attempts
+from webhook_queue q
+where state = 'pending'
+  and available_at <= ?
+  and id = (
+    select min(id) from webhook_queue h
+    where h.ordering_key = q.ordering_key and h.state = 'pending'
+  )
+order by id
+limit ?
+"""
+
+
+@dataclass(frozen=True)
+class QueuedEvent:
+    id: int
+    event_key: str
+    ordering_key: str
+    payload: bytes
+    attempts: int
+
+
+class WebhookQueue:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="webhook-queue")
+        self._conn: sqlite3.Connection | None = None
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            raise RuntimeError("Webhook queue is not open")
+        return self._conn
+
+    def _open(self) -> None:
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute("pragma journal_mode=wal")
+        conn.execute("pragma synchronous=full")
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def open(self) -> None:
+        await self._run(self._open)
+
+    async def close(self) -> None:
+        if self._conn is None:
+            return
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+    def _append(self, event_key: str, ordering_key: str, payload: bytes) -> bool:
+        now = time.time()
+        cursor = self._db().execute(
+            "insert or ignore into webhook_queue "
+            "(event_key, ordering_key, payload, available_at, created_at) "
+            "values (?, ?, ?, ?, ?)",
+            (event_key, ordering_key, payload, now, now),
+        )
+        if cursor.rowcount == 1:
+            return True
+        # A redelivery of a dead-lettered event gets a fresh set of attempts.
+        cursor = self._db().execute(
+            "update webhook_queue set state = 'pending', attempts = 0, available_at = ?, "
+            "payload = ?, last_error = null where event_key = ? and state = 'dead'",
+            (now, payload, event_key),
+        )
+        return cursor.rowcount == 1
+
+    async def append(self, event_key: str, ordering_key: str, payload: bytes) -> bool:
+        return await self._run(self._append, event_key, ordering_key, payload)
+
+    def _claim_ready(self, limit: int, exclude: set[str]) -> list[QueuedEvent]:
+        rows = self._db().execute(_CLAIM_SQL, (time.time(), limit + len(exclude))).fetchall()
+        events = [QueuedEvent(*row) for row in rows if row[2] not in exclude]
+        return events[:limit]
+
+    async def claim_ready(self, limit: int, exclude: set[str]) -> list[QueuedEvent]:
+        return await self._run(self._claim_ready, limit, set(exclude))
+
+    def _ack(self, event_id: int) -> None:
+        self._db().execute("delete from webhook_queue where id = ?", (event_id,))
+
+    async def ack(self, event_id: int) -> None:
+        await self._run(self._ack, event_id)
+
+    def _reschedule(self, event_id: int, attempts: int, available_at: float, error: str) -> None:
+        self._db().execute(
+            "update webhook_queue set attempts = ?, available_at = ?, last_error = ? "
+            "where id = ?",
+            (attempts, available_at, error, event_id),
+        )
+
+    async def reschedule(
+        self,
+        event_id: int,
+        attempts: int,
+        available_at: float,
+        error: str,
+    ) -> None:
+        await self._run(self._reschedule, event_id, attempts, available_at, error)
+
+    def _mark_dead(self, event_id: int, attempts: int, error: str) -> None:
+        self._db().execute(
+            "update webhook_queue set state = 'dead', attempts = ?, last_error = ? where id = ?",
+            (attempts, error, event_id),
+        )
+
+    async def mark_dead(self, event_id: int, attempts: int, error: str) -> None:
+        await self._run(self._mark_dead, event_id, attempts, error)
+
+    def _counts(self) -> dict[str, int]:
+        rows = self._db().execute(
+            "select state, count(*) from webhook_queue group by state"
+        ).fetchall()
+        return {str(state): int(count) for state, count in rows}
+
+    async def counts(self) -> dict[str, int]:
+        return await self._run(self._counts)
+
+    def _ping(self) -> None:
+        self._db().execute("select 1 from webhook_queue limit 1").fetchall()
+
+    async def ping(self) -> None:
+        await self._run(self._ping)
+
+
+class WebhookProcessor:
+    def __init__(
+        self,
+        queue: WebhookQueue,
+        repo: AsyncRepo,
+        workers: int,
+        *,
+        poll_interval_seconds: float = 1.0,
+        retry_base_seconds: float = 1.0,
+        retry_max_seconds: float = 300.0,
+        max_attempts: int = 10,
+        broker: EntitlementBroker | None = None,
+        seen: SeenEvents | None = None,
+        writes: OrderWriteBehind | None = None,
+    ) -> None:
+        self.queue = queue
+        self.repo = repo
+        self.broker = broker
+        self.seen = seen
+        self.writes = writes
+        self.workers = max(1, workers)
+        self.poll_interval_seconds = poll_interval_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.max_attempts = max_attempts
+        self._jobs: asyncio.Queue[QueuedEvent] = asyncio.Queue(maxsize=self.workers)
+        self._busy: set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task[None]] = []
+        self._failing: set[str] = set()
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def enqueue(self, event_key: str, ordering_key: str, payload: bytes) -> bool:
+        inserted = await self.queue.append(event_key, ordering_key, payload)
+        self.notify()
+        return inserted
+
+    def start(self) -> None:
+        self._tasks.append(asyncio.create_task(self._dispatch_loop()))
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._work_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def check(self) -> None:
+        # Readiness probe: the loops must be alive and the journal must answer.
+        if any(task.done() for task in self._tasks):
+            raise RuntimeError("Webhook queue loop exited")
+        if self._failing:
+            raise RuntimeError(f"Webhook queue loop failing: {self._failing}")
+        await self.queue.ping()
+
+    async def _backoff(self, loop: str, failures: int) -> None:
+        WEBHOOK_QUEUE_LOOP_ERRORS.inc(loop)
+        logger.exception("webhook queue %s loop failed (%d in a row)", loop, failures)
+        delay = min(self.retry_max_seconds, self.poll_interval_seconds * 2 ** (failures - 1))
+        await asyncio.sleep(delay)
+
+    async def _dispatch_loop(self) -> None:
+        failures = 0
+        while True:
+            self._wakeup.clear()
+            try:
+                ready = await self.queue.claim_ready(self.workers, self._busy)
+            except Exception:
+                failures += 1
+                self._failing.add("dispatch")
+                await self._backoff("dispatch", failures)
+                continue
+            failures = 0
+            self._failing.discard("dispatch")
+            for event in ready:
+                self._busy.add(event.ordering_key)
+                await self._jobs.put(event)
+
+            if not ready:
+                # asyncio.timeout, unlike wait_for on 3.11, never swallows a cancel from stop()
+                # that races with a worker setting the wakeup event.
+                with contextlib.suppress(TimeoutError):
+                    async with asyncio.timeout(self.poll_interval_seconds):
+                        await self._wakeup.wait()
+
+    async def _work_loop(self) -> None:
+        failures = 0
+        while True:
+            event = await self._jobs.get()
+            try:
+                await self._handle(event)
+            except Exception:
+                # The row is still pending in the journal, so it is claimed again later.
+                failures += 1
+                self._failing.add("work")
+                await self._backoff("work", failures)
+            else:
+                failures = 0
+                self._failing.discard("work")
+            finally:
+                self._busy.discard(event.ordering_key)
+                self._wakeup.set()
+
+    async def _handle(self, event: QueuedEvent) -> None:
+        try:
+            await process_event(
+                self.repo,
+                parse_event(event.payload),
+                self.broker,
+                self.seen,
+                self.writes,
+            )
+        except Exception as exc:
+            attempts = event.attempts + 1
+            error = repr(exc)[:300]
+            if attempts >= self.max_attempts:
+                await self.queue.mark_dead(event.id, attempts, error)
+                return
+            delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** event.attempts)
+            await self.queue.reschedule(event.id, attempts, time.time() + delay, error)
+            return
+
+        await self.queue.ack(event.id)
+
+
+async def start_webhook_processor(
+    settings: Settings,
+    repo: AsyncRepo | None,
+    broker: EntitlementBroker | None = None,
+    seen: SeenEvents | None = None,
+    writes: OrderWriteBehind | None = None,
+) -> WebhookProcessor | None:
+    if settings.webhook_ingest_mode != "queued" or repo is None:
+        return None
+
+    queue = WebhookQueue(settings.webhook_queue_path)
+    await queue.open()
+    processor = WebhookProcessor(
+        queue,
+        repo,
+        settings.webhook_workers,
+        retry_base_seconds=settings.webhook_retry_base_seconds,
+        max_attempts=settings.webhook_max_attempts,
+        broker=broker,
+        seen=seen,
+        writes=writes,
+    )
+    processor.start()
+    return processor
@@ -0,0 +1,117 @@
+import argparse
+import json
+import timeit
+from collections.abc import Callable
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from app import fast_json
+from app.fast_json import FastJSONResponse
+from app.webhook_events import event_key_for, paid_checkout_fields, parse_event
+
+WEBHOOK_PAYLOAD = {
+    "id": "evt_bench_0001",
+    "eventType": "checkout.completed",
+    "created_at": 1767225600000,
+    "object": {
+        "id": "chk_bench_0001",
+        "request_id": "req_bench_0001",
+        "status": "completed",
+        "metadata": {"source": "bench", "tags": ["a", "b", "c"]},
+        "customer": {"id": "cust_0001", "email": "bench@example.com", "name": "Bench User"},
+        "order": {
+            "id": "ord_bench_0001",
+            "status": "paid",
+            "amount": 1500,
+            "currency": "USD",
+            "items": [{"product": "prod_bench", "quantity": 1, "price": 1500}],
+        },
+    },
+}
+
+PRODUCT_LISTING = [
+    {
+        "id": f"prod_{index:04d}",
+        "name": f"Product {index}",
+        "description": "A product used to size the listing body.",
+        "price_cents": 1500 + index,
+        "currency": "USD",
+        "active": True,
+    }
+    for index in range(50)
+]
+
+
+def _stdlib_webhook(raw: bytes) -> tuple[str, str, dict[str, Any] | None]:
+    payload = json.loads(raw.decode("utf-8"))
+    event_key = event_key_for(payload, raw)
+    obj = payload.get("object") or {}
+    request_id = obj.get("request_id")
+    ordering_key = str(request_id) if request_id else event_key
+    checkout = None
+    if payload.get("eventType") == "checkout.completed" and request_id:
+        paid = paid_checkout_fields(obj)
+        if paid:
+            checkout = {"event_key": event_key, "request_id": str(request_id), **paid}
+    return event_key, ordering_key, checkout
+
+
+def _micros(operation: Callable[[], Any], number: int) -> float:
+    best = min(timeit.repeat(operation, number=number, repeat=5))
+    return round(best / number * 1_000_000, 2)
+
+
+def run(number: int) -> dict[str, dict[str, float]]:
+    raw = json.dumps(WEBHOOK_PAYLOAD).encode("utf-8")
+    cases = {
+        "webhook_parse": (lambda: _stdlib_webhook(raw), lambda: parse_event(raw)),
+        "listing_render": (
+            lambda: JSONResponse(PRODUCT_LISTING).body,
+            lambda: FastJSONResponse(PRODUCT_LISTING).body,
+        ),
+        "entitlement_render": (
+            lambda: JSONResponse({"entitled": True, "product_id": "prod_0001"}).body,
+            lambda: FastJSONResponse({"entitled": True, "product_id": "prod_0001"}).body,
+        ),
+        "cache_roundtrip": (
+            lambda: json.loads(json.dumps(WEBHOOK_PAYLOAD).encode("utf-8")),
+            lambda: fast_json.loads(fast_json.dumps(WEBHOOK_PAYLOAD)),
+        ),
+    }
+    results: dict[str, dict[str, float]] = {}
+    for name, (baseline, fast) in cases.items():
+        baseline_us = _micros(baseline, number)
+        fast_us = _micros(fast, number)
+        results[name] = {
+            "stdlib_us": baseline_us,
+            "fast_us": fast_us,
+            "speedup": round(baseline_us / fast_us, 2) if fast_us else 0.0,
+        }
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m bench.json_bench",
+        description="Time JSON decode/encode on the webhook and response paths.",
+    )
+    parser.add_argument("--number", type=int, default=20000, help="calls per timing run")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = run(args.number)
+    print(f"backend: {fast_json.BACKEND}")
+    for name, row in results.items():
+        print(
+            f"{name:<20} stdlib {row['stdlib_us']:>8} us  "
+            f"fast {row['fast_us']:>8} us  x{row['speedup']}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"backend": fast_json.BACKEND, "results": results}, handle, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,429 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from app.config import Settings
+from app.repo import AsyncRepo, AsyncSupabaseRepo
+from app.sqlite_repo import SqliteRepo
+from app.utils.crypto import hmac_sha256_hex
+from bench.standins import BENCH_PRODUCT_ID, LatencyProfile, bench_products
+
+WEBHOOK_SECRET = "bench_webhook_secret"
+SCENARIOS = ("me", "checkout", "webhook")
+
+RequestFactory = Callable[[int, int], dict[str, Any]]
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    build: RequestFactory
+    setup: Callable[[], Awaitable[None]] | None = None
+
+
+@dataclass
+class EndpointStats:
+    latencies: list[float] = field(default_factory=list)
+    statuses: Counter[str] = field(default_factory=Counter)
+
+    def record(self, seconds: float, status: str) -> None:
+        self.latencies.append(seconds)
+        self.statuses[status] += 1
+
+    def summary(self, elapsed: float) -> dict[str, Any]:
+        latencies = sorted(self.latencies)
+        ok = sum(count for status, count in self.statuses.items() if status.startswith("2"))
+        return {
+            "requests": len(latencies),
+            "errors": len(latencies) - ok,
+            "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": _millis(percentile(latencies, 50)),
+            "p95_ms": _millis(percentile(latencies, 95)),
+            "p99_ms": _millis(percentile(latencies, 99)),
+            "max_ms": _millis(latencies[-1] if latencies else 0.0),
+            "statuses": dict(sorted(self.statuses.items())),
+        }
+
+
+def _millis(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def _bearer(worker: int) -> dict[str, str]:
+    return {"Authorization": f"Bearer bench-user-{worker}"}
+
+
+async def _create_orders(repo: AsyncRepo, count: int) -> list[str]:
+    request_ids = [f"bench-order-{index}-{uuid.uuid4().hex[:8]}" for index in range(count)]
+    for request_id in request_ids:
+        await repo.create_order_pending("bench-user-0", BENCH_PRODUCT_ID, request_id)
+    return request_ids
+
+
+def build_scenarios(
+    supabase_url: str,
+    seeded_orders: int,
+    sqlite_path: str | None = None,
+) -> dict[str, Scenario]:
+    request_ids: list[str] = []
+
+    async def seed_orders() -> None:
+        if sqlite_path is not None:
+            repo = SqliteRepo(sqlite_path)
+            await repo.open()
+            try:
+                request_ids.extend(await _create_orders(repo, seeded_orders))
+            finally:
+                await repo.close()
+            return
+
+        settings = Settings(supabase_url=supabase_url, supabase_service_role_key="bench")
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            supabase = AsyncSupabaseRepo(settings, client)
+            request_ids.extend(await _create_orders(supabase, seeded_orders))
+
+    def me(worker: int, seq: int) -> dict[str, Any]:
+        return {"headers": _bearer(worker)}
+
+    def checkout(worker: int, seq: int) -> dict[str, Any]:
+        return {"headers": _bearer(worker), "json": {"product_id": BENCH_PRODUCT_ID}}
+
+    def webhook(worker: int, seq: int) -> dict[str, Any]:
+        request_id = request_ids[(worker + seq) % len(request_ids)]
+        payload = {
+            "id": f"evt_{worker}_{seq}_{uuid.uuid4().hex[:8]}",
+            "eventType": "checkout.completed",
+            "object": {
+                "id": f"chk_{request_id}",
+                "request_id": request_id,
+                "order": {"id": f"ord_{request_id}", "status": "paid", "amount": 1500},
+            },
+        }
+        raw = json.dumps(payload).encode("utf-8")
+        return {
+            "content": raw,
+            "headers": {
+                "creem-signature": hmac_sha256_hex(WEBHOOK_SECRET, raw),
+                "content-type": "application/json",
+            },
+        }
+
+    return {
+        "me": Scenario("me", "GET", "/api/me", me),
+        "checkout": Scenario("checkout", "POST", "/api/checkout", checkout),
+        "webhook": Scenario("webhook", "POST", "/api/webhooks/creem", webhook, seed_orders),
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    concurrency: int,
+    duration_seconds: float,
+    warmup_seconds: float,
+) -> dict[str, Any]:
+    if scenario.setup is not None:
+        await scenario.setup()
+
+    stats = EndpointStats()
+    loop = asyncio.get_running_loop()
+    warmup_until = loop.time() + warmup_seconds
+    deadline = warmup_until + duration_seconds
+
+    async def worker(index: int) -> None:
+        seq = 0
+        while loop.time() < deadline:
+            request = scenario.build(index, seq)
+            seq += 1
+            started = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, scenario.path, **request)
+                status = str(response.status_code)
+            except httpx.HTTPError as exc:
+                status = type(exc).__name__
+            if loop.time() >= warmup_until:
+                stats.record(time.perf_counter() - started, status)
+
+    await asyncio.sleep(0)
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    return stats.summary(duration_seconds)
+
+
+def compare(
+    current: dict[str, Any],
+    baseline: dict[str, Any],
+    max_regression: float,
+) -> list[str]:
+    regressions: list[str] = []
+    for name, result in current["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if previous is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            before, after = previous[metric], result[metric]
+            if before and after > before * (1 + max_regression):
+                regressions.append(f"{name} {metric}: {before} -> {after}")
+        before, after = previous["throughput_rps"], result["throughput_rps"]
+        if before and after < before * (1 - max_regression):
+            regressions.append(f"{name} throughput_rps: {before} -> {after}")
+    return regressions
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(
+    url: str,
+    process: subprocess.Popen[bytes],
+    timeout: float = 30.0,
+    *,
+    require_ok: bool = False,
+) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args!r} exited with {process.returncode}")
+        try:
+            response = httpx.get(url, timeout=1.0)
+            if not require_ok or response.is_success:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"timed out waiting for {url}")
+
+
+async def _seed_sqlite_products(path: str) -> None:
+    repo = SqliteRepo(path)
+    await repo.open()
+    try:
+        await repo.upsert_products(bench_products())
+    finally:
+        await repo.close()
+
+
+@contextmanager
+def launch(args: argparse.Namespace) -> Iterator[tuple[str, str, str | None]]:
+    supabase_port, creem_port, app_port = _free_port(), _free_port(), _free_port()
+    supabase_url = f"http://127.0.0.1:{supabase_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+
+    standins_cmd = [
+        sys.executable,
+        "-m",
+        "bench.standins",
+        f"--supabase-port={supabase_port}",
+        f"--creem-port={creem_port}",
+        f"--rest-latency={args.rest_latency}",
+        f"--rest-error-rate={args.rest_error_rate}",
+        f"--auth-latency={args.auth_latency}",
+        f"--auth-error-rate={args.auth_error_rate}",
+        f"--creem-latency={args.creem_latency}",
+        f"--creem-error-rate={args.creem_error_rate}",
+    ]
+    env = {
+        **os.environ,
+        "SUPABASE_URL": supabase_url,
+        "SUPABASE_ANON_KEY": "bench",
+        "SUPABASE_SERVICE_ROLE_KEY": "bench",
+        "CREEM_API_KEY": "bench",
+        "CREEM_API_BASE": f"http://127.0.0.1:{creem_port}",
+        "CREEM_WEBHOOK_SECRET": WEBHOOK_SECRET,
+    }
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    if env.get("CACHE_BACKEND") == "redis" and "CACHE_REDIS_URL" not in env:
+        redis_port = _free_port()
+        standins_cmd.append(f"--redis-port={redis_port}")
+        env["CACHE_REDIS_URL"] = f"redis://127.0.0.1:{redis_port}/0"
+
+    sqlite_path = None
+    if env.get("REPO_BACKEND") == "sqlite":
+        # Each run starts from a fresh database unless SQLITE_REPO_PATH is given.
+        sqlite_path = env.setdefault(
+            "SQLITE_REPO_PATH",
+            str(Path(tempfile.mkdtemp(prefix="bench-")) / "repo.sqlite3"),
+        )
+        asyncio.run(_seed_sqlite_products(sqlite_path))
+    app_cmd = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "app.main:app",
+        "--host=127.0.0.1",
+        f"--port={app_port}",
+        f"--workers={args.app_workers}",
+        "--log-level=warning",
+        "--no-access-log",
+    ]
+
+    processes: list[subprocess.Popen[bytes]] = []
+    try:
+        processes.append(subprocess.Popen(standins_cmd))
+        _wait_until_up(f"{supabase_url}/auth/v1/user", processes[-1])
+        processes.append(subprocess.Popen(app_cmd, env=env))
+        _wait_until_up(f"{app_url}/api/ready", processes[-1], require_ok=True)
+        yield app_url, supabase_url, sqlite_path
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+async def run(
+    args: argparse.Namespace,
+    app_url: str,
+    supabase_url: str,
+    sqlite_path: str | None,
+) -> dict[str, Any]:
+    scenarios = build_scenarios(supabase_url, args.seeded_orders, sqlite_path)
+    limits = httpx.Limits(
+        max_connections=args.concurrency,
+        max_keepalive_connections=args.concurrency,
+    )
+    endpoints: dict[str, Any] = {}
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=30.0) as client:
+        for name in args.scenarios:
+            endpoints[name] = await run_scenario(
+                client,
+                scenarios[name],
+                args.concurrency,
+                args.duration,
+                args.warmup,
+            )
+    return endpoints
+
+
+def _git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m bench",
+        description="Drive the API over HTTP against latency-injecting stand-ins.",
+    )
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds discarded first")
+    parser.add_argument("--seeded-orders", type=int, default=200)
+    parser.add_argument("--rest-latency", default="lognormal:8,40")
+    parser.add_argument("--rest-error-rate", type=float, default=0.0)
+    parser.add_argument("--auth-latency", default="lognormal:15,80")
+    parser.add_argument("--auth-error-rate", type=float, default=0.0)
+    parser.add_argument("--creem-latency", default="lognormal:120,600")
+    parser.add_argument("--creem-error-rate", type=float, default=0.0)
+    parser.add_argument("--app-workers", type=int, default=1)
+    parser.add_argument(
+        "--app-env",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="extra environment for the API process, e.g. WEBHOOK_INGEST_MODE=queued",
+    )
+    parser.add_argument("--output", help="defaults to bench-results/<timestamp>.json")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    args.scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = sorted(set(args.scenarios) - set(SCENARIOS))
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    for spec in (args.rest_latency, args.auth_latency, args.creem_latency):
+        try:
+            LatencyProfile.parse(spec)
+        except ValueError as exc:
+            parser.error(str(exc))
+    return args
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(argv)
+    started_at = datetime.now(UTC)
+    with launch(args) as (app_url, supabase_url, sqlite_path):
+        endpoints = asyncio.run(run(args, app_url, supabase_url, sqlite_path))
+
+    result = {
+        "started_at": started_at.isoformat(),
+        "commit": _git_commit(),
+        "config": {
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "warmup_seconds": args.warmup,
+            "app_workers": args.app_workers,
+            "app_env": args.app_env,
+            "rest_latency": args.rest_latency,
+            "rest_error_rate": args.rest_error_rate,
+            "auth_latency": args.auth_latency,
+            "auth_error_rate": args.auth_error_rate,
+            "creem_latency": args.creem_latency,
+            "creem_error_rate": args.creem_error_rate,
+        },
+        "endpoints": endpoints,
+    }
+
+    output = Path(args.output or f"bench-results/{started_at:%Y%m%dT%H%M%SZ}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+
+    for name, summary in endpoints.items():
+        print(
+            f"{name:<10} {summary['throughput_rps']:>9} rps  "
+            f"p50 {summary['p50_ms']:>8} ms  p95 {summary['p95_ms']:>8} ms  "
+            f"p99 {summary['p99_ms']:>8} ms  errors {summary['errors']}"
+        )
+    print(f"results written to {output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(result, baseline, args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
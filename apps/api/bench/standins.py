@@ -0,0 +1,409 @@
+import argparse
+import asyncio
+import math
+import random
+import uuid
+from dataclasses import dataclass
+from typing import Any
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.cache import MemoryCache
+from app.repo import FakeRepo
+
+BENCH_PRODUCT_ID = "00000000-0000-4000-8000-000000000001"
+
+
+@dataclass(frozen=True)
+class LatencyProfile:
+    distribution: str = "fixed"
+    params: tuple[float, ...] = (0.0,)
+    error_rate: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str, error_rate: float = 0.0) -> "LatencyProfile":
+        distribution, _, raw = spec.partition(":")
+        params = tuple(float(value) for value in raw.split(",") if value)
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}.get(distribution)
+        if expected is None or len(params) != expected:
+            raise ValueError(
+                f"invalid latency spec {spec!r}, use fixed:MS, uniform:MIN_MS,MAX_MS "
+                "or lognormal:P50_MS,P99_MS"
+            )
+        if not 0.0 <= error_rate <= 1.0:
+            raise ValueError("error rate must be between 0 and 1")
+        return cls(distribution, params, error_rate)
+
+    def sample_seconds(self) -> float:
+        if self.distribution == "uniform":
+            millis = random.uniform(*self.params)
+        elif self.distribution == "lognormal":
+            median, p99 = self.params
+            # 2.326 is the z-score of the 99th percentile.
+            sigma = math.log(p99 / median) / 2.326 if p99 > median > 0 else 0.0
+            millis = median * math.exp(random.gauss(0.0, sigma))
+        else:
+            millis = self.params[0]
+        return max(millis, 0.0) / 1000
+
+    def spec(self) -> str:
+        params = ",".join(f"{value:g}" for value in self.params)
+        return f"{self.distribution}:{params}"
+
+
+class InjectLatency:
+    def __init__(self, app: ASGIApp, profile: LatencyProfile) -> None:
+        self.app = app
+        self.profile = profile
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            await asyncio.sleep(self.profile.sample_seconds())
+            if random.random() < self.profile.error_rate:
+                response = JSONResponse({"message": "injected failure"}, status_code=503)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+def _eq(request: Request, name: str) -> str | None:
+    value = request.query_params.get(name)
+    if value is None or not value.startswith("eq."):
+        return None
+    return value[3:]
+
+
+def bench_products() -> list[dict[str, Any]]:
+    return [
+        {
+            "id": BENCH_PRODUCT_ID,
+            "name": "Bench Pack",
+            "price_cents": 1500,
+            "currency": "USD",
+            "creem_product_id": "creem_prod_bench",
+            "active": True,
+        }
+    ]
+
+
+def build_postgrest_app(repo: FakeRepo) -> Starlette:
+    async def products(request: Request) -> Response:
+        product_id = _eq(request, "id")
+        if product_id is None:
+            return JSONResponse(await repo.list_active_products())
+        product = await repo.get_product(product_id)
+        return JSONResponse([product] if product else [])
+
+    async def orders(request: Request) -> Response:
+        request_id = _eq(request, "request_id")
+        if request.method == "GET":
+            order = await repo.get_order_by_request_id(request_id or "")
+            return JSONResponse([order] if order else [])
+
+        payload = await request.json()
+        if request.method == "POST":
+            order = await repo.create_order_pending(
+                user_id=payload["user_id"],
+                product_id=payload["product_id"],
+                request_id=payload["request_id"],
+            )
+            return JSONResponse([order], status_code=201)
+
+        if request_id is None:
+            return JSONResponse({"message": "request_id filter required"}, status_code=400)
+        if payload.get("status") == "failed":
+            await repo.update_order_failed(request_id)
+        elif payload.get("status") == "paid":
+            await repo.mark_order_paid(
+                request_id,
+                payload.get("creem_checkout_id"),
+                payload.get("creem_order_id"),
+                payload.get("amount_cents"),
+                payload.get("currency"),
+            )
+        else:
+            await repo.update_order_checkout_ids(request_id, payload.get("creem_checkout_id"))
+        return Response(status_code=204)
+
+    async def entitlements(request: Request) -> Response:
+        if request.method == "GET":
+            return JSONResponse(await repo.list_entitlements(_eq(request, "user_id") or ""))
+        payload = await request.json()
+        for row in payload if isinstance(payload, list) else [payload]:
+            await repo.grant_entitlement(row["user_id"], row["product_id"])
+        return Response(status_code=201)
+
+    async def webhook_events(request: Request) -> Response:
+        payload = await request.json()
+        if isinstance(payload, list):
+            inserted = await repo.webhook_event_insert_many([row["event_key"] for row in payload])
+            return JSONResponse([{"event_key": key} for key in inserted], status_code=201)
+        event_key = payload["event_key"]
+        inserted_one = await repo.webhook_event_insert(event_key)
+        return JSONResponse([{"id": event_key}] if inserted_one else [], status_code=201)
+
+    async def process_checkout_completed(request: Request) -> Response:
+        payload = await request.json()
+        result = await repo.process_checkout_completed(
+            event_key=payload["p_event_key"],
+            request_id=payload["p_request_id"],
+            creem_checkout_id=payload.get("p_creem_checkout_id"),
+            creem_order_id=payload.get("p_creem_order_id"),
+            amount_cents=payload.get("p_amount_cents"),
+            currency=payload.get("p_currency"),
+        )
+        return JSONResponse([result])
+
+    async def process_checkout_completed_batch(request: Request) -> Response:
+        events = (await request.json())["p_events"]
+        results = await repo.process_checkout_completed_batch(events)
+        return JSONResponse(
+            [{"ordinal": index, **result} for index, result in enumerate(results, start=1)]
+        )
+
+    async def apply_order_updates(request: Request) -> Response:
+        await repo.apply_order_updates((await request.json())["p_updates"])
+        return Response(status_code=204)
+
+    return Starlette(
+        routes=[
+            Route("/products", products, methods=["GET"]),
+            Route("/orders", orders, methods=["GET", "POST", "PATCH"]),
+            Route("/entitlements", entitlements, methods=["GET", "POST"]),
+            Route("/webhook_events", webhook_events, methods=["POST"]),
+            Route(
+                "/rpc/process_checkout_completed",
+                process_checkout_completed,
+                methods=["POST"],
+            ),
+            Route(
+                "/rpc/process_checkout_completed_batch",
+                process_checkout_completed_batch,
+                methods=["POST"],
+            ),
+            Route("/rpc/apply_order_updates", apply_order_updates, methods=["POST"]),
+        ]
+    )
+
+
+def build_auth_app() -> Starlette:
+    # Any "bench-<name>" token is a valid session for user "<name>".
+    async def user(request: Request) -> Response:
+        token = request.headers.get("authorization", "").removeprefix("Bearer ")
+        if not token.startswith("bench-"):
+            return JSONResponse({"message": "invalid token"}, status_code=401)
+        name = token.removeprefix("bench-")
+        return JSONResponse({"id": name, "email": f"{name}@bench.test"})
+
+    async def health(request: Request) -> Response:
+        return JSONResponse({"name": "GoTrue"})
+
+    return Starlette(
+        routes=[
+            Route("/user", user, methods=["GET"]),
+            Route("/health", health, methods=["GET"]),
+        ]
+    )
+
+
+def build_supabase_app(
+    repo: FakeRepo,
+    rest_latency: LatencyProfile,
+    auth_latency: LatencyProfile,
+) -> Starlette:
+    return Starlette(
+        routes=[
+            Mount("/rest/v1", app=InjectLatency(build_postgrest_app(repo), rest_latency)),
+            Mount("/auth/v1", app=InjectLatency(build_auth_app(), auth_latency)),
+        ]
+    )
+
+
+def build_creem_app(latency: LatencyProfile) -> ASGIApp:
+    checkouts: dict[str, dict[str, Any]] = {}
+
+    async def create_checkout(request: Request) -> Response:
+        payload = await request.json()
+        checkout_id = f"chk_{uuid.uuid4().hex}"
+        checkouts[checkout_id] = {
+            "id": checkout_id,
+            "request_id": payload.get("request_id"),
+            "status": "pending",
+        }
+        return JSONResponse(
+            {"id": checkout_id, "checkout_url": f"https://checkout.bench.test/{checkout_id}"}
+        )
+
+    async def get_checkout(request: Request) -> Response:
+        checkout = checkouts.get(request.query_params.get("checkout_id", ""))
+        if checkout is None:
+            return JSONResponse({"message": "not found"}, status_code=404)
+        return JSONResponse(checkout)
+
+    async def checkouts_endpoint(request: Request) -> Response:
+        if request.method == "POST":
+            return await create_checkout(request)
+        return await get_checkout(request)
+
+    app = Starlette(routes=[Route("/v1/checkouts", checkouts_endpoint, methods=["GET", "POST"])])
+    return InjectLatency(app, latency)
+
+
+class RedisError(Exception):
+    pass
+
+
+async def read_resp(reader: asyncio.StreamReader) -> Any:
+    line = await reader.readuntil(b"\r\n")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode("utf-8")
+    if kind == b"-":
+        return RedisError(body.decode("utf-8"))
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        length = int(body)
+        if length < 0:
+            return None
+        return [await read_resp(reader) for _ in range(length)]
+    raise RedisError(f"unexpected reply {line!r}")
+
+
+def _encode_reply(reply: Any) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, RedisError):
+        return f"-{reply}\r\n".encode()
+    if isinstance(reply, int):
+        return f":{reply}\r\n".encode()
+    if isinstance(reply, str):
+        return f"+{reply}\r\n".encode()
+    if isinstance(reply, list):
+        return f"*{len(reply)}\r\n".encode() + b"".join(_encode_reply(item) for item in reply)
+    return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+
+class RedisStandin:
+    # Enough of the Redis protocol for app.cache.RedisCache (redis-py), backed by a MemoryCache.
+    def __init__(self, max_entries: int = 100_000, latency: LatencyProfile | None = None) -> None:
+        self.cache = MemoryCache(max_entries)
+        self.latency = latency or LatencyProfile()
+        self.commands: list[str] = []
+
+    async def _apply(self, args: list[bytes]) -> Any:
+        name = args[0].decode().upper()
+        self.commands.append(name)
+        keys = [arg.decode() for arg in args[1:]]
+        if name in ("PING", "AUTH", "SELECT", "FLUSHALL"):
+            if name == "FLUSHALL":
+                await self.cache.close()
+            return "PONG" if name == "PING" else "OK"
+        if name == "GET":
+            return await self.cache.get(keys[0])
+        if name == "MGET":
+            return await self.cache.get_many(keys)
+        if name == "DEL":
+            existed = await self.cache.get(keys[0]) is not None
+            await self.cache.delete(keys[0])
+            return int(existed)
+        if name == "SET":
+            options = [arg.decode().upper() for arg in args[3:]]
+            ttl = float(options[options.index("PX") + 1]) / 1000 if "PX" in options else None
+            if "NX" in options:
+                return "OK" if await self.cache.add(keys[0], args[2], ttl) else None
+            await self.cache.set(keys[0], args[2], ttl)
+            return "OK"
+        return RedisError(f"ERR unknown command '{name}'")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                args = await read_resp(reader)
+                await asyncio.sleep(self.latency.sample_seconds())
+                writer.write(_encode_reply(await self._apply(args)))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.Server:
+        return await asyncio.start_server(self._handle, host, port)
+
+
+async def serve(
+    supabase_port: int,
+    creem_port: int,
+    rest_latency: LatencyProfile,
+    auth_latency: LatencyProfile,
+    creem_latency: LatencyProfile,
+    redis_port: int = 0,
+) -> None:
+    if redis_port:
+        await RedisStandin().start(port=redis_port)
+    repo = FakeRepo(products=bench_products())
+    servers = [
+        uvicorn.Server(
+            uvicorn.Config(
+                build_supabase_app(repo, rest_latency, auth_latency),
+                host="127.0.0.1",
+                port=supabase_port,
+                log_level="warning",
+                access_log=False,
+            )
+        ),
+        uvicorn.Server(
+            uvicorn.Config(
+                build_creem_app(creem_latency),
+                host="127.0.0.1",
+                port=creem_port,
+                log_level="warning",
+                access_log=False,
+            )
+        ),
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m bench.standins",
+        description="Serve latency-injecting Supabase and Creem stand-ins.",
+    )
+    parser.add_argument("--supabase-port", type=int, required=True)
+    parser.add_argument("--creem-port", type=int, required=True)
+    parser.add_argument("--rest-latency", default="fixed:0")
+    parser.add_argument("--rest-error-rate", type=float, default=0.0)
+    parser.add_argument("--auth-latency", default="fixed:0")
+    parser.add_argument("--auth-error-rate", type=float, default=0.0)
+    parser.add_argument("--creem-latency", default="fixed:0")
+    parser.add_argument("--creem-error-rate", type=float, default=0.0)
+    parser.add_argument("--redis-port", type=int, default=0, help="also serve a Redis stand-in")
+    args = parser.parse_args(argv)
+
+    asyncio.run(
+        serve(
+            args.supabase_port,
+            args.creem_port,
+            LatencyProfile.parse(args.rest_latency, args.rest_error_rate),
+            LatencyProfile.parse(args.auth_latency, args.auth_error_rate),
+            LatencyProfile.parse(args.creem_latency, args.creem_error_rate),
+            args.redis_port,
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
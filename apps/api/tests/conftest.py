@@ -48,8 +48,12 @@ def client(fake_repo: FakeRepo, monkeypatch: pytest.MonkeyPatch) -> TestClient:
     app.dependency_overrides[get_repo] = lambda: fake_repo
     app.dependency_overrides[get_creem_client] = lambda: FakeCreemClient()
 
-    async def fake_fetch_user(token: str, settings: object) -> dict[str, str]:
-        _ = settings
+    async def fake_fetch_user(
+        token: str,
+        settings: object,
+        client: object = None,
+    ) -> dict[str, str]:
+        _ = (settings, client)
         if token == "good-token":
             return {"id": "user_test", "email": "user@example.com"}
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
@@ -0,0 +1,174 @@
+import asyncio
+import json
+from datetime import UTC, datetime, timedelta
+
+from app.cache import MemoryCache
+from app.config import Settings, get_settings
+from app.main import app
+from app.reports import RevenueReport
+
+ADMIN = {"X-Admin-Token": "admin-secret"}
+
+
+def _admin_settings(**overrides) -> None:
+    settings = Settings(admin_api_token="admin-secret", **overrides)
+    app.dependency_overrides[get_settings] = lambda: settings
+
+
+def _seed(fake_repo, count: int) -> list[dict]:
+    product_id = next(iter(fake_repo.products.keys()))
+    orders = []
+    for index in range(count):
+        order = fake_repo.orders_by_request.setdefault(
+            f"req_{index}",
+            {
+                "id": f"00000000-0000-0000-0000-{index:012d}",
+                "user_id": "user_test",
+                "product_id": product_id,
+                "status": "paid" if index % 2 == 0 else "pending",
+                "request_id": f"req_{index}",
+                "creem_checkout_id": None,
+                "creem_order_id": None,
+                "amount_cents": 1500,
+                "currency": "USD",
+                "created_at": f"2026-10-{1 + index // 3:02d}T12:00:00+00:00",
+            },
+        )
+        orders.append(order)
+    return orders
+
+
+def test_admin_endpoints_require_the_admin_token(client):
+    _admin_settings()
+
+    assert client.get("/api/admin/orders/export").status_code == 403
+    assert client.get("/api/admin/revenue", headers={"X-Admin-Token": "no"}).status_code == 403
+
+
+def test_order_export_streams_ndjson_across_pages(client, fake_repo):
+    _admin_settings(admin_export_page_size=2)
+    orders = _seed(fake_repo, 5)
+    pages: list[tuple | None] = []
+    list_page = fake_repo.list_orders_page
+
+    async def tracked(statuses, after, limit, created_before=None):
+        pages.append(after)
+        return await list_page(statuses, after, limit, created_before=created_before)
+
+    fake_repo.list_orders_page = tracked
+
+    response = client.get("/api/admin/orders/export", headers=ADMIN)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["request_id"] for row in rows] == [order["request_id"] for order in orders]
+    assert rows[0]["updated_at"] is None
+    assert len(pages) == 3
+    assert pages[1] == (orders[1]["created_at"], orders[1]["id"])
+
+
+def test_order_export_writes_filtered_csv(client, fake_repo):
+    _admin_settings()
+    _seed(fake_repo, 9)
+
+    response = client.get(
+        "/api/admin/orders/export",
+        headers=ADMIN,
+        params={
+            "format": "csv",
+            "status": "paid",
+            "created_from": "2026-10-02",
+            "created_before": "2026-10-03",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/csv; charset=utf-8"
+    header, *lines = response.text.splitlines()
+    assert header.startswith("id,request_id,user_id,product_id,status,amount_cents")
+    assert [line.split(",")[1] for line in lines] == ["req_4"]
+    assert ",," in lines[0]
+
+
+def test_revenue_report_aggregates_paid_orders_and_caches_days(client, fake_repo):
+    _admin_settings()
+    product_id = next(iter(fake_repo.products.keys()))
+    _seed(fake_repo, 6)
+    calls: list[tuple[str, str]] = []
+    revenue_by_day = fake_repo.revenue_by_day
+
+    async def tracked(created_from: str, created_before: str) -> list[dict]:
+        calls.append((created_from, created_before))
+        return await revenue_by_day(created_from, created_before)
+
+    fake_repo.revenue_by_day = tracked
+    params = {"from": "2026-10-01", "to": "2026-10-03"}
+
+    first = client.get("/api/admin/revenue", headers=ADMIN, params=params)
+    second = client.get("/api/admin/revenue", headers=ADMIN, params=params)
+
+    assert first.status_code == 200
+    assert first.json() == second.json()
+    body = first.json()
+    assert body["days"] == [
+        {
+            "day": "2026-10-01",
+            "product_id": product_id,
+            "currency": "USD",
+            "orders": 2,
+            "amount_cents": 3000,
+        },
+        {
+            "day": "2026-10-02",
+            "product_id": product_id,
+            "currency": "USD",
+            "orders": 1,
+            "amount_cents": 1500,
+        },
+    ]
+    assert body["totals"] == [
+        {"product_id": product_id, "currency": "USD", "orders": 3, "amount_cents": 4500}
+    ]
+    assert calls == [("2026-10-01T00:00:00+00:00", "2026-10-04T00:00:00+00:00")]
+
+
+def test_revenue_report_recomputes_recent_days_after_a_late_payment(fake_repo):
+    today = datetime.now(UTC).date()
+    yesterday, last_week = today - timedelta(days=1), today - timedelta(days=7)
+    orders = _seed(fake_repo, 2)
+    orders[0]["created_at"] = f"{last_week.isoformat()}T12:00:00+00:00"
+    orders[1]["created_at"] = f"{yesterday.isoformat()}T23:59:00+00:00"
+    report = RevenueReport(
+        MemoryCache(100),
+        closed_ttl_seconds=86400,
+        open_ttl_seconds=0.05,
+        open_days=1,
+    )
+
+    async def run() -> tuple[list[dict], list[dict]]:
+        before = await report.daily(fake_repo, last_week, yesterday)
+        # Created yesterday, paid today: yesterday's total changes.
+        await fake_repo.mark_order_paid("req_1", "chk_1", "ord_1", 1500, "USD")
+        orders[0]["amount_cents"] = 9999
+        await asyncio.sleep(0.1)
+        return before, await report.daily(fake_repo, last_week, yesterday)
+
+    before, after = asyncio.run(run())
+
+    assert [row["day"] for row in before] == [last_week.isoformat()]
+    assert [(row["day"], row["amount_cents"]) for row in after] == [
+        (last_week.isoformat(), 1500),
+        (yesterday.isoformat(), 1500),
+    ]
+
+
+def test_revenue_report_rejects_bad_ranges(client):
+    _admin_settings()
+    today = datetime.now(UTC).date()
+
+    inverted = {"from": today.isoformat(), "to": (today - timedelta(days=1)).isoformat()}
+    too_long = {"from": (today - timedelta(days=400)).isoformat(), "to": today.isoformat()}
+
+    assert client.get("/api/admin/revenue", headers=ADMIN, params=inverted).status_code == 400
+    assert client.get("/api/admin/revenue", headers=ADMIN, params=too_long).status_code == 400
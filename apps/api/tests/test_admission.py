@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import pytest
+
+from app.admission import (
+    ConcurrencyLimiter,
+    OverloadedError,
+    TokenBucket,
+    build_route_limiters,
+    retry_after_header,
+)
+from app.config import Settings
+
+
+def test_token_bucket_allows_burst_then_refills():
+    bucket = TokenBucket(rate_per_second=50, burst=2)
+
+    assert bucket.acquire("user_a") == 0
+    assert bucket.acquire("user_a") == 0
+    wait = bucket.acquire("user_a")
+    assert 0 < wait <= 0.02
+    assert bucket.acquire("user_b") == 0
+
+    time.sleep(wait + 0.01)
+    assert bucket.acquire("user_a") == 0
+
+
+def test_token_bucket_forgets_least_recent_users():
+    bucket = TokenBucket(rate_per_second=1, burst=1, max_keys=2)
+    for user in ("user_a", "user_b", "user_c"):
+        bucket.acquire(user)
+
+    assert len(bucket) == 2
+    assert bucket.acquire("user_a") == 0
+    assert bucket.acquire("user_c") > 0
+
+
+def test_concurrency_limiter_queues_in_order_and_sheds_overflow():
+    async def run() -> list[str]:
+        limiter = ConcurrencyLimiter(max_in_flight=1, max_queued=1, queue_timeout_seconds=1.0)
+        order: list[str] = []
+
+        async def work(name: str, seconds: float) -> None:
+            await limiter.acquire()
+            try:
+                order.append(name)
+                await asyncio.sleep(seconds)
+            finally:
+                limiter.release()
+
+        first = asyncio.create_task(work("first", 0.02))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(work("second", 0))
+        await asyncio.sleep(0)
+        assert (limiter.in_flight, limiter.queued) == (1, 1)
+
+        with pytest.raises(OverloadedError):
+            await limiter.acquire()
+
+        await asyncio.gather(first, second)
+        assert (limiter.in_flight, limiter.queued) == (0, 0)
+        return order
+
+    assert asyncio.run(run()) == ["first", "second"]
+
+
+def test_concurrency_limiter_times_out_queued_requests():
+    async def run() -> None:
+        limiter = ConcurrencyLimiter(max_in_flight=1, max_queued=5, queue_timeout_seconds=0.01)
+        await limiter.acquire()
+        with pytest.raises(OverloadedError) as exc_info:
+            await limiter.acquire()
+        assert exc_info.value.retry_after == 0.01
+        assert limiter.queued == 0
+        limiter.release()
+        assert limiter.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_route_limiters_are_built_only_when_configured():
+    assert build_route_limiters(Settings()) == {}
+
+    limiters = build_route_limiters(
+        Settings(checkout_rate_limit_per_minute=30, checkout_max_in_flight=8)
+    )
+
+    checkout = limiters["checkout"]
+    assert checkout.bucket is not None and checkout.bucket.rate_per_second == 0.5
+    assert checkout.concurrency is not None and checkout.concurrency.max_in_flight == 8
+    assert retry_after_header(0.2) == "1"
+    assert retry_after_header(2.5) == "3"
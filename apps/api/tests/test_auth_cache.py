@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import httpx
+import jwt
+import pytest
+from fastapi import HTTPException, status
+
+from app.auth_cache import TokenCache, TokenRejectedError
+from app.config import Settings
+from app.deps_auth import supabase_fetch_user
+
+
+def _token_with_exp(exp: float) -> str:
+    secret = "token-cache-test-secret-00000001"
+    return jwt.encode({"sub": "u", "exp": int(exp)}, secret, algorithm="HS256")
+
+
+def test_concurrent_lookups_share_one_load():
+    cache = TokenCache(max_entries=10, ttl_seconds=60, negative_ttl_seconds=5)
+    calls = 0
+
+    async def loader() -> dict[str, str]:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"id": "user_test", "email": ""}
+
+    async def run() -> list[dict]:
+        users = await asyncio.gather(*(cache.get_or_load("tok", loader) for _ in range(20)))
+        users.append(await cache.get_or_load("tok", loader))
+        return users
+
+    users = asyncio.run(run())
+
+    assert calls == 1
+    assert all(user["id"] == "user_test" for user in users)
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["coalesced"] == 19
+    assert cache.stats()["hits"] == 1
+
+
+def test_rejections_are_cached_briefly_but_transport_errors_are_not():
+    cache = TokenCache(max_entries=10, ttl_seconds=60, negative_ttl_seconds=5)
+    calls = 0
+
+    async def reject() -> dict[str, str]:
+        nonlocal calls
+        calls += 1
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Unauthorized",
+        ) from TokenRejectedError("bad token")
+
+    async def unreachable() -> dict[str, str]:
+        nonlocal calls
+        calls += 1
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Unauthorized",
+        ) from httpx.ConnectError("down")
+
+    async def run(token: str, loader) -> None:
+        for _ in range(3):
+            with pytest.raises(HTTPException):
+                await cache.get_or_load(token, loader)
+
+    asyncio.run(run("bad", reject))
+    assert calls == 1
+    assert cache.stats()["negative_hits"] == 2
+
+    calls = 0
+    asyncio.run(run("flaky", unreachable))
+    assert calls == 3
+
+
+@pytest.mark.parametrize(
+    ("upstream_status", "expected_status", "expected_calls"),
+    [(401, 401, 1), (403, 401, 1), (500, 503, 3), (429, 503, 3)],
+)
+def test_only_definitive_upstream_rejections_are_cached(
+    upstream_status,
+    expected_status,
+    expected_calls,
+):
+    cache = TokenCache(max_entries=10, ttl_seconds=60, negative_ttl_seconds=5)
+    settings = Settings(supabase_url="https://db.test", supabase_anon_key="anon")
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(upstream_status, json={"message": "nope"})
+
+    async def run() -> list[int]:
+        codes = []
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            for _ in range(3):
+                with pytest.raises(HTTPException) as exc_info:
+                    await cache.get_or_load(
+                        "tok",
+                        lambda: supabase_fetch_user("tok", settings, client),
+                    )
+                codes.append(exc_info.value.status_code)
+        return codes
+
+    assert asyncio.run(run()) == [expected_status] * 3
+    assert calls == expected_calls
+
+
+def test_ttl_is_capped_at_token_expiry_and_size_is_bounded():
+    cache = TokenCache(max_entries=2, ttl_seconds=60, negative_ttl_seconds=5)
+
+    async def loader() -> dict[str, str]:
+        return {"id": "user_test"}
+
+    async def run() -> None:
+        await cache.get_or_load(_token_with_exp(time.time() - 1), loader)
+        for token in ("a", "b", "c"):
+            await cache.get_or_load(token, loader)
+
+    asyncio.run(run())
+
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 1
+    assert stats["misses"] == 4
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import time
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from fastapi import HTTPException
+
+from app import deps_auth
+from app.auth_local import LocalTokenVerifier
+from app.config import Settings, get_settings
+from app.deps_auth import verify_access_token
+from app.main import app
+
+ISSUER = "https://db.test/auth/v1"
+JWT_SECRET = "local-verification-test-secret-0001"
+
+
+def _claims(**overrides: object) -> dict[str, object]:
+    claims: dict[str, object] = {
+        "sub": "user_local",
+        "email": "local@example.com",
+        "aud": "authenticated",
+        "iss": ISSUER,
+        "exp": int(time.time()) + 300,
+    }
+    claims.update(overrides)
+    return claims
+
+
+def _hs256_token(secret: str, **overrides: object) -> str:
+    return jwt.encode(_claims(**overrides), secret, algorithm="HS256")
+
+
+def _settings(**overrides: object) -> Settings:
+    values: dict[str, object] = {
+        "supabase_url": "https://db.test",
+        "supabase_auth_mode": "local",
+        "supabase_jwt_secret": JWT_SECRET,
+    }
+    values.update(overrides)
+    return Settings(**values)
+
+
+@pytest.fixture
+def local_client(client):
+    app.state.token_verifier = LocalTokenVerifier(_settings(), app.state.http_client)
+    return client
+
+
+def test_me_verifies_hs256_token_locally(local_client):
+    token = _hs256_token(JWT_SECRET)
+    response = local_client.get("/api/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json() == {"id": "user_local", "email": "local@example.com"}
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        _hs256_token("wrong-" + JWT_SECRET),
+        _hs256_token(JWT_SECRET, exp=int(time.time()) - 3600),
+        _hs256_token(JWT_SECRET, aud="anon"),
+        _hs256_token(JWT_SECRET, iss="https://other.test/auth/v1"),
+        "not-a-jwt",
+    ],
+)
+def test_me_rejects_invalid_local_tokens(local_client, token):
+    response = local_client.get("/api/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+
+
+@pytest.mark.parametrize("checkout_remote", [True, False])
+def test_checkout_rechecks_locally_valid_tokens_with_supabase(
+    local_client, fake_repo, monkeypatch, checkout_remote
+):
+    settings = _settings(supabase_auth_checkout_remote=checkout_remote)
+    app.dependency_overrides[get_settings] = lambda: settings
+    lookups: list[str] = []
+
+    async def revoked(token: str, settings: object, client: object = None) -> dict[str, str]:
+        lookups.append(token)
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    monkeypatch.setattr(deps_auth, "supabase_fetch_user", revoked)
+    headers = {"Authorization": f"Bearer {_hs256_token(JWT_SECRET)}"}
+    body = {"product_id": next(iter(fake_repo.products))}
+
+    assert local_client.get("/api/me", headers=headers).status_code == 200
+    statuses = [local_client.post("/api/checkout", headers=headers, json=body).status_code]
+    statuses.append(local_client.post("/api/checkout", headers=headers, json=body).status_code)
+
+    if checkout_remote:
+        # Rejected every time: the answer is neither verified locally nor cached.
+        assert statuses == [401, 401]
+        assert len(lookups) == 2
+    else:
+        assert statuses == [200, 200]
+        assert lookups == []
+
+
+def _ec_key() -> ec.EllipticCurvePrivateKey:
+    return ec.generate_private_key(ec.SECP256R1())
+
+
+def _rsa_key() -> rsa.RSAPrivateKey:
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.mark.parametrize(("alg", "new_key"), [("ES256", _ec_key), ("RS256", _rsa_key)])
+def test_asymmetric_token_verified_against_cached_jwks(alg, new_key):
+    private_key = new_key()
+    public_jwk = json.loads(jwt.get_algorithm_by_name(alg).to_jwk(private_key.public_key()))
+    jwks = {"keys": [{**public_jwk, "kid": "key-1"}]}
+    fetches: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        fetches.append(str(request.url))
+        return httpx.Response(200, json=jwks)
+
+    async def run() -> list[dict]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            verifier = LocalTokenVerifier(_settings(supabase_jwt_secret=""), http)
+            token = jwt.encode(_claims(), private_key, algorithm=alg, headers={"kid": "key-1"})
+            forged = jwt.encode(_claims(), new_key(), algorithm=alg, headers={"kid": "key-1"})
+            users = [await verifier.verify(token), await verifier.verify(token)]
+            with pytest.raises(jwt.InvalidSignatureError):
+                await verifier.verify(forged)
+            return users
+
+    users = asyncio.run(run())
+
+    assert users == [{"id": "user_local", "email": "local@example.com"}] * 2
+    assert fetches == ["https://db.test/auth/v1/.well-known/jwks.json"]
+
+
+def test_missing_key_material_falls_back_to_remote(monkeypatch):
+    from app import deps_auth
+
+    async def fake_fetch_user(
+        token: str,
+        settings: object,
+        client: object = None,
+    ) -> dict[str, str]:
+        return {"id": "remote_user", "email": ""}
+
+    monkeypatch.setattr(deps_auth, "supabase_fetch_user", fake_fetch_user)
+    token = _hs256_token(JWT_SECRET)
+
+    async def run(settings: Settings) -> dict:
+        async with httpx.AsyncClient() as http:
+            verifier = LocalTokenVerifier(settings, http)
+            return await verify_access_token(token, settings, verifier)
+
+    settings = _settings(supabase_jwt_secret="")
+    assert asyncio.run(run(settings))["id"] == "remote_user"
+
+    strict = _settings(supabase_jwt_secret="", supabase_auth_remote_fallback=False)
+    with pytest.raises(HTTPException):
+        asyncio.run(run(strict))
@@ -0,0 +1,109 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.config import Settings
+from app.repo import AsyncSupabaseRepo, FakeRepo
+from bench.runner import EndpointStats, compare, percentile
+from bench.standins import (
+    BENCH_PRODUCT_ID,
+    LatencyProfile,
+    bench_products,
+    build_creem_app,
+    build_supabase_app,
+)
+
+
+def test_latency_profile_parsing_and_sampling():
+    assert LatencyProfile.parse("fixed:20").sample_seconds() == 0.02
+    uniform = LatencyProfile.parse("uniform:10,30")
+    assert all(0.01 <= uniform.sample_seconds() <= 0.03 for _ in range(100))
+    lognormal = LatencyProfile.parse("lognormal:10,50", error_rate=0.1)
+    assert lognormal.spec() == "lognormal:10,50"
+    assert lognormal.error_rate == 0.1
+
+    for spec in ("fixed", "uniform:10", "gamma:1,2"):
+        with pytest.raises(ValueError):
+            LatencyProfile.parse(spec)
+    with pytest.raises(ValueError):
+        LatencyProfile.parse("fixed:1", error_rate=1.5)
+
+
+def test_stats_and_regression_check():
+    assert percentile([], 99) == 0.0
+    assert percentile([0.1, 0.2, 0.3, 0.4], 50) == 0.2
+    assert percentile([0.1, 0.2, 0.3, 0.4], 99) == 0.4
+
+    stats = EndpointStats()
+    for value in (0.01, 0.02, 0.03):
+        stats.record(value, "200")
+    stats.record(0.5, "503")
+    summary = stats.summary(elapsed=2.0)
+    assert summary["requests"] == 4
+    assert summary["errors"] == 1
+    assert summary["throughput_rps"] == 2.0
+    assert summary["p50_ms"] == 20.0
+
+    baseline = {"endpoints": {"me": {**summary, "p99_ms": 100.0, "throughput_rps": 10.0}}}
+    current = {"endpoints": {"me": {**summary, "p99_ms": 130.0, "throughput_rps": 9.0}}}
+    assert compare(current, baseline, max_regression=0.2) == ["me p99_ms: 100.0 -> 130.0"]
+    assert compare(current, baseline, max_regression=0.5) == []
+
+
+def test_supabase_standin_serves_the_repo_and_auth():
+    repo = FakeRepo(products=bench_products())
+    standin = build_supabase_app(repo, LatencyProfile(), LatencyProfile())
+
+    async def run() -> None:
+        transport = httpx.ASGITransport(app=standin)
+        async with httpx.AsyncClient(transport=transport, base_url="http://standin") as client:
+            settings = Settings(supabase_url="http://standin", supabase_service_role_key="k")
+            supabase = AsyncSupabaseRepo(settings, client)
+
+            assert (await supabase.get_product(BENCH_PRODUCT_ID))["name"] == "Bench Pack"
+            order = await supabase.create_order_pending("u1", BENCH_PRODUCT_ID, "req-1")
+            assert order["status"] == "pending"
+            await supabase.update_order_checkout_ids("req-1", "chk_1")
+
+            result = await supabase.process_checkout_completed(
+                event_key="evt-1",
+                request_id="req-1",
+                creem_checkout_id="chk_1",
+                creem_order_id="ord_1",
+                amount_cents=1500,
+                currency="USD",
+            )
+            assert result["new_event"] and result["order_found"]
+            assert await supabase.get_order_by_request_id("req-1") is not None
+            assert [row["product_id"] for row in await supabase.list_entitlements("u1")] == [
+                BENCH_PRODUCT_ID
+            ]
+
+            denied = await client.get("/auth/v1/user", headers={"Authorization": "Bearer x"})
+            assert denied.status_code == 401
+            user = await client.get("/auth/v1/user", headers={"Authorization": "Bearer bench-u7"})
+            assert user.json()["id"] == "u7"
+
+    asyncio.run(run())
+
+
+def test_creem_standin_injects_errors():
+    failing = build_creem_app(LatencyProfile.parse("fixed:0", error_rate=1.0))
+    healthy = build_creem_app(LatencyProfile())
+
+    async def run() -> None:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=failing)) as client:
+            response = await client.post("http://creem/v1/checkouts", json={"request_id": "r"})
+            assert response.status_code == 503
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=healthy)) as client:
+            created = await client.post("http://creem/v1/checkouts", json={"request_id": "r"})
+            checkout_id = created.json()["id"]
+            fetched = await client.get(
+                "http://creem/v1/checkouts",
+                params={"checkout_id": checkout_id},
+            )
+            assert fetched.json()["request_id"] == "r"
+
+    asyncio.run(run())
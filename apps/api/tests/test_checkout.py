@@ -1,3 +1,14 @@
+import asyncio
+
+from httpx import Response
+
+from app import deps_auth
+from app.admission import ConcurrencyLimiter, RouteLimiter, TokenBucket
+from app.deps import get_creem_client, get_route_limiters
+from app.main import app
+from app.metrics import ADMISSION_REJECTIONS
+
+
 def test_checkout_requires_auth(client, fake_repo):
     product_id = next(iter(fake_repo.products.keys()))
     response = client.post("/api/checkout", json={"product_id": product_id})
@@ -31,3 +42,155 @@ def test_checkout_success_creates_pending_order(client, fake_repo):
     assert order["status"] == "pending"
     assert order["creem_checkout_id"] == "chk_test"
     assert order["user_id"] == "user_test"
+
+
+def test_checkout_creem_failure_marks_order_failed(client, fake_repo):
+    class FailingCreemClient:
+        async def create_checkout(self, **kwargs):
+            raise RuntimeError("creem down")
+
+    app.dependency_overrides[get_creem_client] = lambda: FailingCreemClient()
+    product_id = next(iter(fake_repo.products.keys()))
+    response = client.post(
+        "/api/checkout",
+        headers={"Authorization": "Bearer good-token"},
+        json={"product_id": product_id},
+    )
+
+    assert response.status_code == 502
+    order = next(iter(fake_repo.orders_by_request.values()))
+    assert order["status"] == "failed"
+
+
+def test_checkout_order_insert_failure_hides_the_creem_session(client, fake_repo):
+    creem_calls: list[str] = []
+
+    class RecordingCreemClient:
+        async def create_checkout(self, request_id: str, **kwargs):
+            creem_calls.append(request_id)
+            return {"id": "chk_orphan", "checkout_url": f"https://checkout.test/{request_id}"}
+
+    async def failing_insert(**kwargs):
+        raise RuntimeError("Supabase request failed for create order pending (500)")
+
+    fake_repo.create_order_pending = failing_insert
+    app.dependency_overrides[get_creem_client] = lambda: RecordingCreemClient()
+    product_id = next(iter(fake_repo.products.keys()))
+
+    response = client.post(
+        "/api/checkout",
+        headers={"Authorization": "Bearer good-token"},
+        json={"product_id": product_id},
+    )
+
+    assert response.status_code == 503
+    assert response.json() == {"detail": "Failed to create checkout"}
+    assert len(creem_calls) == 1
+    assert "checkout.test" not in response.text
+    assert fake_repo.orders_by_request == {}
+
+
+def test_checkout_overlaps_independent_steps(client, fake_repo, monkeypatch):
+    events: list[str] = []
+
+    async def slow_fetch_user(
+        token: str,
+        settings: object,
+        client: object = None,
+    ) -> dict[str, str]:
+        events.append("auth:start")
+        await asyncio.sleep(0.05)
+        events.append("auth:end")
+        return {"id": "user_test", "email": "user@example.com"}
+
+    original_insert = fake_repo.create_order_pending
+
+    async def slow_insert(**kwargs):
+        events.append("insert:start")
+        await asyncio.sleep(0.05)
+        events.append("insert:end")
+        return await original_insert(**kwargs)
+
+    class SlowCreemClient:
+        async def create_checkout(self, request_id: str, **kwargs):
+            events.append("creem:start")
+            await asyncio.sleep(0.05)
+            events.append("creem:end")
+            return {"id": "chk_test", "checkout_url": f"https://checkout.test/{request_id}"}
+
+    monkeypatch.setattr(deps_auth, "supabase_fetch_user", slow_fetch_user)
+    fake_repo.create_order_pending = slow_insert
+    app.dependency_overrides[get_creem_client] = lambda: SlowCreemClient()
+    product_id = next(iter(fake_repo.products.keys()))
+
+    response = client.post(
+        "/api/checkout",
+        headers={"Authorization": "Bearer good-token"},
+        json={"product_id": product_id},
+    )
+
+    assert response.status_code == 200
+    assert events.index("creem:start") < events.index("insert:end")
+
+
+def test_checkout_rate_limits_per_user(client, fake_repo):
+    limiter = RouteLimiter("checkout", bucket=TokenBucket(rate_per_second=0.01, burst=1))
+    app.dependency_overrides[get_route_limiters] = lambda: {"checkout": limiter}
+    product_id = next(iter(fake_repo.products.keys()))
+
+    def post() -> Response:
+        return client.post(
+            "/api/checkout",
+            headers={"Authorization": "Bearer good-token"},
+            json={"product_id": product_id},
+        )
+
+    assert post().status_code == 200
+    limited = post()
+
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 1
+    assert len(fake_repo.orders_by_request) == 1
+    assert ADMISSION_REJECTIONS.value("checkout", "rate_limited") >= 1
+
+
+def test_checkout_replays_are_not_rate_limited(client, fake_repo):
+    limiter = RouteLimiter("checkout", bucket=TokenBucket(rate_per_second=0.01, burst=1))
+    app.dependency_overrides[get_route_limiters] = lambda: {"checkout": limiter}
+    product_id = next(iter(fake_repo.products.keys()))
+
+    def post(key: str) -> Response:
+        return client.post(
+            "/api/checkout",
+            headers={"Authorization": "Bearer good-token", "Idempotency-Key": key},
+            json={"product_id": product_id},
+        )
+
+    first = post("checkout-1")
+    assert first.status_code == 200
+    assert post("checkout-2").status_code == 429
+
+    replay = post("checkout-1")
+
+    assert replay.status_code == 200
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json() == first.json()
+    assert len(fake_repo.orders_by_request) == 1
+
+
+def test_checkout_sheds_load_when_in_flight_cap_is_reached(client, fake_repo):
+    concurrency = ConcurrencyLimiter(max_in_flight=1, max_queued=0, queue_timeout_seconds=2.0)
+    concurrency.in_flight = 1
+    limiter = RouteLimiter("checkout", concurrency=concurrency)
+    app.dependency_overrides[get_route_limiters] = lambda: {"checkout": limiter}
+    product_id = next(iter(fake_repo.products.keys()))
+
+    response = client.post(
+        "/api/checkout",
+        headers={"Authorization": "Bearer good-token"},
+        json={"product_id": product_id},
+    )
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "2"
+    assert fake_repo.orders_by_request == {}
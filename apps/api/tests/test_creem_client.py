@@ -0,0 +1,196 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.circuit_breaker import CircuitBreaker
+from app.creem_client import CreemClient
+
+
+def _breaker(**overrides: float) -> CircuitBreaker:
+    options = {"failure_ratio": 0.5, "min_calls": 4, "window_seconds": 30, "open_seconds": 30}
+    options.update(overrides)
+    return CircuitBreaker(**options)
+
+
+def _run_checkout(handler, breaker: CircuitBreaker, calls: int = 1) -> list[object]:
+    async def run() -> list[object]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            creem = CreemClient(
+                "key",
+                "https://creem.test",
+                http,
+                breaker,
+                max_retries=2,
+                backoff_base_seconds=0.0,
+            )
+            results: list[object] = []
+            for _ in range(calls):
+                try:
+                    results.append(
+                        await creem.create_checkout("prod", "req_1", "https://s", "a@b.c", {})
+                    )
+                except HTTPException as exc:
+                    results.append(exc)
+            return results
+
+    return asyncio.run(run())
+
+
+def test_transient_failures_are_retried_with_same_request_id():
+    seen: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(json.loads(request.content)["request_id"])
+        if len(seen) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"id": "chk_1", "checkout_url": "https://pay"})
+
+    [result] = _run_checkout(handler, _breaker())
+
+    assert result == {"id": "chk_1", "checkout_url": "https://pay"}
+    assert seen == ["req_1", "req_1", "req_1"]
+
+
+def test_client_errors_are_not_retried():
+    attempts = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal attempts
+        attempts += 1
+        return httpx.Response(400)
+
+    [result] = _run_checkout(handler, _breaker())
+
+    assert isinstance(result, HTTPException)
+    assert result.status_code == 502
+    assert attempts == 1
+
+
+def test_breaker_fails_fast_when_open_and_probes_after_cooldown():
+    attempts = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal attempts
+        attempts += 1
+        raise httpx.ConnectError("down")
+
+    breaker = _breaker()
+    results = _run_checkout(handler, breaker, calls=3)
+
+    assert all(isinstance(result, HTTPException) for result in results)
+    assert breaker.state == "open"
+    assert attempts == 4
+
+    breaker.open_seconds = 0
+
+    def healthy(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"id": "chk_1", "checkout_url": "https://pay"})
+
+    [result] = _run_checkout(healthy, breaker)
+    assert result == {"id": "chk_1", "checkout_url": "https://pay"}
+    assert breaker.state == "closed"
+
+
+def test_cancelled_probe_releases_the_half_open_slot():
+    breaker = _breaker(open_seconds=0)
+    breaker._open()
+    started = asyncio.Event()
+
+    async def hanging(request: httpx.Request) -> httpx.Response:
+        started.set()
+        await asyncio.sleep(60)
+        raise AssertionError("unreachable")
+
+    async def run() -> None:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(hanging)) as http:
+            creem = CreemClient("key", "https://creem.test", http, breaker)
+            probe = asyncio.create_task(
+                creem.create_checkout("prod", "req_1", "https://s", "a@b.c", {})
+            )
+            await started.wait()
+            assert breaker.state == "half_open"
+            assert not breaker.allow()
+            probe.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await probe
+
+    asyncio.run(run())
+
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    breaker.release_probe()
+
+    def healthy(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"id": "chk_1", "checkout_url": "https://pay"})
+
+    [result] = _run_checkout(healthy, breaker)
+    assert result == {"id": "chk_1", "checkout_url": "https://pay"}
+    assert breaker.state == "closed"
+
+
+def test_cancelled_calls_are_not_counted_as_creem_failures():
+    breaker = _breaker(min_calls=4)
+    started = 0
+
+    async def hanging(request: httpx.Request) -> httpx.Response:
+        nonlocal started
+        started += 1
+        await asyncio.sleep(60)
+        raise AssertionError("unreachable")
+
+    async def run() -> None:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(hanging)) as http:
+            creem = CreemClient("key", "https://creem.test", http, breaker)
+            calls = [
+                asyncio.create_task(
+                    creem.create_checkout("prod", f"req_{index}", "https://s", "a@b.c", {})
+                )
+                for index in range(12)
+            ]
+            while started < len(calls):
+                await asyncio.sleep(0)
+            for call in calls:
+                call.cancel()
+            await asyncio.gather(*calls, return_exceptions=True)
+
+    asyncio.run(run())
+
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_stale_probe_slot_expires_after_the_probe_timeout():
+    breaker = _breaker(open_seconds=0, probe_timeout_seconds=60)
+    breaker._open()
+
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.probe_timeout_seconds = 0
+    assert breaker.allow()
+
+
+def test_breaker_opens_on_failure_ratio():
+    breaker = _breaker()
+    for ok in (True, False, True, False):
+        if ok:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+@pytest.mark.parametrize("status_code", [429, 500, 502])
+def test_exhausted_retries_return_bad_gateway(status_code):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(status_code)
+
+    [result] = _run_checkout(handler, _breaker(min_calls=100))
+
+    assert isinstance(result, HTTPException)
+    assert result.status_code == 502
@@ -0,0 +1,124 @@
+import asyncio
+
+from app.config import Settings, get_settings
+from app.deps import get_entitlement_index
+from app.entitlement_index import EntitlementIndex
+from app.main import app
+from app.pubsub import EntitlementBroker
+from app.repo import FakeRepo
+from app.webhook_events import CreemEvent, process_event
+
+SERVICE = {"X-Service-Token": "service-secret"}
+
+
+def _service_settings(**overrides) -> None:
+    settings = Settings(service_api_token="service-secret", **overrides)
+    app.dependency_overrides[get_settings] = lambda: settings
+
+
+def test_index_loads_the_table_in_pages_and_answers_checks():
+    repo = FakeRepo()
+    repo.entitlements.update({("u1", "p1"), ("u1", "p2"), ("u2", "p2"), ("u3", "p1")})
+    pages: list[tuple | None] = []
+    list_page = repo.list_entitlements_page
+
+    async def tracked(after, limit):
+        pages.append(after)
+        return await list_page(after, limit)
+
+    repo.list_entitlements_page = tracked
+    index = EntitlementIndex(repo, resync_seconds=60, page_size=3)
+
+    asyncio.run(index.load())
+
+    assert pages == [None, ("u2", "p2")]
+    assert index.check([("u1", "p2"), ("u2", "p1"), ("u3", "p1"), ("u9", "p1"), ("u1", "p9")]) == [
+        True,
+        False,
+        True,
+        False,
+        False,
+    ]
+    assert index.stats()["users"] == 3
+    assert index.stats()["grants"] == 4
+
+
+def test_resync_drops_revoked_grants_and_keeps_grants_made_while_loading():
+    repo = FakeRepo()
+    repo.entitlements.update({("u1", "p1"), ("u2", "p1")})
+    index = EntitlementIndex(repo, resync_seconds=60, page_size=1)
+    list_page = repo.list_entitlements_page
+
+    async def run() -> None:
+        await index.load()
+        repo.entitlements.discard(("u2", "p1"))
+
+        async def slow_page(after, limit):
+            rows = await list_page(after, limit)
+            # A webhook grant lands while the first page is in flight, after it was read.
+            if after is None:
+                index.add("u0", "p2")
+            return rows
+
+        repo.list_entitlements_page = slow_page
+        await index.load()
+
+    asyncio.run(run())
+
+    assert index.check([("u1", "p1"), ("u2", "p1"), ("u0", "p2")]) == [True, False, True]
+    assert index.stats()["grants"] == 2
+
+
+def test_paid_webhook_updates_the_index_through_the_broker():
+    repo = FakeRepo()
+    broker = EntitlementBroker()
+    index = EntitlementIndex(repo, resync_seconds=60)
+    broker.add_listener(index.add)
+
+    async def run() -> str:
+        await index.load()
+        order = await repo.create_order_pending("u1", "p1", "req_1")
+        assert order is not None
+        return await process_event(
+            repo,
+            CreemEvent(
+                "evt_1",
+                "req_1",
+                {
+                    "event_key": "evt_1",
+                    "request_id": "req_1",
+                    "creem_checkout_id": "chk_1",
+                    "creem_order_id": "ord_1",
+                    "amount_cents": 1500,
+                    "currency": "USD",
+                },
+            ),
+            broker=broker,
+        )
+
+    assert asyncio.run(run()) == "paid"
+    assert index.check([("u1", "p1")]) == [True]
+
+
+def test_check_endpoint_answers_from_the_index(client, fake_repo):
+    _service_settings(entitlement_check_max_pairs=3)
+    fake_repo.entitlements.update({("u1", "p1"), ("u2", "p2")})
+    index = EntitlementIndex(fake_repo, resync_seconds=60)
+    checks = {"checks": [["u1", "p1"], ["u1", "p2"], ["u2", "p2"]]}
+
+    assert client.post("/api/entitlements/check", json=checks, headers=SERVICE).status_code == 404
+
+    app.dependency_overrides[get_entitlement_index] = lambda: index
+    assert client.post("/api/entitlements/check", json=checks).status_code == 403
+    loading = client.post("/api/entitlements/check", json=checks, headers=SERVICE)
+    assert loading.status_code == 503
+    assert loading.headers["Retry-After"] == "5"
+
+    asyncio.run(index.load())
+    response = client.post("/api/entitlements/check", json=checks, headers=SERVICE)
+
+    assert response.status_code == 200
+    assert response.json() == {"results": [True, False, True]}
+
+    too_many = {"checks": checks["checks"] * 2}
+    assert client.post("/api/entitlements/check", json=too_many, headers=SERVICE).status_code == 400
@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+
+from app.config import Settings, get_settings
+from app.pubsub import EntitlementBroker
+from app.repo import FakeRepo
+from app.routes.entitlements import watch_entitlements
+
+AUTH = {"Authorization": "Bearer good-token"}
+
+
+def test_stream_returns_existing_entitlement_immediately(client, fake_repo):
+    product_id = next(iter(fake_repo.products))
+    fake_repo.entitlements.add(("user_test", product_id))
+
+    response = client.get(
+        "/api/entitlements/stream",
+        headers={**AUTH, "Accept": "text/event-stream"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "event: entitlement" in response.text
+    assert product_id in response.text
+
+
+def test_long_poll_times_out_without_entitlement(client):
+    response = client.get("/api/entitlements/stream", params={"timeout": 0.05}, headers=AUTH)
+
+    assert response.status_code == 200
+    assert response.json() == {"unlocked": False, "entitlements": []}
+
+
+def test_stream_requires_auth(client):
+    assert client.get("/api/entitlements/stream").status_code == 401
+
+
+def test_watch_wakes_on_published_grant_and_unsubscribes():
+    repo = FakeRepo()
+    broker = EntitlementBroker()
+
+    async def run() -> list:
+        results = []
+        with broker.subscribe("user_1") as queue:
+            asyncio.get_running_loop().call_later(0.02, broker.publish, "user_1", "prod_1")
+            async for rows in watch_entitlements(repo, queue, "user_1", "prod_1", 5.0, 1.0):
+                results.append(rows)
+        return results
+
+    assert asyncio.run(run()) == [[{"product_id": "prod_1"}]]
+    assert broker.subscriber_count == 0
+
+
+def test_watch_heartbeats_without_querying_and_rechecks_at_the_deadline():
+    repo = FakeRepo()
+    broker = EntitlementBroker()
+    queries = 0
+    list_entitlements = repo.list_entitlements
+
+    async def counted(user_id: str) -> list:
+        nonlocal queries
+        queries += 1
+        return await list_entitlements(user_id)
+
+    repo.list_entitlements = counted
+
+    async def run() -> list:
+        results = []
+        with broker.subscribe("user_1") as queue:
+            async for rows in watch_entitlements(repo, queue, "user_1", None, 0.1, 0.01):
+                results.append(rows)
+                # Granted by another worker: no broker event reaches this process.
+                repo.entitlements.add(("user_1", "prod_1"))
+        return results
+
+    results = asyncio.run(run())
+
+    assert results[0] is None
+    assert results[-1] == [{"product_id": "prod_1"}]
+    assert len(results) > 3
+    assert queries == 2
+
+
+def test_watch_rereads_the_table_with_backoff_for_unpublished_grants():
+    repo = FakeRepo()
+    broker = EntitlementBroker()
+    queries = 0
+    list_entitlements = repo.list_entitlements
+
+    async def counted(user_id: str) -> list:
+        nonlocal queries
+        queries += 1
+        return await list_entitlements(user_id)
+
+    repo.list_entitlements = counted
+
+    async def run() -> tuple[list, float]:
+        loop = asyncio.get_running_loop()
+        # Written straight to the table, as another worker would; nothing is published.
+        loop.call_later(0.1, repo.entitlements.add, ("user_1", "prod_1"))
+        started = loop.time()
+        results = []
+        with broker.subscribe("user_1") as queue:
+            async for rows in watch_entitlements(
+                repo, queue, "user_1", "prod_1", 5.0, 0.08, recheck=0.01
+            ):
+                results.append(rows)
+        return results, loop.time() - started
+
+    results, elapsed = asyncio.run(run())
+
+    assert results[-1] == [{"product_id": "prod_1"}]
+    assert elapsed < 1.0
+    # Rechecks back off (0.01, 0.02, 0.04, 0.08, ...) rather than polling every tick.
+    assert queries <= 6
+
+
+def test_long_poll_unlocks_on_grant_from_another_worker(client, fake_repo):
+    product_id = next(iter(fake_repo.products))
+    client.app.dependency_overrides[get_settings] = lambda: Settings(
+        entitlement_stream_timeout_seconds=5.0,
+        entitlement_stream_recheck_seconds=0.02,
+    )
+    grant = threading.Timer(0.1, fake_repo.entitlements.add, [("user_test", product_id)])
+    grant.start()
+    started = time.monotonic()
+    try:
+        response = client.get("/api/entitlements/stream", headers=AUTH)
+    finally:
+        grant.cancel()
+
+    assert response.status_code == 200
+    assert response.json()["unlocked"] is True
+    assert time.monotonic() - started < 2.0
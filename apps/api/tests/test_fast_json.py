@@ -0,0 +1,104 @@
+import json
+from datetime import UTC, date, datetime
+
+import pytest
+
+from app import fast_json
+from app.fast_json import FastJSONResponse
+from app.reports import EXPORT_FIELDS
+from app.webhook_events import CreemEvent, parse_event
+from bench.json_bench import PRODUCT_LISTING, WEBHOOK_PAYLOAD, run
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_is_compact_utf8_and_round_trips(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(fast_json, "orjson", None)
+    value = {"name": "café", "items": [1, 2.5, None, True]}
+
+    body = fast_json.dumps(value)
+
+    assert body == '{"name":"café","items":[1,2.5,null,true]}'.encode()
+    assert fast_json.loads(body) == value
+    assert FastJSONResponse(value).body == body
+
+
+APP_PAYLOADS = {
+    "webhook": WEBHOOK_PAYLOAD,
+    "product_listing": PRODUCT_LISTING,
+    "entitlement": {"entitled": True, "product_id": "prod_0001"},
+    "checkout": {"request_id": "req_1", "checkout_url": "https://pay.test/c?x=1&y=é"},
+    "idempotency_record": {"fingerprint": "ab" * 32, "result": {"order_id": 7, "ok": None}},
+    "auth_user": {
+        "id": "user-1",
+        "email": "ünïcode@example.com",
+        "app_metadata": {"provider": "email", "providers": ["email"]},
+        "user_metadata": {},
+    },
+    "revenue_day": [
+        {"day": "2026-01-02", "product_id": "p1", "currency": "USD", "orders": 3, "amount_cents": 0}
+    ],
+    "order_export": {field: None for field in EXPORT_FIELDS} | {"amount_cents": 2**40},
+    "speedscope": {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": [{"name": "<lambda>", "file": "C:\\app\\x.py", "line": 1}]},
+        "profiles": [{"endValue": 12.345, "weights": [0.1 * 3, 2.0, 1 / 3], "samples": [[0]]}],
+    },
+    "default_str": {"at": datetime(2026, 1, 2, 3, 4, 5, tzinfo=UTC), "on": date(2026, 1, 2)},
+}
+
+
+@pytest.mark.parametrize("name", APP_PAYLOADS)
+def test_backends_write_the_same_bytes_for_app_payloads(monkeypatch, name):
+    pytest.importorskip("orjson")
+    value = APP_PAYLOADS[name]
+
+    fast = fast_json.dumps(value)
+    monkeypatch.setattr(fast_json, "orjson", None)
+    stdlib = fast_json.dumps(value)
+
+    assert fast == stdlib
+    assert fast_json.loads(fast) == json.loads(stdlib)
+
+
+def test_parse_event_builds_typed_checkout_event():
+    raw = (
+        b'{"id":"evt_1","eventType":"checkout.completed","object":{"id":"chk_1",'
+        b'"request_id":"req_1","order":{"id":"ord_1","status":"paid","amount":"1500"}}}'
+    )
+
+    event = parse_event(raw)
+
+    assert event == CreemEvent(
+        "evt_1",
+        "req_1",
+        {
+            "event_key": "evt_1",
+            "request_id": "req_1",
+            "creem_checkout_id": "chk_1",
+            "creem_order_id": "ord_1",
+            "amount_cents": 1500,
+            "currency": None,
+        },
+    )
+    assert parse_event(b'{"id":"evt_2","eventType":"subscription.active"}') == CreemEvent(
+        "evt_2", "evt_2"
+    )
+
+
+@pytest.mark.parametrize("raw", [b"[1, 2]", b"{not json", b"\xff\xfe"])
+def test_parse_event_rejects_invalid_payloads(raw):
+    with pytest.raises(ValueError):
+        parse_event(raw)
+
+
+def test_json_bench_reports_each_case():
+    results = run(number=10)
+
+    assert set(results) == {
+        "webhook_parse",
+        "listing_render",
+        "entitlement_render",
+        "cache_roundtrip",
+    }
+    assert all(row["stdlib_us"] > 0 and row["fast_us"] > 0 for row in results.values())
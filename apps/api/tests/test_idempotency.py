@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from app.config import Settings
+from app.idempotency import IdempotencyConflictError, IdempotencyStore, build_idempotency_store
+
+
+def _checkout(client, product_id: str, key: str):
+    return client.post(
+        "/api/checkout",
+        headers={"Authorization": "Bearer good-token", "Idempotency-Key": key},
+        json={"product_id": product_id},
+    )
+
+
+def test_repeated_checkout_with_same_key_is_replayed(client, fake_repo):
+    product_id = next(iter(fake_repo.products.keys()))
+
+    first = _checkout(client, product_id, "key-1")
+    second = _checkout(client, product_id, "key-1")
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["idempotent-replayed"] == "true"
+    assert len(fake_repo.orders_by_request) == 1
+
+    assert _checkout(client, product_id, "key-2").status_code == 200
+    assert len(fake_repo.orders_by_request) == 2
+
+
+def test_reused_key_with_different_body_is_rejected(client, fake_repo):
+    product_id = next(iter(fake_repo.products.keys()))
+    fake_repo.products["other"] = {**fake_repo.products[product_id], "id": "other"}
+
+    assert _checkout(client, product_id, "key-1").status_code == 200
+    assert _checkout(client, "other", "key-1").status_code == 422
+
+
+def test_concurrent_duplicates_wait_for_the_first_attempt():
+    store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+    calls = 0
+
+    async def operation() -> dict[str, str]:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"checkout_url": "https://pay"}
+
+    async def run() -> list[tuple[dict, bool]]:
+        return await asyncio.gather(*(store.run("u:k", "fp", operation) for _ in range(5)))
+
+    results = asyncio.run(run())
+
+    assert calls == 1
+    assert [replayed for _, replayed in results].count(False) == 1
+    assert all(result == {"checkout_url": "https://pay"} for result, _ in results)
+
+
+def test_failed_attempts_are_not_stored():
+    store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+
+    async def failing() -> dict[str, str]:
+        raise RuntimeError("creem down")
+
+    async def succeeding() -> dict[str, str]:
+        return {"checkout_url": "https://pay"}
+
+    async def run() -> tuple[dict, bool]:
+        with pytest.raises(RuntimeError):
+            await store.run("u:k", "fp", failing)
+        result = await store.run("u:k", "fp", succeeding)
+        with pytest.raises(IdempotencyConflictError):
+            await store.run("u:k", "other", succeeding)
+        return result
+
+    assert asyncio.run(run()) == ({"checkout_url": "https://pay"}, False)
+
+
+def test_retry_after_a_cancelled_caller_joins_the_running_attempt():
+    store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+    calls = 0
+    release = asyncio.Event()
+
+    async def operation() -> dict[str, str]:
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return {"checkout_url": "https://pay"}
+
+    async def run() -> tuple[dict, bool]:
+        first = asyncio.create_task(store.run("u:k", "fp", operation))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        retry = asyncio.create_task(store.run("u:k", "fp", operation))
+        await asyncio.sleep(0)
+        release.set()
+        return await retry
+
+    assert asyncio.run(run()) == ({"checkout_url": "https://pay"}, True)
+    assert calls == 1
+    assert store._inflight == {}
+
+
+def test_lock_outlasts_every_creem_retry():
+    settings = Settings(
+        creem_timeout_seconds=15,
+        creem_max_retries=2,
+        creem_backoff_max_seconds=2,
+        http_timeout_seconds=10,
+    )
+
+    store = build_idempotency_store(settings, None)
+
+    assert store.lock_seconds == 15 * 3 + 2 * 2 + 10
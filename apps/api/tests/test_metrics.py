@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+import httpx
+
+from app.config import Settings, get_settings
+from app.main import app
+from app.metrics import (
+    OUTBOUND_REQUEST_SECONDS,
+    REGISTRY,
+    WEBHOOK_DELIVERIES,
+    WEBHOOK_EVENTS,
+    Histogram,
+    Registry,
+)
+from app.repo import AsyncSupabaseRepo
+from app.utils.crypto import hmac_sha256_hex
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.register(Histogram("op_seconds", "Op latency.", ("op",), (0.1, 1.0)))
+    histogram.observe(0.05, "read")
+    histogram.observe(0.1, "read")
+    histogram.observe(3.0, "read")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE op_seconds histogram" in lines
+    assert 'op_seconds_bucket{op="read",le="0.1"} 2' in lines
+    assert 'op_seconds_bucket{op="read",le="1"} 2' in lines
+    assert 'op_seconds_bucket{op="read",le="+Inf"} 3' in lines
+    assert 'op_seconds_count{op="read"} 3' in lines
+
+
+def test_metrics_endpoint_reports_routes_and_server_timing(client):
+    response = client.get("/api/products")
+    assert response.status_code == 200
+    assert "total;dur=" in response.headers["server-timing"]
+
+    response = client.get("/api/me", headers={"Authorization": "Bearer good-token"})
+    assert response.status_code == 200
+    assert "auth;dur=" in response.headers["server-timing"]
+
+    metrics = client.get("/api/metrics")
+    assert metrics.status_code == 200
+    assert metrics.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = metrics.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/me",status="200"}' in body
+    assert "http_requests_in_flight 1" in body
+    assert "auth_token_cache_lookups_total" in body
+    assert 'creem_circuit_breaker_state{state="closed"} 1' in body
+
+
+def test_metrics_token_is_enforced(client):
+    app.dependency_overrides[get_settings] = lambda: Settings(metrics_token="scrape-secret")
+    assert client.get("/api/metrics").status_code == 403
+    response = client.get("/api/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+
+
+def test_metrics_are_rendered_on_the_event_loop(client, monkeypatch):
+    render = REGISTRY.render
+    loops = []
+
+    def recorded(*args, **kwargs) -> str:
+        loops.append(asyncio.get_running_loop())
+        return render(*args, **kwargs)
+
+    monkeypatch.setattr(REGISTRY, "render", recorded)
+
+    assert client.get("/api/metrics").status_code == 200
+    assert len(loops) == 1
+
+
+def test_webhook_outcomes_are_counted(client):
+    bad_before = WEBHOOK_DELIVERIES.value("bad_signature")
+    ignored_before = WEBHOOK_EVENTS.value("ignored")
+    duplicate_before = WEBHOOK_EVENTS.value("duplicate")
+
+    response = client.post("/api/webhooks/creem", json={}, headers={"creem-signature": "bad"})
+    assert response.status_code == 400
+
+    raw = json.dumps({"id": "evt_metrics", "eventType": "refund.created"}).encode("utf-8")
+    headers = {
+        "creem-signature": hmac_sha256_hex(get_settings().creem_webhook_secret, raw),
+        "content-type": "application/json",
+    }
+    for _ in range(2):
+        assert client.post("/api/webhooks/creem", data=raw, headers=headers).status_code == 200
+
+    assert WEBHOOK_DELIVERIES.value("bad_signature") == bad_before + 1
+    assert WEBHOOK_EVENTS.value("ignored") == ignored_before + 1
+    assert WEBHOOK_EVENTS.value("duplicate") == duplicate_before + 1
+
+
+def test_repo_requests_are_timed_per_operation():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(503 if request.url.path.endswith("/orders") else 200, json=[])
+
+    async def run() -> None:
+        settings = Settings(supabase_url="https://db.test", supabase_service_role_key="service")
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http_client:
+            repo = AsyncSupabaseRepo(settings, http_client)
+            await repo.list_active_products()
+            await repo._request("GET", "orders")
+
+    before_ok = OUTBOUND_REQUEST_SECONDS.count("supabase", "GET products", "200")
+    before_err = OUTBOUND_REQUEST_SECONDS.count("supabase", "GET orders", "503")
+    asyncio.run(run())
+    assert OUTBOUND_REQUEST_SECONDS.count("supabase", "GET products", "200") == before_ok + 1
+    assert OUTBOUND_REQUEST_SECONDS.count("supabase", "GET orders", "503") == before_err + 1
@@ -0,0 +1,161 @@
+import asyncio
+from typing import Any
+
+from app.deps import get_order_writes
+from app.main import app
+from app.order_writes import OrderWriteBehind
+from app.repo import FakeRepo
+from app.webhook_events import CreemEvent, process_event
+
+
+def _tracking(repo: FakeRepo, fail_times: int = 0) -> list[list[dict[str, Any]]]:
+    batches: list[list[dict[str, Any]]] = []
+    apply = repo.apply_order_updates
+    failures = [fail_times]
+
+    async def tracked(updates: list[dict[str, Any]]) -> None:
+        batches.append([{**update} for update in updates])
+        if failures[0] > 0:
+            failures[0] -= 1
+            raise RuntimeError("db down")
+        await apply(updates)
+
+    repo.apply_order_updates = tracked
+    return batches
+
+
+async def _orders(repo: FakeRepo, *request_ids: str) -> None:
+    for request_id in request_ids:
+        await repo.create_order_pending("user_1", "prod_1", request_id)
+
+
+def test_write_behind_coalesces_per_request_and_flushes_in_batches():
+    repo = FakeRepo()
+    batches = _tracking(repo)
+
+    async def run() -> OrderWriteBehind:
+        await _orders(repo, "req_a", "req_b", "req_c")
+        writes = OrderWriteBehind(repo, interval_seconds=60, batch_size=2)
+        await writes.submit("req_a", creem_checkout_id="chk_a")
+        await writes.submit("req_b", creem_checkout_id="chk_b")
+        await writes.submit("req_a", status="failed")
+        await writes.submit("req_c", creem_checkout_id="chk_c")
+        assert batches == []
+        await writes.flush()
+        return writes
+
+    writes = asyncio.run(run())
+
+    assert batches == [
+        [
+            {"request_id": "req_a", "creem_checkout_id": "chk_a", "status": "failed"},
+            {"request_id": "req_b", "creem_checkout_id": "chk_b"},
+        ],
+        [{"request_id": "req_c", "creem_checkout_id": "chk_c"}],
+    ]
+    assert writes.pending_count == 0
+    assert repo.orders_by_request["req_a"]["status"] == "failed"
+    assert repo.orders_by_request["req_c"]["creem_checkout_id"] == "chk_c"
+
+
+def test_write_behind_retries_failed_batches_and_keeps_the_last_write():
+    repo = FakeRepo()
+    batches = _tracking(repo, fail_times=1)
+
+    async def run() -> None:
+        await _orders(repo, "req_a")
+        writes = OrderWriteBehind(
+            repo,
+            interval_seconds=0.01,
+            retry_base_seconds=0.01,
+        )
+        writes.start()
+        await writes.submit("req_a", creem_checkout_id="chk_old")
+        await asyncio.sleep(0.015)
+        await writes.submit("req_a", creem_checkout_id="chk_new")
+        for _ in range(50):
+            if not writes.pending_count:
+                break
+            await asyncio.sleep(0.01)
+        await writes.stop()
+
+    asyncio.run(run())
+
+    assert batches[0] == [{"request_id": "req_a", "creem_checkout_id": "chk_old"}]
+    assert batches[-1] == [{"request_id": "req_a", "creem_checkout_id": "chk_new"}]
+    assert repo.orders_by_request["req_a"]["creem_checkout_id"] == "chk_new"
+
+
+def test_write_behind_writes_through_when_full_and_flushes_on_stop():
+    repo = FakeRepo()
+    batches = _tracking(repo)
+
+    async def run() -> None:
+        await _orders(repo, "req_a", "req_b")
+        writes = OrderWriteBehind(repo, interval_seconds=60, max_pending=1)
+        writes.start()
+        await writes.submit("req_a", status="failed")
+        await writes.submit("req_b", status="failed")
+        assert batches == [[{"request_id": "req_b", "status": "failed"}]]
+        await writes.stop()
+
+    asyncio.run(run())
+
+    assert batches[-1] == [{"request_id": "req_a", "status": "failed"}]
+    assert repo.orders_by_request["req_a"]["status"] == "failed"
+
+
+def test_paid_webhook_flushes_pending_writes_for_its_order_first():
+    repo = FakeRepo()
+    batches = _tracking(repo)
+
+    async def run() -> str:
+        await _orders(repo, "req_a", "req_other")
+        writes = OrderWriteBehind(repo, interval_seconds=60)
+        await writes.submit("req_a", status="failed")
+        outcome = await process_event(
+            repo,
+            CreemEvent("evt_1", "evt_1"),
+            writes=writes,
+        )
+        assert (outcome, batches) == ("ignored", [])
+        return await process_event(
+            repo,
+            CreemEvent(
+                "evt_2",
+                "req_a",
+                {
+                    "event_key": "evt_2",
+                    "request_id": "req_a",
+                    "creem_checkout_id": "chk_a",
+                    "creem_order_id": "ord_a",
+                    "amount_cents": 1500,
+                    "currency": "USD",
+                },
+            ),
+            writes=writes,
+        )
+
+    assert asyncio.run(run()) == "paid"
+    assert batches == [[{"request_id": "req_a", "status": "failed"}]]
+    assert repo.orders_by_request["req_a"]["status"] == "paid"
+
+
+def test_checkout_queues_checkout_ids_behind_the_response(client, fake_repo):
+    writes = OrderWriteBehind(fake_repo, interval_seconds=60)
+    app.dependency_overrides[get_order_writes] = lambda: writes
+    product_id = next(iter(fake_repo.products.keys()))
+
+    response = client.post(
+        "/api/checkout",
+        headers={"Authorization": "Bearer good-token"},
+        json={"product_id": product_id},
+    )
+
+    assert response.status_code == 200
+    order = next(iter(fake_repo.orders_by_request.values()))
+    assert order["creem_checkout_id"] is None
+    assert writes.pending_count == 1
+
+    asyncio.run(writes.flush())
+    assert order["creem_checkout_id"] == "chk_test"
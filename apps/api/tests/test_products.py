@@ -0,0 +1,52 @@
+from app.config import Settings, get_settings
+from app.main import app
+
+
+def test_products_listing_is_served_from_snapshot(client, fake_repo):
+    calls = 0
+    original = fake_repo.list_active_products
+
+    async def counting_list() -> list[dict]:
+        nonlocal calls
+        calls += 1
+        return await original()
+
+    fake_repo.list_active_products = counting_list
+
+    first = client.get("/api/products")
+    assert first.status_code == 200
+    assert first.json() == [
+        {"id": product_id, "name": "Starter Pack", "price_cents": 1500, "currency": "USD"}
+        for product_id in fake_repo.products
+    ]
+    assert first.headers["cache-control"].startswith("public, max-age=")
+
+    etag = first.headers["etag"]
+    second = client.get("/api/products", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.headers["etag"] == etag
+
+    product_id = next(iter(fake_repo.products))
+    checkout = client.post(
+        "/api/checkout",
+        headers={"Authorization": "Bearer good-token"},
+        json={"product_id": product_id},
+    )
+    assert checkout.status_code == 200
+    assert calls == 1
+
+
+def test_products_invalidate_requires_admin_token(client, fake_repo):
+    app.dependency_overrides[get_settings] = lambda: Settings(admin_api_token="admin-secret")
+
+    first = client.get("/api/products")
+    assert client.post("/api/products/invalidate").status_code == 403
+
+    product_id = next(iter(fake_repo.products))
+    fake_repo.products[product_id]["price_cents"] = 900
+    response = client.post("/api/products/invalidate", headers={"X-Admin-Token": "admin-secret"})
+    assert response.status_code == 200
+
+    second = client.get("/api/products", headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert second.json()[0]["price_cents"] == 900
@@ -0,0 +1,211 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.config import Settings, get_settings
+from app.deps import get_profiler
+from app.main import app
+from app.metrics import PROFILE_SAVE_FAILURES
+from app.profiling import ProfilingMiddleware, SamplingProfiler
+
+ADMIN = {"X-Admin-Token": "admin-secret"}
+
+
+async def _slow_handler(seconds: float) -> None:
+    await asyncio.sleep(seconds)
+
+
+def _profile(profiler: SamplingProfiler, *durations: float, route: str = "/api/slow") -> list:
+    async def run() -> list:
+        profiler.start()
+        captures = []
+        try:
+            for seconds in durations:
+                request = profiler.begin()
+                await _slow_handler(seconds)
+                duration = profiler.finish(request)
+                captures.append(
+                    await profiler.save(request, duration, method="GET", route=route, status=200)
+                )
+        finally:
+            profiler.stop()
+        return captures
+
+    return asyncio.run(run())
+
+
+def test_slow_requests_are_sampled_into_speedscope_files(tmp_path):
+    profiler = SamplingProfiler(str(tmp_path), threshold_seconds=0.02, interval_seconds=0.002)
+
+    fast, slow = _profile(profiler, 0.001, 0.1)
+
+    assert fast is None
+    assert slow is not None and slow.reason == "slow" and slow.samples > 0
+    document = json.loads((tmp_path / slow.file).read_text())
+    frame_names = {frame["name"] for frame in document["shared"]["frames"]}
+    assert "_slow_handler" in frame_names
+    assert document["profiles"][0]["type"] == "sampled"
+    assert list(tmp_path.iterdir()) == [tmp_path / slow.file]
+
+
+def test_sample_rate_captures_from_the_start_in_collapsed_format(tmp_path):
+    profiler = SamplingProfiler(
+        str(tmp_path),
+        sample_rate=1.0,
+        interval_seconds=0.002,
+        output_format="collapsed",
+    )
+
+    (capture,) = _profile(profiler, 0.03)
+
+    assert capture.reason == "sampled"
+    lines = (tmp_path / capture.file).read_text().splitlines()
+    assert any("_slow_handler" in line for line in lines)
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == capture.samples
+
+
+def test_old_profiles_are_removed_past_max_files(tmp_path):
+    profiler = SamplingProfiler(
+        str(tmp_path),
+        sample_rate=1.0,
+        interval_seconds=0.002,
+        max_files=2,
+    )
+
+    captures = _profile(profiler, 0.02, 0.04, 0.03)
+
+    assert [capture.id for capture in profiler.captures] == [c.id for c in captures[1:]]
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        capture.file for capture in captures[1:]
+    )
+    assert [row["duration_ms"] for row in profiler.slowest()] == sorted(
+        (capture.duration_ms for capture in captures[1:]), reverse=True
+    )
+
+
+def test_workers_sharing_a_directory_keep_distinct_files_within_max_files(tmp_path):
+    first, second = (
+        SamplingProfiler(str(tmp_path), sample_rate=1.0, interval_seconds=0.002, max_files=3)
+        for _ in range(2)
+    )
+
+    old = _profile(first, 0.02, 0.02)
+    new = _profile(second, 0.02, 0.02)
+
+    assert len({capture.id for capture in old + new}) == 4
+    # The oldest file goes, whichever worker wrote it.
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        capture.file for capture in [old[1], *new]
+    )
+
+    (latest,) = _profile(first, 0.02)
+
+    assert [capture.id for capture in first.captures] == [latest.id]
+    assert len(list(tmp_path.iterdir())) == 3
+
+
+def test_only_max_armed_requests_are_sampled_at_once(tmp_path):
+    profiler = SamplingProfiler(str(tmp_path), sample_rate=1.0, max_armed=1)
+
+    async def run() -> list:
+        requests = []
+
+        async def handler() -> None:
+            requests.append(profiler.begin())
+            await asyncio.sleep(0.01)
+            profiler.finish(requests[-1])
+
+        await asyncio.gather(handler(), handler())
+        return requests
+
+    assert [request.reason for request in asyncio.run(run())] == ["sampled", None]
+
+
+def test_held_open_requests_are_never_profiled(tmp_path):
+    profiler = SamplingProfiler(str(tmp_path), threshold_seconds=0.01, interval_seconds=0.002)
+
+    @asynccontextmanager
+    async def lifespan(_: FastAPI):
+        profiler.start()
+        yield
+        profiler.stop()
+
+    streaming = FastAPI(lifespan=lifespan)
+    streaming.add_middleware(ProfilingMiddleware)
+    streaming.state.profiler = profiler
+
+    async def events():
+        for _ in range(5):
+            await asyncio.sleep(0.02)
+            yield b": ping\n\n"
+
+    @streaming.get("/events")
+    async def sse() -> StreamingResponse:
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @streaming.get("/api/entitlements/stream")
+    async def long_poll() -> dict:
+        await asyncio.sleep(0.1)
+        return {"unlocked": False}
+
+    @streaming.get("/slow")
+    async def slow() -> dict:
+        await asyncio.sleep(0.1)
+        return {}
+
+    with TestClient(streaming) as test_client:
+        assert test_client.get("/events").status_code == 200
+        assert test_client.get("/api/entitlements/stream").status_code == 200
+        assert not profiler.captures
+        assert test_client.get("/slow").status_code == 200
+
+    assert [capture.route for capture in profiler.captures] == ["/slow"]
+
+
+def test_a_failed_profile_write_does_not_replace_the_response(client, tmp_path, monkeypatch):
+    profiler = SamplingProfiler(str(tmp_path), sample_rate=1.0)
+
+    async def broken_save(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(profiler, "save", broken_save)
+    app.state.profiler = profiler
+    failures = PROFILE_SAVE_FAILURES.value()
+
+    response = client.get("/api/health")
+
+    assert response.status_code == 200
+    assert PROFILE_SAVE_FAILURES.value() == failures + 1
+
+
+def test_admin_profiles_lists_the_slowest_captures_by_route(client, tmp_path):
+    settings = Settings(admin_api_token="admin-secret")
+    app.dependency_overrides[get_settings] = lambda: settings
+
+    assert client.get("/api/admin/profiles", headers=ADMIN).status_code == 404
+
+    profiler = SamplingProfiler(str(tmp_path), sample_rate=1.0, interval_seconds=0.002)
+    _profile(profiler, 0.02, route="/api/a")
+    _profile(profiler, 0.04, route="/api/b")
+    app.dependency_overrides[get_profiler] = lambda: profiler
+
+    assert client.get("/api/admin/profiles").status_code == 403
+    response = client.get("/api/admin/profiles", headers=ADMIN)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [capture["route"] for capture in body["captures"]] == ["/api/b", "/api/a"]
+    assert set(body["routes"]) == {"/api/a", "/api/b"}
+
+    only_a = client.get("/api/admin/profiles", params={"route": "/api/a"}, headers=ADMIN)
+    assert [capture["route"] for capture in only_a.json()["captures"]] == ["/api/a"]
+
+    capture_id = body["captures"][0]["id"]
+    download = client.get(f"/api/admin/profiles/{capture_id}", headers=ADMIN)
+    assert download.status_code == 200
+    assert download.json()["profiles"][0]["name"] == "GET /api/b"
+    assert client.get("/api/admin/profiles/missing", headers=ADMIN).status_code == 404
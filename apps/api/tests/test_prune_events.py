@@ -0,0 +1,62 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from app.metrics import WEBHOOK_EVENTS_PRUNED
+from app.prune_events import WebhookEventPruner
+from app.repo import FakeRepo
+from app.sqlite_repo import SqliteRepo
+
+
+def _hours_ago(hours: float) -> str:
+    return (datetime.now(UTC) - timedelta(hours=hours)).isoformat()
+
+
+def test_pruner_deletes_expired_events_in_bounded_batches():
+    repo = FakeRepo()
+    for index in range(5):
+        repo.webhook_events[f"evt_old_{index}"] = _hours_ago(200 + index)
+    repo.webhook_events["evt_recent"] = _hours_ago(80)
+    batches: list[int] = []
+    prune = repo.prune_webhook_events
+
+    async def counting_prune(received_before: str, limit: int) -> int:
+        deleted = await prune(received_before, limit)
+        batches.append(deleted)
+        return deleted
+
+    repo.prune_webhook_events = counting_prune
+    pruned_before = WEBHOOK_EVENTS_PRUNED.value()
+
+    pruner = WebhookEventPruner(repo, retention_hours=168, batch_size=2)
+    report = asyncio.run(pruner.run()).report()
+
+    assert batches == [2, 2, 1]
+    assert list(repo.webhook_events) == ["evt_recent"]
+    assert report["deleted"] == 5 and report["batches"] == 3
+    assert report["rows_per_second"] > 0
+    assert WEBHOOK_EVENTS_PRUNED.value() - pruned_before == 5
+
+
+def test_pruner_refuses_retention_inside_the_retry_horizon():
+    with pytest.raises(ValueError, match="at least 72 hours"):
+        WebhookEventPruner(FakeRepo(), retention_hours=1)
+
+
+def test_sqlite_repo_prunes_oldest_events_first(tmp_path):
+    async def run() -> None:
+        repo = SqliteRepo(str(tmp_path / "repo.sqlite3"))
+        await repo.open()
+        try:
+            for event_key in ("evt-1", "evt-2", "evt-3"):
+                await repo.webhook_event_insert(event_key)
+            cutoff = _hours_ago(-1)
+            assert await repo.prune_webhook_events(cutoff, 2) == 2
+            assert await repo.prune_webhook_events(_hours_ago(1), 10) == 0
+            assert await repo.webhook_event_insert("evt-1") is True
+            assert await repo.webhook_event_insert("evt-3") is False
+        finally:
+            await repo.close()
+
+    asyncio.run(run())
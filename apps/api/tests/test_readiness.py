@@ -0,0 +1,137 @@
+import asyncio
+
+import httpx
+
+from app.auth_local import LocalTokenVerifier
+from app.catalog import ProductCatalog
+from app.config import Settings
+from app.creem_client import build_creem_client
+from app.main import app
+from app.readiness import Readiness, build_readiness
+from app.repo import AsyncSupabaseRepo, FakeRepo
+from app.webhook_queue import WebhookProcessor, WebhookQueue
+
+
+def test_readiness_reports_dependencies_after_warmup():
+    calls: list[str] = []
+
+    async def repo_probe() -> None:
+        calls.append("repo")
+
+    async def creem_probe() -> None:
+        calls.append("creem")
+        raise httpx.ConnectError("refused")
+
+    async def run() -> tuple[dict, dict, dict]:
+        readiness = Readiness(
+            {"repo": repo_probe},
+            informational={"creem": creem_probe},
+            connections=3,
+            ttl_seconds=60,
+        )
+        cold = await readiness.status()
+        await readiness.warm_up()
+        warm = await readiness.status()
+        cached = await readiness.status()
+        return cold, warm, cached
+
+    cold, warm, cached = asyncio.run(run())
+
+    assert cold == {"ready": False, "warm": False, "dependencies": {}, "informational": {}}
+    # An unreachable upstream is reported but doesn't take the instance out of rotation.
+    assert warm["warm"] is True and warm["ready"] is True
+    assert warm["dependencies"]["repo"]["ok"] is True
+    assert warm["informational"]["creem"]["error"] == "ConnectError"
+    assert cached == warm
+    assert calls.count("repo") == 3 and calls.count("creem") == 3
+
+
+def test_readiness_warms_shared_pools_and_jwks():
+    requests: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        if request.url.path.endswith("jwks.json"):
+            return httpx.Response(200, json={"keys": [{"kid": "k1", "kty": "RSA"}]})
+        return httpx.Response(200, json=[])
+
+    async def run() -> dict:
+        settings = Settings(
+            supabase_url="https://db.test",
+            supabase_service_role_key="service",
+            creem_api_key="creem",
+            warmup_connections=2,
+        )
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            creem = build_creem_client(settings)
+            await creem.client.aclose()
+            creem.client = client
+            readiness = build_readiness(
+                settings,
+                http_client=client,
+                repo=AsyncSupabaseRepo(settings, client),
+                catalog=ProductCatalog(ttl_seconds=60),
+                creem=creem,
+                verifier=LocalTokenVerifier(settings, client),
+            )
+            await readiness.warm_up()
+            return await readiness.status()
+
+    report = asyncio.run(run())
+
+    assert report["ready"] is True
+    assert set(report["dependencies"]) == {"repo"}
+    assert set(report["informational"]) == {"supabase_auth", "creem"}
+    # The catalog is loaded once at warm-up; the repo probe is a one-row read.
+    assert requests.count("/rest/v1/products") == 1
+    assert requests.count("/rest/v1/entitlements") == 2
+    assert requests.count("/auth/v1/health") == 2
+    assert requests.count("/auth/v1/.well-known/jwks.json") == 1
+
+
+def test_ready_endpoint_returns_503_until_warm(client):
+    readiness = Readiness({})
+    app.state.readiness = readiness
+
+    assert client.get("/api/ready").status_code == 503
+    asyncio.run(readiness.warm_up())
+    response = client.get("/api/ready")
+    assert response.status_code == 200
+    assert response.json() == {
+        "ready": True,
+        "warm": True,
+        "dependencies": {},
+        "informational": {},
+    }
+    assert client.get("/api/health").json() == {"ok": True}
+
+
+def test_readiness_fails_on_a_closed_webhook_queue(tmp_path):
+    async def run() -> tuple[dict, dict]:
+        settings = Settings(ready_check_ttl_seconds=0)
+        queue = WebhookQueue(str(tmp_path / "queue.db"))
+        await queue.open()
+        processor = WebhookProcessor(queue, FakeRepo(), workers=1)
+        creem = build_creem_client(settings)
+        async with httpx.AsyncClient() as client:
+            readiness = build_readiness(
+                settings,
+                http_client=client,
+                repo=FakeRepo(),
+                catalog=ProductCatalog(ttl_seconds=60),
+                creem=creem,
+                verifier=None,
+                webhooks=processor,
+            )
+            await readiness.warm_up()
+            healthy = await readiness.status()
+            await queue.close()
+            broken = await readiness.status()
+        await creem.client.aclose()
+        return healthy, broken
+
+    healthy, broken = asyncio.run(run())
+
+    assert healthy["ready"] is True and set(healthy["dependencies"]) == {"repo", "queue"}
+    assert broken["ready"] is False
+    assert broken["dependencies"]["queue"]["error"] == "RuntimeError"
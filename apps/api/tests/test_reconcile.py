@@ -0,0 +1,205 @@
+import asyncio
+import json
+
+import httpx
+from fastapi import HTTPException
+
+from app import reconcile
+from app.circuit_breaker import CircuitBreaker
+from app.config import Settings
+from app.creem_client import CreemClient
+from app.reconcile import Reconciler, _load_checkpoint, _save_checkpoint
+from app.repo import FakeRepo
+from app.sqlite_repo import SqliteRepo
+
+
+class FakeCreemStatusClient:
+    def __init__(self, paid_checkout_ids: set[str]) -> None:
+        self.paid_checkout_ids = paid_checkout_ids
+        self.lookups: list[str] = []
+
+    async def get_checkout(self, checkout_id: str) -> dict:
+        self.lookups.append(checkout_id)
+        status = "paid" if checkout_id in self.paid_checkout_ids else "pending"
+        return {
+            "id": checkout_id,
+            "order": {"id": f"ord_{checkout_id}", "status": status, "amount": 1500},
+        }
+
+
+def _seed_orders(repo: FakeRepo, count: int) -> None:
+    async def seed() -> None:
+        for index in range(count):
+            request_id = f"req_{index}"
+            await repo.create_order_pending(f"user_{index}", "prod_1", request_id)
+            await repo.update_order_checkout_ids(request_id, f"chk_{index}" if index else None)
+
+    asyncio.run(seed())
+
+
+def test_reconcile_pages_through_orders_and_applies_paid_in_batches():
+    repo = FakeRepo()
+    _seed_orders(repo, 5)
+    creem = FakeCreemStatusClient({"chk_1", "chk_3"})
+    checkpoints: list[tuple[str, str]] = []
+
+    reconciler = Reconciler(repo, creem, statuses=["pending", "failed"], page_size=2)
+    stats = asyncio.run(reconciler.run(on_checkpoint=checkpoints.append))
+
+    assert stats.scanned == 5
+    assert stats.pages == 3
+    assert stats.without_checkout == 1
+    assert stats.paid == 2
+    assert stats.applied == 2
+    assert sorted(creem.lookups) == ["chk_1", "chk_2", "chk_3", "chk_4"]
+    assert repo.orders_by_request["req_1"]["status"] == "paid"
+    assert repo.orders_by_request["req_1"]["creem_order_id"] == "ord_chk_1"
+    assert repo.orders_by_request["req_2"]["status"] == "pending"
+    assert repo.entitlements == {("user_1", "prod_1"), ("user_3", "prod_1")}
+    assert len(checkpoints) == 3
+
+
+def test_reconcile_dry_run_does_not_write_and_resumes_from_checkpoint(tmp_path):
+    repo = FakeRepo()
+    _seed_orders(repo, 4)
+    creem = FakeCreemStatusClient({"chk_1", "chk_3"})
+
+    dry = Reconciler(repo, creem, statuses=["pending"], page_size=2, dry_run=True)
+    stats = asyncio.run(dry.run())
+    assert stats.paid == 2
+    assert stats.applied == 0
+    assert repo.entitlements == set()
+
+    ordered = sorted(repo.orders_by_request.values(), key=lambda o: (o["created_at"], o["id"]))
+    checkpoint = tmp_path / "checkpoint.json"
+    _save_checkpoint(checkpoint, (ordered[1]["created_at"], ordered[1]["id"]))
+    assert json.loads(checkpoint.read_text())["id"] == ordered[1]["id"]
+
+    resumed = Reconciler(repo, creem, statuses=["pending"], page_size=2)
+    stats = asyncio.run(resumed.run(after=_load_checkpoint(checkpoint)))
+
+    assert stats.scanned == 2
+    expected_paid = {
+        order["request_id"] for order in ordered[2:] if order["request_id"] in {"req_1", "req_3"}
+    }
+    paid = {order["request_id"] for order in ordered if order["status"] == "paid"}
+    assert paid == expected_paid
+
+
+class FlakyCreemStatusClient(FakeCreemStatusClient):
+    def __init__(self, paid_checkout_ids: set[str], failing_checkout_ids: set[str]) -> None:
+        super().__init__(paid_checkout_ids)
+        self.failing_checkout_ids = failing_checkout_ids
+
+    async def get_checkout(self, checkout_id: str) -> dict:
+        if checkout_id in self.failing_checkout_ids:
+            self.lookups.append(checkout_id)
+            raise HTTPException(status_code=502, detail="Creem unavailable")
+        return await super().get_checkout(checkout_id)
+
+
+def test_checkpoint_stops_before_the_first_failed_check_and_resume_retries_it():
+    repo = FakeRepo()
+    _seed_orders(repo, 6)
+    ordered = sorted(repo.orders_by_request.values(), key=lambda o: (o["created_at"], o["id"]))
+    assert [order["creem_checkout_id"] for order in ordered[3:]] == ["chk_3", "chk_4", "chk_5"]
+    creem = FlakyCreemStatusClient({"chk_3", "chk_5"}, {"chk_3"})
+    checkpoints: list[tuple[str, str]] = []
+
+    stats = asyncio.run(
+        Reconciler(repo, creem, statuses=["pending"], page_size=2).run(
+            on_checkpoint=checkpoints.append
+        )
+    )
+
+    assert stats.scanned == 6
+    assert stats.errors == 1
+    assert stats.checkpoint_held
+    assert checkpoints == [
+        (ordered[1]["created_at"], ordered[1]["id"]),
+        (ordered[2]["created_at"], ordered[2]["id"]),
+    ]
+    assert ordered[5]["status"] == "paid"
+
+    creem.failing_checkout_ids.clear()
+    resumed = asyncio.run(
+        Reconciler(repo, creem, statuses=["pending"], page_size=2).run(after=checkpoints[-1])
+    )
+
+    assert resumed.errors == 0
+    assert ordered[3]["status"] == "paid"
+
+
+def test_unparseable_checkout_response_counts_as_one_error():
+    repo = FakeRepo()
+    _seed_orders(repo, 3)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.params["checkout_id"] == "chk_1":
+            return httpx.Response(200, content=b"<html>bad gateway</html>")
+        return httpx.Response(200, json={"id": "chk_2", "order": {"status": "pending"}})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            breaker = CircuitBreaker(
+                failure_ratio=0.5, min_calls=10, window_seconds=30, open_seconds=30
+            )
+            creem = CreemClient("key", "https://creem.test", http, breaker)
+            return await Reconciler(repo, creem, statuses=["pending"]).run()
+
+    stats = asyncio.run(run())
+
+    assert stats.scanned == 3
+    assert stats.errors == 1
+    assert stats.still_open == 1
+
+
+def test_reconcile_command_uses_the_configured_sqlite_repo(tmp_path, monkeypatch):
+    settings = Settings(
+        repo_backend="sqlite",
+        sqlite_repo_path=str(tmp_path / "repo.sqlite3"),
+        creem_api_key="key",
+    )
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        checkout_id = request.url.params["checkout_id"]
+        order = {"id": f"ord_{checkout_id}", "status": "paid", "amount": 1500, "currency": "USD"}
+        return httpx.Response(200, json={"id": checkout_id, "order": order})
+
+    def creem_client(settings: Settings) -> CreemClient:
+        breaker = CircuitBreaker(0.5, 10, 30, 30)
+        http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return CreemClient("key", "https://creem.test", http, breaker)
+
+    async def seed() -> None:
+        repo = SqliteRepo(settings.sqlite_repo_path)
+        await repo.open()
+        await repo.upsert_products(
+            [{"id": "prod-1", "name": "Pack", "price_cents": 1500, "creem_product_id": "c1"}]
+        )
+        await repo.create_order_pending("user-1", "prod-1", "req-1")
+        await repo.update_order_checkout_ids("req-1", "chk-1")
+        await repo.close()
+
+    async def paid() -> tuple[dict | None, list[dict]]:
+        repo = SqliteRepo(settings.sqlite_repo_path)
+        await repo.open()
+        try:
+            order = await repo.get_order_by_request_id("req-1")
+            return order, await repo.list_entitlements("user-1")
+        finally:
+            await repo.close()
+
+    asyncio.run(seed())
+    monkeypatch.setattr(reconcile, "get_settings", lambda: settings)
+    monkeypatch.setattr(reconcile, "build_creem_client", creem_client)
+    args = reconcile._parse_args(
+        ["--min-age-minutes", "0", "--checkpoint", str(tmp_path / "checkpoint.json")]
+    )
+
+    report = asyncio.run(reconcile._main(args))
+    order, entitlements = asyncio.run(paid())
+
+    assert report["paid"] == 1 and report["applied"] == 1
+    assert order is not None and order["status"] == "paid"
+    assert [row["product_id"] for row in entitlements] == ["prod-1"]
@@ -0,0 +1,206 @@
+import asyncio
+import json
+
+import httpx
+
+from app.config import Settings
+from app.repo import AsyncSupabaseRepo
+
+
+def _settings() -> Settings:
+    return Settings(supabase_url="https://db.test", supabase_service_role_key="service")
+
+
+def test_supabase_repo_reuses_shared_client():
+    calls: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if request.method == "GET":
+            return httpx.Response(200, json=[{"id": "p1", "active": True}])
+        return httpx.Response(201, json=[{"id": "e1"}] if len(calls) == 2 else [])
+
+    async def run() -> tuple[dict | None, bool, bool]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            repo = AsyncSupabaseRepo(_settings(), client)
+            product = await repo.get_product("p1")
+            inserted = await repo.webhook_event_insert("evt_1")
+            duplicate = await repo.webhook_event_insert("evt_1")
+            assert not client.is_closed
+            return product, inserted, duplicate
+
+    product, inserted, duplicate = asyncio.run(run())
+
+    assert product == {"id": "p1", "active": True}
+    assert inserted is True
+    assert duplicate is False
+    assert [call.url.path for call in calls] == [
+        "/rest/v1/products",
+        "/rest/v1/webhook_events",
+        "/rest/v1/webhook_events",
+    ]
+    assert "return=representation" in calls[1].headers["prefer"]
+    assert calls[0].headers["apikey"] == "service"
+    assert json.loads(calls[1].content) == {"event_key": "evt_1"}
+
+
+def test_supabase_repo_processes_checkout_in_one_rpc_call():
+    calls: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(
+            200,
+            json=[{"new_event": True, "order_found": True, "user_id": "u1", "product_id": "p1"}],
+        )
+
+    async def run() -> dict:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            repo = AsyncSupabaseRepo(_settings(), client)
+            return await repo.process_checkout_completed(
+                event_key="evt_1",
+                request_id="req_1",
+                creem_checkout_id="chk_1",
+                creem_order_id="ord_1",
+                amount_cents=1500,
+                currency="USD",
+            )
+
+    result = asyncio.run(run())
+
+    assert result == {"new_event": True, "order_found": True, "user_id": "u1", "product_id": "p1"}
+    assert len(calls) == 1
+    assert calls[0].url.path == "/rest/v1/rpc/process_checkout_completed"
+    assert json.loads(calls[0].content)["p_event_key"] == "evt_1"
+
+
+def test_supabase_repo_applies_webhook_batches_in_bulk_requests():
+    calls: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if request.url.path.endswith("/rpc/process_checkout_completed_batch"):
+            return httpx.Response(
+                200,
+                json=[
+                    {"ordinal": 2, "new_event": False, "order_found": False},
+                    {
+                        "ordinal": 1,
+                        "new_event": True,
+                        "order_found": True,
+                        "user_id": "u1",
+                        "product_id": "p1",
+                    },
+                ],
+            )
+        return httpx.Response(201, json=[{"event_key": "evt_3"}])
+
+    async def run() -> tuple[list[dict], set[str]]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            repo = AsyncSupabaseRepo(_settings(), client)
+            results = await repo.process_checkout_completed_batch(
+                [{"event_key": "evt_1", "request_id": "req_1"}, {"event_key": "evt_2"}]
+            )
+            inserted = await repo.webhook_event_insert_many(["evt_3", "evt_4", "evt_3"])
+            return results, inserted
+
+    results, inserted = asyncio.run(run())
+
+    assert results == [
+        {"new_event": True, "order_found": True, "user_id": "u1", "product_id": "p1"},
+        {"new_event": False, "order_found": False, "user_id": None, "product_id": None},
+    ]
+    assert inserted == {"evt_3"}
+    assert len(calls) == 2
+    assert json.loads(calls[0].content)["p_events"][0]["event_key"] == "evt_1"
+    assert json.loads(calls[1].content) == [{"event_key": "evt_3"}, {"event_key": "evt_4"}]
+    assert "ignore-duplicates" in calls[1].headers["prefer"]
+
+
+def test_supabase_repo_prunes_webhook_events_through_rpc():
+    calls: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(200, json=3)
+
+    async def run() -> int:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            repo = AsyncSupabaseRepo(_settings(), client)
+            return await repo.prune_webhook_events("2026-01-01T00:00:00+00:00", 500)
+
+    assert asyncio.run(run()) == 3
+    assert calls[0].url.path == "/rest/v1/rpc/prune_webhook_events"
+    assert json.loads(calls[0].content) == {
+        "p_received_before": "2026-01-01T00:00:00+00:00",
+        "p_limit": 500,
+    }
+
+
+def test_supabase_repo_applies_order_updates_through_rpc():
+    calls: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(204)
+
+    updates = [
+        {"request_id": "req_1", "status": "failed"},
+        {"request_id": "req_2", "creem_checkout_id": "chk_2"},
+    ]
+
+    async def run() -> None:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            repo = AsyncSupabaseRepo(_settings(), client)
+            await repo.apply_order_updates(updates)
+            await repo.apply_order_updates([])
+
+    asyncio.run(run())
+
+    assert len(calls) == 1
+    assert calls[0].url.path == "/rest/v1/rpc/apply_order_updates"
+    assert json.loads(calls[0].content) == {"p_updates": updates}
+
+
+def test_supabase_repo_reads_revenue_through_rpc():
+    calls: list[httpx.Request] = []
+    row = {"day": "2026-10-01", "product_id": "p1", "currency": "USD", "orders": 2}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(200, json=[row])
+
+    async def run() -> list[dict]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            repo = AsyncSupabaseRepo(_settings(), client)
+            return await repo.revenue_by_day(
+                "2026-10-01T00:00:00+00:00",
+                "2026-10-02T00:00:00+00:00",
+            )
+
+    assert asyncio.run(run()) == [row]
+    assert calls[0].url.path == "/rest/v1/rpc/revenue_by_day"
+    assert json.loads(calls[0].content) == {
+        "p_created_from": "2026-10-01T00:00:00+00:00",
+        "p_created_before": "2026-10-02T00:00:00+00:00",
+    }
+
+
+def test_supabase_repo_pages_entitlements_by_user_and_product():
+    calls: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(200, json=[{"user_id": "u2", "product_id": "p1"}])
+
+    async def run() -> list[dict]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            repo = AsyncSupabaseRepo(_settings(), client)
+            return await repo.list_entitlements_page(("u1", "p2"), 500)
+
+    assert asyncio.run(run()) == [{"user_id": "u2", "product_id": "p1"}]
+    params = calls[0].url.params
+    assert calls[0].url.path == "/rest/v1/entitlements"
+    assert params["order"] == "user_id.asc,product_id.asc"
+    assert params["limit"] == "500"
+    assert params["or"] == "(user_id.gt.u1,and(user_id.eq.u1,product_id.gt.p2))"
@@ -0,0 +1,249 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.sqlite_repo import SqliteRepo
+
+PRODUCT = {
+    "id": "prod-1",
+    "name": "Starter Pack",
+    "price_cents": 1500,
+    "currency": "USD",
+    "creem_product_id": "creem_prod_test",
+}
+
+
+async def _open(path) -> SqliteRepo:
+    repo = SqliteRepo(str(path / "repo.sqlite3"))
+    await repo.open()
+    await repo.upsert_products([PRODUCT, {**PRODUCT, "id": "prod-old", "active": False}])
+    return repo
+
+
+def test_sqlite_repo_enforces_schema_constraints(tmp_path):
+    async def run() -> None:
+        repo = await _open(tmp_path)
+        try:
+            assert [p["id"] for p in await repo.list_active_products()] == ["prod-1"]
+            assert (await repo.get_product("prod-1"))["active"] is True
+            assert await repo.get_product("prod-old") is None
+
+            order = await repo.create_order_pending("user-1", "prod-1", "req-1")
+            assert order["status"] == "pending"
+            with pytest.raises(RuntimeError, match="insert orders"):
+                await repo.create_order_pending("user-2", "prod-1", "req-1")
+            with pytest.raises(RuntimeError, match="insert orders"):
+                await repo.create_order_pending("user-1", "missing", "req-2")
+
+            await repo.grant_entitlement("user-1", "prod-1")
+            await repo.grant_entitlement("user-1", "prod-1")
+            assert [e["product_id"] for e in await repo.list_entitlements("user-1")] == ["prod-1"]
+
+            assert await repo.webhook_event_insert("evt-1") is True
+            assert await repo.webhook_event_insert("evt-1") is False
+        finally:
+            await repo.close()
+
+    asyncio.run(run())
+
+
+def test_sqlite_repo_applies_paid_checkout_once_and_persists(tmp_path):
+    async def run() -> None:
+        repo = await _open(tmp_path)
+        await repo.create_order_pending("user-1", "prod-1", "req-1")
+        await repo.update_order_checkout_ids("req-1", "chk-1")
+
+        args = {
+            "request_id": "req-1",
+            "creem_checkout_id": "chk-1",
+            "creem_order_id": "ord-1",
+            "amount_cents": 1500,
+            "currency": "USD",
+        }
+        first = await repo.process_checkout_completed(event_key="evt-1", **args)
+        second = await repo.process_checkout_completed(event_key="evt-1", **args)
+        missing = await repo.process_checkout_completed(
+            event_key="evt-2",
+            **{**args, "request_id": "req-missing"},
+        )
+        await repo.close()
+
+        assert first == {
+            "new_event": True,
+            "order_found": True,
+            "user_id": "user-1",
+            "product_id": "prod-1",
+        }
+        assert second["new_event"] is False
+        assert missing["new_event"] is True and missing["order_found"] is False
+
+        reopened = await _open(tmp_path)
+        try:
+            order = await reopened.get_order_by_request_id("req-1")
+            assert order["status"] == "paid"
+            assert order["creem_order_id"] == "ord-1"
+            assert await reopened.list_entitlements("user-1") != []
+        finally:
+            await reopened.close()
+
+    asyncio.run(run())
+
+
+def test_sqlite_repo_pages_and_bulk_updates_orders(tmp_path):
+    async def run() -> None:
+        repo = await _open(tmp_path)
+        try:
+            for index in range(5):
+                await repo.create_order_pending(f"user-{index}", "prod-1", f"req-{index}")
+            await repo.update_order_failed("req-4")
+
+            seen: list[str] = []
+            after = None
+            while page := await repo.list_orders_page(["pending"], after, 2):
+                seen.extend(order["request_id"] for order in page)
+                after = (page[-1]["created_at"], page[-1]["id"])
+            assert seen == ["req-0", "req-1", "req-2", "req-3"]
+            assert await repo.list_orders_page(None, None, 10, created_before="2000-01-01") == []
+
+            page = await repo.list_orders_page(["pending"], None, 2)
+            await repo.bulk_mark_orders_paid(
+                [{**order, "creem_order_id": f"ord-{order['id']}"} for order in page]
+            )
+            await repo.bulk_grant_entitlements(
+                [(order["user_id"], order["product_id"]) for order in page * 2]
+            )
+
+            assert [o["request_id"] for o in await repo.list_orders_page(["paid"], None, 10)] == [
+                "req-0",
+                "req-1",
+            ]
+            assert len(await repo.list_entitlements("user-0")) == 1
+        finally:
+            await repo.close()
+
+    asyncio.run(run())
+
+
+def test_sqlite_repo_applies_webhook_batches_in_one_transaction(tmp_path):
+    async def run() -> None:
+        repo = await _open(tmp_path)
+        try:
+            await repo.create_order_pending("user-1", "prod-1", "req-1")
+            event = {
+                "request_id": "req-1",
+                "creem_checkout_id": "chk-1",
+                "creem_order_id": "ord-1",
+                "amount_cents": 1500,
+                "currency": "USD",
+            }
+            results = await repo.process_checkout_completed_batch(
+                [
+                    {"event_key": "evt-1", **event},
+                    {"event_key": "evt-1", **event},
+                    {"event_key": "evt-2", **event, "request_id": "req-missing"},
+                ]
+            )
+            assert [(r["new_event"], r["order_found"]) for r in results] == [
+                (True, True),
+                (False, False),
+                (True, False),
+            ]
+            assert (await repo.get_order_by_request_id("req-1"))["status"] == "paid"
+
+            assert await repo.webhook_event_insert_many(["evt-2", "evt-3", "evt-3"]) == {"evt-3"}
+            assert await repo.webhook_event_insert_many([]) == set()
+        finally:
+            await repo.close()
+
+    asyncio.run(run())
+
+
+def test_sqlite_repo_applies_order_updates_without_downgrading_paid(tmp_path):
+    async def run() -> list[dict | None]:
+        repo = await _open(tmp_path)
+        try:
+            for request_id in ("req_a", "req_b"):
+                await repo.create_order_pending("user-1", "prod-1", request_id)
+            await repo.mark_order_paid("req_b", "chk_b", "ord_b", 1500, "USD")
+            await repo.apply_order_updates(
+                [
+                    {"request_id": "req_a", "status": "failed", "creem_checkout_id": "chk_a"},
+                    {"request_id": "req_b", "status": "failed"},
+                    {"request_id": "req_missing", "status": "failed"},
+                ]
+            )
+            return [await repo.get_order_by_request_id(key) for key in ("req_a", "req_b")]
+        finally:
+            await repo.close()
+
+    order_a, order_b = asyncio.run(run())
+
+    assert (order_a["status"], order_a["creem_checkout_id"]) == ("failed", "chk_a")
+    assert (order_b["status"], order_b["creem_checkout_id"]) == ("paid", "chk_b")
+
+
+def test_sqlite_repo_sums_paid_revenue_per_day(tmp_path):
+    async def run() -> list[dict]:
+        repo = await _open(tmp_path)
+        try:
+            for request_id in ("req_a", "req_b", "req_c"):
+                await repo.create_order_pending("user-1", "prod-1", request_id)
+            await repo.mark_order_paid("req_a", "chk_a", "ord_a", 1500, "USD")
+            await repo.mark_order_paid("req_b", "chk_b", "ord_b", 2500, "USD")
+            return await repo.revenue_by_day(
+                "2000-01-01T00:00:00+00:00",
+                "2100-01-01T00:00:00+00:00",
+            )
+        finally:
+            await repo.close()
+
+    [row] = asyncio.run(run())
+
+    assert row["product_id"] == "prod-1"
+    assert (row["currency"], row["orders"], row["amount_cents"]) == ("USD", 2, 4000)
+    assert len(row["day"]) == 10
+
+
+def test_sqlite_repo_pages_entitlements_by_user_and_product(tmp_path):
+    async def run() -> list[list[dict]]:
+        repo = await _open(tmp_path)
+        try:
+            await repo.bulk_grant_entitlements(
+                [("user-2", "prod-1"), ("user-1", "prod-old"), ("user-1", "prod-1")]
+            )
+            first = await repo.list_entitlements_page(None, 2)
+            rest = await repo.list_entitlements_page(
+                (first[-1]["user_id"], first[-1]["product_id"]), 2
+            )
+            return [first, rest]
+        finally:
+            await repo.close()
+
+    first, rest = asyncio.run(run())
+
+    assert [(row["user_id"], row["product_id"]) for row in first + rest] == [
+        ("user-1", "prod-1"),
+        ("user-1", "prod-old"),
+        ("user-2", "prod-1"),
+    ]
+
+
+def test_sqlite_repo_wraps_single_statement_errors_like_transactions(tmp_path):
+    async def run() -> None:
+        repo = await _open(tmp_path)
+        try:
+            with pytest.raises(RuntimeError, match="grant entitlement") as grant_error:
+                await repo.grant_entitlement("user-1", "missing")
+            assert isinstance(grant_error.value.__cause__, sqlite3.IntegrityError)
+
+            await repo._run(repo._db().execute, "drop table webhook_events")
+            with pytest.raises(RuntimeError, match="webhook event insert"):
+                await repo.webhook_event_insert("evt-1")
+            await repo._run(repo._db().execute, "drop table entitlements")
+            with pytest.raises(RuntimeError, match="list entitlements"):
+                await repo.list_entitlements("user-1")
+        finally:
+            await repo.close()
+
+    asyncio.run(run())
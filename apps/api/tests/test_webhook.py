@@ -1,7 +1,12 @@
+import asyncio
 import json
 
 from app.config import get_settings
+from app.main import app
 from app.utils.crypto import hmac_sha256_hex
+from app.webhook_batcher import WebhookBatcher
+from app.webhook_events import CreemEvent
+from app.webhook_queue import WebhookProcessor, WebhookQueue
 
 
 def _signed_headers(raw: bytes) -> dict[str, str]:
@@ -27,10 +32,12 @@ def test_webhook_invalid_signature(client):
 def test_webhook_paid_event_marks_order_and_grants_entitlement(client, fake_repo):
     product_id = next(iter(fake_repo.products.keys()))
     request_id = "req_test_123"
-    fake_repo.create_order_pending(
-        user_id="user_test",
-        product_id=product_id,
-        request_id=request_id,
+    asyncio.run(
+        fake_repo.create_order_pending(
+            user_id="user_test",
+            product_id=product_id,
+            request_id=request_id,
+        )
     )
 
     payload = {
@@ -49,11 +56,13 @@ def test_webhook_paid_event_marks_order_and_grants_entitlement(client, fake_repo
     }
     raw = json.dumps(payload).encode("utf-8")
 
-    response = client.post("/api/webhooks/creem", data=raw, headers=_signed_headers(raw))
-    assert response.status_code == 200
-    assert response.json() == {"ok": True}
+    with app.state.entitlement_broker.subscribe("user_test") as grants:
+        response = client.post("/api/webhooks/creem", data=raw, headers=_signed_headers(raw))
+        assert response.status_code == 200
+        assert response.json() == {"ok": True}
+        assert grants.get_nowait() == {"product_id": product_id}
 
-    order = fake_repo.get_order_by_request_id(request_id)
+    order = fake_repo.orders_by_request.get(request_id)
     assert order is not None
     assert order["status"] == "paid"
     assert order["creem_checkout_id"] == "chk_1"
@@ -64,3 +73,155 @@ def test_webhook_paid_event_marks_order_and_grants_entitlement(client, fake_repo
     assert second.status_code == 200
     assert second.json() == {"ok": True}
     assert len(fake_repo.entitlements) == 1
+
+
+def test_webhook_queued_mode_acks_before_processing(client, fake_repo, tmp_path):
+    queue = WebhookQueue(str(tmp_path / "queue.sqlite3"))
+    asyncio.run(queue.open())
+    app.state.webhook_processor = WebhookProcessor(queue, fake_repo, workers=1)
+    try:
+        payload = {"id": "evt_queued", "eventType": "checkout.completed", "object": {}}
+        raw = json.dumps(payload).encode("utf-8")
+        response = client.post("/api/webhooks/creem", data=raw, headers=_signed_headers(raw))
+
+        assert response.status_code == 200
+        assert fake_repo.webhook_events == {}
+        assert asyncio.run(queue.counts()) == {"pending": 1}
+    finally:
+        app.state.webhook_processor = None
+        asyncio.run(queue.close())
+
+
+def test_webhook_paid_event_for_unknown_order_is_recorded(client, fake_repo):
+    payload = {
+        "id": "evt_unknown",
+        "eventType": "checkout.completed",
+        "object": {"request_id": "req_missing", "order": {"id": "ord_1", "status": "paid"}},
+    }
+    raw = json.dumps(payload).encode("utf-8")
+
+    response = client.post("/api/webhooks/creem", data=raw, headers=_signed_headers(raw))
+
+    assert response.status_code == 200
+    assert "evt_unknown" in fake_repo.webhook_events
+    assert fake_repo.entitlements == set()
+
+
+def test_webhook_redeliveries_are_answered_from_the_seen_cache(client, fake_repo):
+    calls: list[str] = []
+    insert = fake_repo.webhook_event_insert
+
+    async def counting_insert(event_key: str) -> bool:
+        calls.append(event_key)
+        return await insert(event_key)
+
+    fake_repo.webhook_event_insert = counting_insert
+    payload = {"id": "evt_retry", "eventType": "subscription.active", "object": {}}
+    raw = json.dumps(payload).encode("utf-8")
+
+    for _ in range(3):
+        response = client.post("/api/webhooks/creem", data=raw, headers=_signed_headers(raw))
+        assert response.status_code == 200
+
+    assert calls == ["evt_retry"]
+    assert app.state.seen_events.stats()["hits"] == 2
+
+
+def test_webhook_queued_mode_skips_recently_processed_events(client, fake_repo, tmp_path):
+    queue = WebhookQueue(str(tmp_path / "queue.sqlite3"))
+    asyncio.run(queue.open())
+    app.state.webhook_processor = WebhookProcessor(queue, fake_repo, workers=1)
+    asyncio.run(app.state.seen_events.add("evt_done"))
+
+    payload = {"id": "evt_done", "eventType": "checkout.completed", "object": {}}
+    raw = json.dumps(payload).encode("utf-8")
+    response = client.post("/api/webhooks/creem", data=raw, headers=_signed_headers(raw))
+
+    assert response.status_code == 200
+    assert asyncio.run(queue.counts()) == {}
+
+
+def _batch_line(payload: dict, signature: str | None = None) -> str:
+    raw = json.dumps(payload)
+    if signature is None:
+        signature = hmac_sha256_hex(get_settings().creem_webhook_secret, raw.encode("utf-8"))
+    return json.dumps({"signature": signature, "payload": raw})
+
+
+def test_webhook_batch_endpoint_reports_per_event_results(client, fake_repo):
+    product_id = next(iter(fake_repo.products.keys()))
+    asyncio.run(fake_repo.create_order_pending("user_batch", product_id, "req_batch"))
+    batches: list[int] = []
+    process_batch = fake_repo.process_checkout_completed_batch
+
+    async def counting_batch(events: list[dict]) -> list[dict]:
+        batches.append(len(events))
+        return await process_batch(events)
+
+    fake_repo.process_checkout_completed_batch = counting_batch
+    paid = {
+        "id": "evt_batch_paid",
+        "eventType": "checkout.completed",
+        "object": {
+            "id": "chk_b",
+            "request_id": "req_batch",
+            "order": {"id": "ord_b", "status": "paid", "amount": 1500, "currency": "USD"},
+        },
+    }
+    other = {"id": "evt_batch_other", "eventType": "subscription.active", "object": {}}
+    body = "\n".join(
+        [
+            _batch_line(paid),
+            _batch_line(other),
+            _batch_line(other),
+            _batch_line({"id": "evt_forged"}, signature="invalid"),
+            "not json",
+            "",
+        ]
+    )
+
+    response = client.post(
+        "/api/webhooks/creem/batch",
+        content=body,
+        headers={"content-type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["results"] == [
+        {"event_key": "evt_batch_paid", "outcome": "paid"},
+        {"event_key": "evt_batch_other", "outcome": "ignored"},
+        {"event_key": "evt_batch_other", "outcome": "duplicate"},
+        {"event_key": None, "outcome": "bad_signature"},
+        {"event_key": None, "outcome": "invalid_payload"},
+    ]
+    assert batches == [1]
+    assert ("user_batch", product_id) in fake_repo.entitlements
+    assert fake_repo.orders_by_request["req_batch"]["status"] == "paid"
+
+
+def test_webhook_batcher_coalesces_concurrent_events(fake_repo):
+    batches: list[list[str]] = []
+    insert_many = fake_repo.webhook_event_insert_many
+
+    async def counting_insert_many(event_keys: list[str]) -> set[str]:
+        batches.append(event_keys)
+        return await insert_many(event_keys)
+
+    fake_repo.webhook_event_insert_many = counting_insert_many
+
+    async def run() -> list[str]:
+        batcher = WebhookBatcher(fake_repo, window_seconds=0.01, max_events=3)
+        try:
+            return await asyncio.gather(
+                *(
+                    batcher.submit(CreemEvent(f"evt_{index % 4}", f"evt_{index % 4}"))
+                    for index in range(5)
+                )
+            )
+        finally:
+            await batcher.stop()
+
+    outcomes = asyncio.run(run())
+
+    assert outcomes == ["ignored"] * 4 + ["duplicate"]
+    assert batches == [["evt_0", "evt_1", "evt_2"], ["evt_3", "evt_0"]]
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+from app.metrics import WEBHOOK_QUEUE_LOOP_ERRORS
+from app.repo import FakeRepo
+from app.webhook_queue import WebhookProcessor, WebhookQueue
+
+
+def _paid_event(event_id: str, request_id: str) -> bytes:
+    payload = {
+        "id": event_id,
+        "eventType": "checkout.completed",
+        "object": {
+            "id": "chk_1",
+            "request_id": request_id,
+            "order": {"id": "ord_1", "status": "paid", "amount": 1500, "currency": "USD"},
+        },
+    }
+    return json.dumps(payload).encode("utf-8")
+
+
+async def _wait_for(predicate, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+class FlakyRepo(FakeRepo):
+    def __init__(self) -> None:
+        super().__init__()
+        self.failures = 1
+        self.seen_order: list[str] = []
+
+    async def process_checkout_completed(self, event_key: str, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Supabase request failed")
+        self.seen_order.append(event_key)
+        return await super().process_checkout_completed(event_key, **kwargs)
+
+
+def test_queued_events_survive_restart_and_keep_per_order_ordering(tmp_path):
+    path = str(tmp_path / "queue.sqlite3")
+    repo = FlakyRepo()
+
+    async def run() -> dict[str, int]:
+        queue = WebhookQueue(path)
+        await queue.open()
+        assert await queue.append("evt_1", "req_1", _paid_event("evt_1", "req_1"))
+        assert await queue.append("evt_2", "req_1", _paid_event("evt_2", "req_1"))
+        assert not await queue.append("evt_1", "req_1", _paid_event("evt_1", "req_1"))
+        await queue.close()
+
+        await repo.create_order_pending("user_test", "prod_1", "req_1")
+        restarted = WebhookQueue(path)
+        await restarted.open()
+        processor = WebhookProcessor(restarted, repo, workers=4, retry_base_seconds=0.01)
+        processor.start()
+        await _wait_for(lambda: len(repo.seen_order) == 2)
+        await processor.stop()
+        counts = await restarted.counts()
+        await restarted.close()
+        return counts
+
+    counts = asyncio.run(run())
+
+    assert repo.seen_order == ["evt_1", "evt_2"]
+    assert repo.orders_by_request["req_1"]["status"] == "paid"
+    assert ("user_test", "prod_1") in repo.entitlements
+    assert counts == {}
+
+
+def test_events_are_dead_lettered_after_max_attempts(tmp_path):
+    class BrokenRepo(FakeRepo):
+        async def process_checkout_completed(self, event_key: str, **kwargs):
+            raise RuntimeError("down")
+
+    async def run() -> dict[str, int]:
+        queue = WebhookQueue(str(tmp_path / "queue.sqlite3"))
+        await queue.open()
+        processor = WebhookProcessor(
+            queue,
+            BrokenRepo(),
+            workers=1,
+            retry_base_seconds=0.0,
+            max_attempts=3,
+            poll_interval_seconds=0.01,
+        )
+        processor.start()
+        await processor.enqueue("evt_1", "req_1", _paid_event("evt_1", "req_1"))
+        for _ in range(200):
+            if (await queue.counts()).get("dead"):
+                break
+            await asyncio.sleep(0.01)
+        await processor.stop()
+        dead = await queue.counts()
+        # Creem redelivering a dead-lettered event re-arms it instead of being ignored.
+        assert await queue.append("evt_1", "req_1", _paid_event("evt_1", "req_1"))
+        assert not await queue.append("evt_1", "req_1", _paid_event("evt_1", "req_1"))
+        rearmed = await queue.counts()
+        await queue.close()
+        return dead, rearmed
+
+    assert asyncio.run(run()) == ({"dead": 1}, {"pending": 1})
+
+
+def test_loops_back_off_on_journal_errors_and_report_unready(tmp_path):
+    class BrokenJournal(WebhookQueue):
+        broken = True
+
+        async def claim_ready(self, limit: int, exclude: set[str]):
+            if self.broken:
+                raise sqlite3.OperationalError("disk I/O error")
+            return await super().claim_ready(limit, exclude)
+
+    repo = FakeRepo()
+
+    async def run() -> None:
+        queue = BrokenJournal(str(tmp_path / "queue.sqlite3"))
+        await queue.open()
+        await repo.create_order_pending("user_test", "prod_1", "req_1")
+        processor = WebhookProcessor(queue, repo, workers=1, poll_interval_seconds=0.01)
+        errors = WEBHOOK_QUEUE_LOOP_ERRORS.value("dispatch")
+        processor.start()
+        await processor.enqueue("evt_1", "req_1", _paid_event("evt_1", "req_1"))
+        await _wait_for(lambda: WEBHOOK_QUEUE_LOOP_ERRORS.value("dispatch") > errors)
+        with pytest.raises(RuntimeError, match="failing"):
+            await processor.check()
+
+        queue.broken = False
+        await _wait_for(lambda: repo.orders_by_request["req_1"]["status"] == "paid")
+        await processor.check()
+        await processor.stop()
+        await queue.close()
+
+    asyncio.run(run())
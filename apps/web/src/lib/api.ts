@@ -4,6 +4,23 @@ type CheckoutResponse = {
   checkout_url: string;
 };
 
+export type Product = {
+  id: string;
+  name: string;
+  price_cents: number;
+  currency: string;
+};
+
+export async function fetchProducts(): Promise<Product[]> {
+  const response = await fetch(`${API_BASE}/api/products`);
+
+  if (!response.ok) {
+    throw new Error("Failed to load products");
+  }
+
+  return (await response.json()) as Product[];
+}
+
 export async function createCheckout(accessToken: string, productId: string): Promise<string> {
   const response = await fetch(`${API_BASE}/api/checkout`, {
     method: "POST",
@@ -34,3 +51,73 @@ export async function createCheckout(accessToken: string, productId: string): Pr
 
   return payload.checkout_url;
 }
+
+type EntitlementPollResponse = {
+  unlocked: boolean;
+};
+
+async function pollEntitlement(accessToken: string, signal?: AbortSignal): Promise<boolean> {
+  const response = await fetch(`${API_BASE}/api/entitlements/stream`, {
+    headers: {
+      Accept: "application/json",
+      Authorization: `Bearer ${accessToken}`,
+    },
+    signal,
+  });
+
+  if (!response.ok) {
+    throw new Error("Failed to check entitlement");
+  }
+
+  const payload = (await response.json()) as EntitlementPollResponse;
+  return payload.unlocked;
+}
+
+export async function waitForEntitlement(
+  accessToken: string,
+  signal?: AbortSignal,
+): Promise<boolean> {
+  const response = await fetch(`${API_BASE}/api/entitlements/stream`, {
+    headers: {
+      Accept: "text/event-stream",
+      Authorization: `Bearer ${accessToken}`,
+    },
+    signal,
+  });
+
+  if (!response.ok) {
+    throw new Error("Failed to check entitlement");
+  }
+
+  if (!response.body) {
+    return pollEntitlement(accessToken, signal);
+  }
+
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) {
+      return false;
+    }
+
+    buffer += value;
+    let boundary = buffer.indexOf("\n\n");
+    while (boundary !== -1) {
+      const lines = buffer.slice(0, boundary).split("\n");
+      buffer = buffer.slice(boundary + 2);
+
+      if (lines.includes("event: entitlement")) {
+        await reader.cancel();
+        return true;
+      }
+      if (lines.includes("event: timeout")) {
+        await reader.cancel();
+        return false;
+      }
+
+      boundary = buffer.indexOf("\n\n");
+    }
+  }
+}
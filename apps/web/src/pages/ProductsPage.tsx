@@ -1,16 +1,9 @@
 import { useEffect, useState } from "react";
 
-import { createCheckout } from "../lib/api";
+import { createCheckout, fetchProducts, type Product } from "../lib/api";
 import { redirectTo } from "../lib/navigation";
 import { supabase } from "../lib/supabase";
 
-type Product = {
-  id: string;
-  name: string;
-  price_cents: number;
-  currency: string;
-};
-
 export function ProductsPage() {
   const [products, setProducts] = useState<Product[]>([]);
   const [loading, setLoading] = useState(true);
@@ -22,19 +15,13 @@ export function ProductsPage() {
       setLoading(true);
       setError("");
 
-      const { data, error: queryError } = await supabase
-        .from("products")
-        .select("id, name, price_cents, currency")
-        .eq("active", true);
-
-      setLoading(false);
-
-      if (queryError) {
-        setError(queryError.message);
-        return;
+      try {
+        setProducts(await fetchProducts());
+      } catch (err) {
+        setError(err instanceof Error ? err.message : "Failed to load products");
+      } finally {
+        setLoading(false);
       }
-
-      setProducts((data as Product[]) ?? []);
     }
 
     void loadProducts();
@@ -1,75 +1,54 @@
 import { useEffect, useState } from "react";
 
+import { waitForEntitlement } from "../lib/api";
 import { supabase } from "../lib/supabase";
 
 type Status = "processing" | "unlocked" | "pending" | "error";
 
-const MAX_ATTEMPTS = 5;
-const POLL_DELAY_MS = 1500;
-
-function sleep(ms: number) {
-  return new Promise((resolve) => {
-    setTimeout(resolve, ms);
-  });
-}
-
 export function SuccessPage() {
   const [status, setStatus] = useState<Status>("processing");
   const [message, setMessage] = useState("Processing payment...");
 
   useEffect(() => {
-    let active = true;
+    const controller = new AbortController();
 
-    async function pollEntitlements() {
-      for (let attempt = 1; attempt <= MAX_ATTEMPTS; attempt += 1) {
-        const userResponse = await supabase.auth.getUser();
-        const user = userResponse.data.user;
+    async function waitForUnlock() {
+      const sessionResponse = await supabase.auth.getSession();
+      const accessToken = sessionResponse.data.session?.access_token;
 
-        if (!user) {
-          if (active) {
-            setStatus("error");
-            setMessage("No active user session.");
-          }
-          return;
+      if (!accessToken) {
+        if (!controller.signal.aborted) {
+          setStatus("error");
+          setMessage("No active user session.");
         }
+        return;
+      }
 
-        const { data, error } = await supabase
-          .from("entitlements")
-          .select("id")
-          .eq("user_id", user.id)
-          .limit(1);
-
-        if (error) {
-          if (active) {
-            setStatus("error");
-            setMessage(error.message);
-          }
+      try {
+        const unlocked = await waitForEntitlement(accessToken, controller.signal);
+        if (controller.signal.aborted) {
           return;
         }
 
-        if ((data?.length ?? 0) > 0) {
-          if (active) {
-            setStatus("unlocked");
-            setMessage("Unlocked");
-          }
-          return;
+        if (unlocked) {
+          setStatus("unlocked");
+          setMessage("Unlocked");
+        } else {
+          setStatus("pending");
+          setMessage("Still processing, refresh later");
         }
-
-        if (attempt < MAX_ATTEMPTS) {
-          await sleep(POLL_DELAY_MS);
+      } catch (err) {
+        if (!controller.signal.aborted) {
+          setStatus("error");
+          setMessage(err instanceof Error ? err.message : "Failed to check entitlement");
         }
       }
-
-      if (active) {
-        setStatus("pending");
-        setMessage("Still processing, refresh later");
-      }
     }
 
-    void pollEntitlements();
+    void waitForUnlock();
 
     return () => {
-      active = false;
+      controller.abort();
     };
   }, []);
 
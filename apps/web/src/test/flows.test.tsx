@@ -7,11 +7,9 @@ const mocks = vi.hoisted(() => {
   const signInWithPassword = vi.fn();
   const signUp = vi.fn();
   const getSession = vi.fn();
-  const getUser = vi.fn();
   const signOut = vi.fn();
-  const productsEq = vi.fn();
-  const entitlementsEq = vi.fn();
-  const entitlementsLimit = vi.fn();
+  const fetchProducts = vi.fn();
+  const waitForEntitlement = vi.fn();
   const createCheckout = vi.fn();
   const redirectTo = vi.fn();
 
@@ -19,11 +17,9 @@ const mocks = vi.hoisted(() => {
     signInWithPassword,
     signUp,
     getSession,
-    getUser,
     signOut,
-    productsEq,
-    entitlementsEq,
-    entitlementsLimit,
+    fetchProducts,
+    waitForEntitlement,
     createCheckout,
     redirectTo,
   };
@@ -31,6 +27,8 @@ const mocks = vi.hoisted(() => {
 
 vi.mock("../lib/api", () => ({
   createCheckout: mocks.createCheckout,
+  fetchProducts: mocks.fetchProducts,
+  waitForEntitlement: mocks.waitForEntitlement,
 }));
 
 vi.mock("../lib/navigation", () => ({
@@ -43,24 +41,8 @@ vi.mock("../lib/supabase", () => ({
       signInWithPassword: mocks.signInWithPassword,
       signUp: mocks.signUp,
       getSession: mocks.getSession,
-      getUser: mocks.getUser,
       signOut: mocks.signOut,
     },
-    from: (table: string) => {
-      if (table === "products") {
-        return {
-          select: () => ({ eq: mocks.productsEq }),
-        };
-      }
-
-      if (table === "entitlements") {
-        return {
-          select: () => ({ eq: mocks.entitlementsEq }),
-        };
-      }
-
-      throw new Error(`Unexpected table: ${table}`);
-    },
   },
 }));
 
@@ -75,19 +57,13 @@ describe("web flow", () => {
     mocks.signInWithPassword.mockResolvedValue({ error: null });
     mocks.signUp.mockResolvedValue({ error: null });
     mocks.getSession.mockResolvedValue({ data: { session: { access_token: "token-123" } } });
-    mocks.getUser.mockResolvedValue({ data: { user: { id: "user-1" } } });
     mocks.signOut.mockResolvedValue({ error: null });
 
-    mocks.productsEq.mockResolvedValue({
-      data: [{ id: "prod-1", name: "Starter Pack", price_cents: 1500, currency: "USD" }],
-      error: null,
-    });
+    mocks.fetchProducts.mockResolvedValue([
+      { id: "prod-1", name: "Starter Pack", price_cents: 1500, currency: "USD" },
+    ]);
 
-    mocks.entitlementsEq.mockReturnValue({ limit: mocks.entitlementsLimit });
-    mocks.entitlementsLimit.mockResolvedValue({
-      data: [{ id: "ent-1" }],
-      error: null,
-    });
+    mocks.waitForEntitlement.mockResolvedValue(true);
 
     mocks.createCheckout.mockResolvedValue("https://checkout.test/session-1");
   });
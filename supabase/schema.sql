@@ -29,6 +29,10 @@ create table if not exists orders (
   updated_at timestamptz not null default now()
 );
 
+-- Keyset pagination over (created_at, id), optionally filtered by status.
+create index if not exists orders_created_at_id_idx on orders (created_at, id);
+create index if not exists orders_status_created_at_id_idx on orders (status, created_at, id);
+
 create table if not exists entitlements (
   id uuid primary key default gen_random_uuid(),
   user_id uuid not null,
@@ -43,6 +47,187 @@ create table if not exists webhook_events (
   received_at timestamptz not null default now()
 );
 
+create index if not exists webhook_events_received_at_idx on webhook_events (received_at);
+
+-- Applies a paid checkout.completed event in one transaction:
+-- records the event key, marks the order paid and grants the entitlement.
+-- new_event = false means the event key was already recorded (duplicate delivery).
+create or replace function process_checkout_completed(
+  p_event_key text,
+  p_request_id text,
+  p_creem_checkout_id text,
+  p_creem_order_id text,
+  p_amount_cents int,
+  p_currency text
+)
+returns table (new_event boolean, order_found boolean, user_id uuid, product_id uuid)
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_order orders%rowtype;
+begin
+  insert into webhook_events (event_key)
+  values (p_event_key)
+  on conflict (event_key) do nothing;
+
+  if not found then
+    return query select false, false, null::uuid, null::uuid;
+    return;
+  end if;
+
+  update orders
+     set status = 'paid',
+         creem_checkout_id = p_creem_checkout_id,
+         creem_order_id = p_creem_order_id,
+         amount_cents = p_amount_cents,
+         currency = p_currency,
+         updated_at = now()
+   where orders.request_id = p_request_id
+  returning * into v_order;
+
+  if not found then
+    return query select true, false, null::uuid, null::uuid;
+    return;
+  end if;
+
+  insert into entitlements (user_id, product_id)
+  values (v_order.user_id, v_order.product_id)
+  on conflict on constraint entitlements_user_id_product_id_key do nothing;
+
+  return query select true, true, v_order.user_id, v_order.product_id;
+end;
+$$;
+
+revoke all on function process_checkout_completed(text, text, text, text, int, text)
+  from public, anon, authenticated;
+grant execute on function process_checkout_completed(text, text, text, text, int, text)
+  to service_role;
+
+-- Applies a batch of paid checkout events in one transaction; rows come back tagged
+-- with the 1-based position of their event in p_events.
+create or replace function process_checkout_completed_batch(p_events jsonb)
+returns table (
+  ordinal int,
+  new_event boolean,
+  order_found boolean,
+  user_id uuid,
+  product_id uuid
+)
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_event jsonb;
+  v_ordinal bigint;
+begin
+  for v_event, v_ordinal in
+    select e.value, e.ordinality from jsonb_array_elements(p_events) with ordinality as e
+  loop
+    return query
+      select v_ordinal::int, p.new_event, p.order_found, p.user_id, p.product_id
+        from process_checkout_completed(
+          v_event->>'event_key',
+          v_event->>'request_id',
+          v_event->>'creem_checkout_id',
+          v_event->>'creem_order_id',
+          (v_event->>'amount_cents')::int,
+          v_event->>'currency'
+        ) as p;
+  end loop;
+end;
+$$;
+
+revoke all on function process_checkout_completed_batch(jsonb)
+  from public, anon, authenticated;
+grant execute on function process_checkout_completed_batch(jsonb)
+  to service_role;
+
+-- Applies coalesced order state writes, one jsonb object per request_id with optional
+-- status and creem_checkout_id. Missing fields are left alone and a paid order is
+-- never moved back to another status.
+create or replace function apply_order_updates(p_updates jsonb)
+returns void
+language sql
+security definer
+set search_path = public
+as $$
+  update orders o
+     set status = case when o.status = 'paid' then o.status else coalesce(u.status, o.status) end,
+         creem_checkout_id = coalesce(u.creem_checkout_id, o.creem_checkout_id),
+         updated_at = now()
+    from jsonb_to_recordset(p_updates) as u(request_id text, status text, creem_checkout_id text)
+   where o.request_id = u.request_id;
+$$;
+
+revoke all on function apply_order_updates(jsonb)
+  from public, anon, authenticated;
+grant execute on function apply_order_updates(jsonb)
+  to service_role;
+
+-- Paid order totals per UTC day, product and currency for [p_created_from, p_created_before).
+-- Reads the (status, created_at, id) index instead of scanning the whole table.
+create or replace function revenue_by_day(p_created_from timestamptz, p_created_before timestamptz)
+returns table (
+  day date,
+  product_id uuid,
+  currency text,
+  orders bigint,
+  amount_cents bigint
+)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+  select (o.created_at at time zone 'utc')::date as day,
+         o.product_id,
+         o.currency,
+         count(*) as orders,
+         coalesce(sum(o.amount_cents), 0) as amount_cents
+    from orders o
+   where o.status = 'paid'
+     and o.created_at >= p_created_from
+     and o.created_at < p_created_before
+   group by 1, 2, 3
+   order by 1, 2, 3;
+$$;
+
+revoke all on function revenue_by_day(timestamptz, timestamptz)
+  from public, anon, authenticated;
+grant execute on function revenue_by_day(timestamptz, timestamptz)
+  to service_role;
+
+-- Deletes at most p_limit events older than p_received_before, oldest first, so
+-- retention runs hold row locks only briefly. Returns the number of rows removed.
+create or replace function prune_webhook_events(p_received_before timestamptz, p_limit int)
+returns int
+language sql
+security definer
+set search_path = public
+as $$
+  with expired as (
+    select id from webhook_events
+     where received_at < p_received_before
+     order by received_at
+     limit p_limit
+     for update skip locked
+  ), deleted as (
+    delete from webhook_events w
+     using expired
+     where w.id = expired.id
+    returning 1
+  )
+  select count(*)::int from deleted;
+$$;
+
+revoke all on function prune_webhook_events(timestamptz, int)
+  from public, anon, authenticated;
+grant execute on function prune_webhook_events(timestamptz, int)
+  to service_role;
+
 alter table orders enable row level security;
 alter table entitlements enable row level security;
 